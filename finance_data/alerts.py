@@ -0,0 +1,103 @@
+"""
+Set-based evaluation of price alerts.
+
+Active alerts are loaded once as plain tuples and grouped by ``(ticker, condition)``
+into sorted threshold lists.  For every ticker the latest and previous close come from
+``LatestQuote`` and each condition becomes a single ``bisect`` slice:
+
+* ABOVE   - thresholds strictly below the current price
+* BELOW   - thresholds strictly above the current price
+* CROSSES - thresholds passed when moving from the previous close to the current price
+  (``previous < value <= current`` going up, ``previous > value >= current`` going down)
+
+so evaluation costs ``O(tickers * log(alerts))`` plus the size of the result, and every
+triggered alert is stamped with one UPDATE per ``UPDATE_BATCH_SIZE`` ids.
+"""
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Alert, LatestQuote
+
+logger = logging.getLogger(__name__)
+
+UPDATE_BATCH_SIZE = 5000
+
+
+class AlertIndex:
+    """Alert thresholds grouped by (ticker, condition) and sorted by value"""
+
+    def __init__(self, alerts):
+        grouped = defaultdict(list)
+        for alert_id, ticker, condition, value in alerts:
+            grouped[ticker, condition].append((value, alert_id))
+        self.values = {}
+        self.ids = {}
+        for key, entries in grouped.items():
+            entries.sort()
+            self.values[key] = [value for value, _ in entries]
+            self.ids[key] = [alert_id for _, alert_id in entries]
+
+    @classmethod
+    def active(cls):
+        return cls(Alert.objects.filter(is_active=True).values_list('id', 'ticker', 'condition', 'value')
+                   .iterator(chunk_size=UPDATE_BATCH_SIZE))
+
+    def tickers(self):
+        return {ticker for ticker, _ in self.values}
+
+    def matches(self, ticker, current, previous=None):
+        """Ids of the alerts on ``ticker`` triggered by a move from ``previous`` to ``current``"""
+        triggered = []
+        key = (ticker, 'ABOVE')
+        if key in self.values:
+            triggered.extend(self.ids[key][:bisect_left(self.values[key], current)])
+        key = (ticker, 'BELOW')
+        if key in self.values:
+            triggered.extend(self.ids[key][bisect_right(self.values[key], current):])
+        key = (ticker, 'CROSSES')
+        if key in self.values and previous is not None and previous != current:
+            values = self.values[key]
+            if current > previous:
+                triggered.extend(self.ids[key][bisect_right(values, previous):bisect_right(values, current)])
+            else:
+                triggered.extend(self.ids[key][bisect_left(values, current):bisect_left(values, previous)])
+        return triggered
+
+    def evaluate(self, quotes):
+        """``quotes`` maps ticker -> (close, previous close); returns the triggered ids"""
+        triggered = []
+        for ticker, (current, previous) in quotes.items():
+            triggered.extend(self.matches(ticker, current, previous))
+        return triggered
+
+
+def mark_triggered(alert_ids, now=None):
+    """Stamp ``last_triggered`` on ``alert_ids`` in one transaction"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(alert_ids), UPDATE_BATCH_SIZE):
+            Alert.objects.filter(id__in=alert_ids[start:start + UPDATE_BATCH_SIZE]).update(last_triggered=now)
+    # إضافة منطق إرسال الإشعارات
+    return len(alert_ids)
+
+
+def check_alerts(now=None):
+    """Evaluate every active alert against the latest quotes; returns the triggered ids"""
+    started = time.monotonic()
+    index = AlertIndex.active()
+    if not index.values:
+        return []
+    quotes = {
+        ticker: (close, previous)
+        for ticker, close, previous in LatestQuote.objects.filter(ticker__in=index.tickers())
+        .values_list('ticker', 'close_price', 'previous_close')
+    }
+    triggered = index.evaluate(quotes)
+    mark_triggered(triggered, now)
+    logger.info(f"{len(triggered)} alerts triggered in {time.monotonic() - started:.3f}s")
+    return triggered
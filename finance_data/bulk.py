@@ -0,0 +1,124 @@
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import DecimalField
+from django.db.models.constants import OnConflict
+
+from .cache import invalidate_market_data
+from .models import FinancialData
+from .quotes import refresh_latest_quotes
+from .rollups import month_start, refresh_rollups, week_start
+
+# حجم الدفعة الافتراضي لعمليات الإدراج المجمّعة
+DEFAULT_BATCH_SIZE = 500
+UNIQUE_FIELDS = ('date', 'ticker')
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def upsert_financial_data(records: List[Dict], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Insert or update ``FinancialData`` rows on the ``(date, ticker)`` unique key.
+
+    Every record must carry the same set of fields; the fields other than ``date`` and
+    ``ticker`` are overwritten on conflict. This is the statement
+    ``bulk_create(update_conflicts=True)`` generates, but only the columns present in the
+    records are prepared and sent instead of all 30+ model fields, which dominates the
+    cost for large imports. Decimal values that do not fit a field's ``max_digits``
+    raise ``ValidationError`` before anything is written. All batches run inside a
+    single transaction.
+
+    This is a pure write: ``LatestQuote``, the rollups and the response cache are not
+    refreshed. Use ``ingest_financial_data`` for one-off writes, or call
+    ``refresh_market_data`` once at the end of a multi-batch job.
+    """
+    if not records:
+        return 0
+    opts = FinancialData._meta
+    fields = [opts.get_field(name) for name in records[0]]
+    columns = [field.column for field in fields]
+    update_columns = [field.column for field in fields if field.name not in UNIQUE_FIELDS]
+    unique_columns = [opts.get_field(name).column for name in UNIQUE_FIELDS]
+
+    # الاتصال الفعلي بدلاً من الوكيل connection لتجنب كلفة البحث عنه مع كل قيمة
+    connection = connections[DEFAULT_DB_ALIAS]
+    ops = connection.ops
+    # MySQL يحدد المفتاح الفريد تلقائياً (ON DUPLICATE KEY UPDATE)
+    conflict_sql = ops.on_conflict_suffix_sql(fields, OnConflict.UPDATE, update_columns, unique_columns)
+    insert_sql = 'INSERT INTO %s (%s) VALUES ' % (
+        ops.quote_name(opts.db_table), ', '.join(ops.quote_name(column) for column in columns)
+    )
+    row_placeholder = '(%s)' % ', '.join(['%s'] * len(fields))
+    batch_size = max(1, min(batch_size, ops.bulk_batch_size(fields, records)))
+    preparers = [
+        (field.name, field.get_db_prep_save, field.to_python, -field.decimal_places,
+         field.max_digits - field.decimal_places)
+        if isinstance(field, DecimalField) else (field.name, field.get_db_prep_save, None, None, None)
+        for field in fields
+    ]
+
+    def prepare_row(record):
+        row = []
+        for name, prepare, to_decimal, min_exponent, whole_digits in preparers:
+            value = record[name]
+            if value is None or to_decimal is None:
+                row.append(value if value is None else prepare(value, connection))
+                continue
+            if not isinstance(value, Decimal):
+                value = to_decimal(value)
+            # لا يتحقق مشغل قاعدة البيانات من max_digits: القيمة الكبيرة تفشل في MySQL أو تُقتطع
+            if not value.is_finite() or value.adjusted() >= whole_digits:
+                raise ValidationError(
+                    {name: f'Ensure that there are no more than {whole_digits} digits before the decimal point '
+                           f'(got {value}).'},
+                    code='max_whole_digits',
+                )
+            # القيم العشرية المقرّبة مسبقاً يقبلها مشغل قاعدة البيانات كما هي
+            if value.as_tuple().exponent >= min_exponent:
+                row.append(value)
+            else:
+                row.append(prepare(value, connection))
+        return row
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for batch in chunked(records, batch_size):
+            params = []
+            for record in batch:
+                params.extend(prepare_row(record))
+            cursor.execute(
+                insert_sql + ', '.join([row_placeholder] * len(batch)) + ' ' + conflict_sql,
+                params
+            )
+    return len(records)
+
+
+def touched_keys(records: Iterable[Dict]) -> set:
+    """``(ticker, date)`` keys of ``records`` reduced to one per ticker, week and month"""
+    # يكفي refresh_rollups يوم واحد من كل فترة، فلا يكبر المجموع مع عدد الصفوف
+    return {(record['ticker'], start(record['date'])) for record in records for start in (week_start, month_start)}
+
+
+def refresh_market_data(keys: Iterable) -> None:
+    """Refresh ``LatestQuote`` and the rollups for ``keys`` ((ticker, date) pairs) and drop cached reads"""
+    keys = set(keys)
+    refresh_latest_quotes({ticker for ticker, _ in keys})
+    refresh_rollups(keys)
+    invalidate_market_data()
+
+
+def ingest_financial_data(records: List[Dict], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """``upsert_financial_data`` and ``refresh_market_data`` of the touched keys in one transaction"""
+    with transaction.atomic():
+        written = upsert_financial_data(records, batch_size=batch_size)
+        refresh_market_data(touched_keys(records))
+    return written
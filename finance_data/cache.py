@@ -0,0 +1,138 @@
+"""
+Two-tier response cache for the read-only market-data endpoints.
+
+Entries live in the Django cache (Redis in production) and in a small in-process LRU.
+Every key embeds the current *ingestion generation*, a counter stored in the shared
+cache and bumped after each committed FinancialData write, so a new ingestion makes
+all older entries unreachable at once instead of waiting for a TTL.  When the cache
+backend is unavailable the views are served straight from the database.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'market-data:generation'
+KEY_PREFIX = 'market-data'
+LOCAL_CACHE_SIZE = 256
+# حد أقصى احتياطي فقط، الإبطال الفعلي يتم عبر رقم الجيل
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """Thread-safe in-process LRU used in front of the shared cache"""
+
+    def __init__(self, max_size=LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalLRUCache()
+
+
+def current_generation():
+    """Return the ingestion generation, or None when the cache backend is unreachable"""
+    try:
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            # قيمة أولية فريدة حتى لا تتطابق مع مدخلات محلية قديمة بعد مسح Redis
+            cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+    except Exception as e:
+        logger.warning(f"Market data cache unavailable: {str(e)}")
+        return None
+
+
+def bump_generation():
+    """Invalidate every cached market-data response"""
+    try:
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+            return cache.incr(GENERATION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not bump market data cache generation: {str(e)}")
+        return None
+
+
+def invalidate_market_data():
+    """Bump the generation once the current transaction commits"""
+    transaction.on_commit(bump_generation)
+
+
+def make_key(name, generation, request, kwargs):
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    # التاريخ جزء من المفتاح لأن بعض الواجهات تعتمد على تاريخ اليوم
+    payload = json.dumps([params, sorted(kwargs.items()), timezone.now().date().isoformat()], default=str)
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{name}:{generation}:{digest}'
+
+
+def cached_response(name, timeout=DEFAULT_TIMEOUT):
+    """Cache the data of successful ``APIView.get`` responses keyed by query parameters"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            generation = current_generation()
+            if generation is None:
+                return method(view, request, *args, **kwargs)
+
+            key = make_key(name, generation, request, kwargs)
+            data = local_cache.get(key, _MISSING)
+            if data is _MISSING:
+                try:
+                    data = cache.get(key, _MISSING)
+                except Exception as e:
+                    logger.warning(f"Market data cache read failed: {str(e)}")
+                if data is not _MISSING:
+                    local_cache.set(key, data)
+            if data is not _MISSING:
+                return Response(data)
+
+            response = method(view, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                local_cache.set(key, response.data)
+                try:
+                    cache.set(key, response.data, timeout)
+                except Exception as e:
+                    logger.warning(f"Market data cache write failed: {str(e)}")
+            return response
+
+        return wrapper
+
+    return decorator
@@ -5,33 +5,56 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional
 from decimal import Decimal, InvalidOperation
 import logging
-import time
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textblob import TextBlob
+from yfinance.exceptions import YFRateLimitError
+
+from .indicators import CURRENCY_VOLUME_MULTIPLIERS, time_multiplier
+from .rate_limiter import TokenBucket
 
 # إعداد الـ Logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# حدود الطلبات الافتراضية لـ Yahoo Finance
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+DEFAULT_BURST = 2
+RATE_LIMIT_RETRIES = 4
+RATE_LIMIT_BACKOFF_SECONDS = 5.0
+# عدد الرموز في طلب التحميل المجمّع الواحد
+BATCH_DOWNLOAD_SIZE = 50
+
+INTEREST_RATE_SOURCES = ["^IRX", "^FVX", "^TNX"]
+DXY_SOURCES = ['DX-Y.NYB', '^DXY', 'UUP']
+
 
 class CurrencyDataFetcher:
-    def __init__(self):
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, rate_limiter: Optional[TokenBucket] = None,
+                 ticker_factory=None, batch_downloader=None):
         self.currency_pairs = [
             'CAD=X', 'EUR=X', 'GBP=X', 'JPY=X', 'AUD=X', 'CNY=X', 
             'SGD=X', 'CHF=X', 'NZD=X', 'SEK=X', 'NOK=X', 'MXN=X',
             'SAR=X', 'AED=X', 'KWD=X'
         ]
         self.session = self._create_session()
+        # max_workers=1 يعيد السلوك التسلسلي القديم
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter or TokenBucket(DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST)
+        self.ticker_factory = ticker_factory or yf.Ticker
+        self.batch_downloader = batch_downloader or yf.download
         
     def _create_session(self):
         """Create a session with retry strategy"""
         session = requests.Session()
+        # 429 is left to the shared rate limiter so that all workers back off together
         retry = Retry(
             total=10,
             backoff_factor=2,
-            status_forcelist=[500, 502, 503, 504, 429]
+            status_forcelist=[500, 502, 503, 504]
         )
         adapter = HTTPAdapter(max_retries=retry)
         session.mount('http://', adapter)
@@ -58,23 +81,8 @@ class CurrencyDataFetcher:
             
             base_volume = (last_atr * 1000000) * (1 + last_volatility) * last_tick_count
             
-            currency_multipliers = {
-                'EUR=X': 1.2, 'JPY=X': 1.1, 'GBP=X': 1.0, 'AUD=X': 0.8,
-                'CAD=X': 0.7, 'CHF=X': 0.7, 'CNY=X': 0.6, 'SGD=X': 0.5,
-                'NZD=X': 0.4, 'SEK=X': 0.4, 'NOK=X': 0.3, 'MXN=X': 0.3,
-                'SAR=X': 0.3, 'AED=X': 0.3, 'KWD=X': 0.5
-            }
-            
-            hour = datetime.now().hour
-            if 8 <= hour <= 16:
-                time_multiplier = 1.5
-            elif 4 <= hour <= 7 or 17 <= hour <= 20:
-                time_multiplier = 1.0
-            else:
-                time_multiplier = 0.5
-                
-            pair_multiplier = currency_multipliers.get(data.name, 1.0) if hasattr(data, 'name') else 1.0
-            final_volume = base_volume * pair_multiplier * time_multiplier
+            pair_multiplier = CURRENCY_VOLUME_MULTIPLIERS.get(data.name, 1.0) if hasattr(data, 'name') else 1.0
+            final_volume = base_volume * pair_multiplier * time_multiplier(datetime.now().hour)
             
             return Decimal(str(round(float(final_volume), 0)))
             
@@ -91,20 +99,77 @@ class CurrencyDataFetcher:
         except (InvalidOperation, TypeError, ValueError):
             return Decimal(default) if default else None
 
-    def download_ticker_data(self, symbol: str) -> Optional[pd.DataFrame]:
-        """Download data with retry logic"""
-        try:
-            ticker = yf.Ticker(symbol, session=self.session)
-            data = ticker.history(period='60d', interval='1d')
-            time.sleep(5)  # زيادة التأخير إلى 5 ثواني لتجنب حظر الطلبات
-            if data is None or data.empty or len(data.index) == 0:
-                logger.warning(f"No data available for {symbol}")
+    @staticmethod
+    def _is_rate_limited(error: Exception) -> bool:
+        """Check whether an exception raised by the provider is an HTTP 429"""
+        if isinstance(error, YFRateLimitError):
+            return True
+        response = getattr(error, 'response', None)
+        if getattr(response, 'status_code', None) == 429:
+            return True
+        return '429' in str(error) or 'Too Many Requests' in str(error)
+
+    def _rate_limited_call(self, description: str, func):
+        """Run a provider request through the shared rate limiter, backing off on 429s"""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire()
+            try:
+                return func()
+            except Exception as e:
+                if self._is_rate_limited(e) and attempt < RATE_LIMIT_RETRIES:
+                    delay = RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt)
+                    logger.warning(f"Rate limited while downloading {description}, backing off {delay}s")
+                    self.rate_limiter.penalize(delay)
+                    continue
+                logger.error(f"Failed to download data for {description}: {str(e)}")
                 return None
-            data.name = symbol  # Add symbol name to DataFrame
-            return data
-        except Exception as e:
-            logger.error(f"Failed to download data for {symbol}: {str(e)}")
+        return None
+
+    def download_ticker_data(self, symbol: str) -> Optional[pd.DataFrame]:
+        """Download data for a single symbol"""
+        data = self._rate_limited_call(
+            symbol,
+            lambda: self.ticker_factory(symbol, session=self.session).history(period='60d', interval='1d')
+        )
+        if data is None or data.empty or len(data.index) == 0:
+            logger.warning(f"No data available for {symbol}")
             return None
+        data.name = symbol  # Add symbol name to DataFrame
+        return data
+
+    def download_batch(self, symbols, period: str = '60d', start=None, end=None) -> Dict[str, pd.DataFrame]:
+        """Download many symbols in one multi-symbol request and split the result per symbol.
+
+        Symbols missing from the response are simply absent from the returned dict so the
+        caller can fall back to ``download_ticker_data`` for them. Passing ``start``/``end``
+        downloads that date range instead of the trailing ``period``.
+        """
+        frames = {}
+        symbols = list(dict.fromkeys(symbols))
+        range_kwargs = {'start': start, 'end': end} if start else {'period': period}
+        for offset in range(0, len(symbols), BATCH_DOWNLOAD_SIZE):
+            chunk = symbols[offset:offset + BATCH_DOWNLOAD_SIZE]
+            data = self._rate_limited_call(
+                ', '.join(chunk),
+                lambda: self.batch_downloader(
+                    chunk, interval='1d', group_by='ticker', auto_adjust=True,
+                    threads=False, progress=False, session=self.session, **range_kwargs
+                )
+            )
+            if data is None or data.empty:
+                logger.warning(f"Batch download returned no data for {chunk}")
+                continue
+            available = data.columns.get_level_values(0) if isinstance(data.columns, pd.MultiIndex) else []
+            for symbol in chunk:
+                if symbol not in available:
+                    continue
+                frame = data[symbol].dropna(how='all')
+                if frame.empty:
+                    continue
+                frame.name = symbol
+                frames[symbol] = frame
+        logger.info(f"Batch download returned {len(frames)}/{len(symbols)} symbols")
+        return frames
 
     def fetch_market_sentiment(self) -> Decimal:
         """Fetch market sentiment from news sources"""
@@ -137,9 +202,10 @@ class CurrencyDataFetcher:
             logger.error(f"Error fetching economic news: {str(e)}")
             return ""
 
-    def fetch_yahoo_finance_data(self, symbol: str) -> Optional[Dict]:
+    def fetch_yahoo_finance_data(self, symbol: str, data: Optional[pd.DataFrame] = None) -> Optional[Dict]:
         try:
-            data = self.download_ticker_data(symbol)
+            if data is None:
+                data = self.download_ticker_data(symbol)
             if data is None or len(data) < 14:  # تأكد من وجود بيانات كافية
                 logger.warning(f"Not enough data to calculate indicators for {symbol}")
                 return None
@@ -292,29 +358,31 @@ class CurrencyDataFetcher:
             return None
     
 
-    def fetch_interest_rate(self) -> Decimal:
+    def fetch_interest_rate(self, frames: Optional[Dict[str, pd.DataFrame]] = None) -> Decimal:
         """Fetches interest rate from multiple sources"""
         try:
-            sources = ["^IRX", "^FVX", "^TNX"]
-            for source in sources:
-                data = self.download_ticker_data(source)
+            frames = frames or {}
+            for source in INTEREST_RATE_SOURCES:
+                data = frames.get(source)
+                if data is None:
+                    data = self.download_ticker_data(source)
                 if data is not None and not data.empty and len(data.index) > 0:
                     return self.safe_decimal_convert(data['Close'].iloc[-1], '5.25')
-                time.sleep(2)  # تأخير بين الطلبات
             return Decimal('5.25')
         except Exception as e:
             logger.error(f"Error fetching interest rate: {str(e)}")
             return Decimal('5.25')
 
-    def fetch_dxy(self) -> Decimal:
+    def fetch_dxy(self, frames: Optional[Dict[str, pd.DataFrame]] = None) -> Decimal:
         """Fetches US Dollar Index from multiple sources"""
         try:
-            sources = ['DX-Y.NYB', '^DXY', 'UUP']
-            for source in sources:
-                data = self.download_ticker_data(source)
+            frames = frames or {}
+            for source in DXY_SOURCES:
+                data = frames.get(source)
+                if data is None:
+                    data = self.download_ticker_data(source)
                 if data is not None and not data.empty and len(data.index) > 0:
                     return self.safe_decimal_convert(data['Close'].iloc[-1], '103.5')
-                time.sleep(2)  # تأخير بين الطلبات
             return Decimal('103.5')
         except Exception as e:
             logger.error(f"Error fetching DXY data: {str(e)}")
@@ -338,22 +406,68 @@ class CurrencyDataFetcher:
             logger.error(f"Error fetching inflation data: {str(e)}")
             return Decimal('3.1')
 
+    @staticmethod
+    def percent_change_from(current_price: Decimal, previous_close: Optional[Decimal]) -> Decimal:
+        """Percent change of ``current_price`` over ``previous_close``"""
+        if previous_close:
+            return (current_price - previous_close) / previous_close * 100
+        return Decimal('0')
+
     def calculate_percent_change(self, current_price: Decimal, symbol: str, 
                                today: datetime.date, FinancialData) -> Decimal:
         """Calculate percent change from previous day"""
         try:
-            yesterday_data = FinancialData.objects.filter(
-                ticker=symbol,
-                date=today - timedelta(days=1)
-            ).first()
-            if yesterday_data and yesterday_data.close_price:
-                return ((current_price - yesterday_data.close_price) / 
-                        yesterday_data.close_price * 100)
-            return Decimal('0')
+            previous_closes = self.prefetch_previous_closes([symbol], today, FinancialData)
+            return self.percent_change_from(current_price, previous_closes.get(symbol))
         except Exception as e:
             logger.error(f"Error calculating percent change for {symbol}: {str(e)}")
             return Decimal('0')
 
+    def prefetch_previous_closes(self, symbols, today: datetime.date, FinancialData) -> Dict[str, Decimal]:
+        """Load yesterday's close for all symbols in one query"""
+        return dict(
+            FinancialData.objects.filter(
+                ticker__in=list(symbols),
+                date=today - timedelta(days=1)
+            ).values_list('ticker', 'close_price')
+        )
+
+    def fetch_all(self, symbols):
+        """Fetch economic indicators and every symbol concurrently on a bounded worker pool.
+
+        HTTP pacing is left to the shared rate limiter, so the wall-clock time depends on
+        the provider's limit rather than on fixed pauses. All FX pairs and macro tickers are
+        first requested in one batched download; only symbols missing from it are fetched
+        one by one. No database access happens here.
+        """
+        frames = self.download_batch(list(symbols) + INTEREST_RATE_SOURCES + DXY_SOURCES)
+        indicator_sources = {
+            'interest_rate': lambda: self.fetch_interest_rate(frames),
+            'inflation': self.fetch_inflation,
+            'dxy': lambda: self.fetch_dxy(frames),
+            'market_sentiment': self.fetch_market_sentiment,
+            'economic_news': self.fetch_economic_news,
+        }
+        economic_indicators = {}
+        symbol_data = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fx-fetch') as executor:
+            indicator_futures = {executor.submit(func): name for name, func in indicator_sources.items()}
+            symbol_futures = {
+                executor.submit(self.fetch_yahoo_finance_data, symbol, frames.get(symbol)): symbol
+                for symbol in symbols
+            }
+            for future in as_completed(indicator_futures):
+                economic_indicators[indicator_futures[future]] = future.result()
+            for future in as_completed(symbol_futures):
+                symbol = symbol_futures[future]
+                try:
+                    symbol_data[symbol] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to fetch {symbol}: {str(e)}")
+                    symbol_data[symbol] = None
+        # الحفاظ على ترتيب الحقول كما كان سابقاً
+        return {name: economic_indicators[name] for name in indicator_sources}, symbol_data
+
     def update_daily_data(self):
         """Update daily data for all currency pairs"""
         from django.apps import apps
@@ -361,50 +475,51 @@ class CurrencyDataFetcher:
             logger.error("Django apps are not ready!")
             return
             
+        from django.db import transaction
+        from .bulk import ingest_financial_data
+        from .macro import store_daily_context
         from .models import FinancialData
         
         today = datetime.now().date()
         logger.info(f"Starting daily update for {today}")
         
-        economic_indicators = {
-            'interest_rate': self.fetch_interest_rate(),
-            'inflation': self.fetch_inflation(),
-            'dxy': self.fetch_dxy(),
-            'market_sentiment': self.fetch_market_sentiment(),
-            'economic_news': self.fetch_economic_news()
-        }
+        economic_indicators, symbol_data = self.fetch_all(self.currency_pairs)
         logger.info(f"Economic indicators fetched: {economic_indicators}")
+
+        try:
+            previous_closes = self.prefetch_previous_closes(self.currency_pairs, today, FinancialData)
+        except Exception as e:
+            logger.error(f"Error loading previous closes: {str(e)}")
+            previous_closes = {}
         
+        rows = []
         for i, symbol in enumerate(self.currency_pairs):
-            try:
-                logger.info(f"Processing {symbol} ({i + 1}/{len(self.currency_pairs)})")
-                
-                if i % 5 == 0 and i != 0:
-                    logger.info("Waiting for 10 seconds to avoid rate limiting...")
-                    time.sleep(10)
-                
-                data = self.fetch_yahoo_finance_data(symbol)
-                if data:
-                    logger.info(f"Data fetched for {symbol}: {data}")
-                    percent_change = self.calculate_percent_change(
-                        data['close_price'], symbol, today, FinancialData
-                    )
-                    logger.info(f"Percent change calculated for {symbol}: {percent_change}")
-                    
-                    FinancialData.objects.update_or_create(
-                        date=today,
-                        ticker=symbol,
-                        defaults={
-                            **data,
-                            'percent_change': percent_change,
-                            **economic_indicators
-                        }
-                    )
-                    logger.info(f"Successfully updated data for {symbol}")
-                else:
-                    logger.error(f"No data available to update for {symbol}")
-            except Exception as e:
-                logger.error(f"Failed to process {symbol}: {str(e)}")
+            logger.info(f"Processing {symbol} ({i + 1}/{len(self.currency_pairs)})")
+            data = symbol_data.get(symbol)
+            if not data:
+                logger.error(f"No data available to update for {symbol}")
+                continue
+            logger.info(f"Data fetched for {symbol}: {data}")
+            percent_change = self.percent_change_from(data['close_price'], previous_closes.get(symbol))
+            logger.info(f"Percent change calculated for {symbol}: {percent_change}")
+            rows.append({
+                'date': today,
+                'ticker': symbol,
+                **data,
+                'percent_change': percent_change,
+            })
+
+        # كتابة كل الرموز في معاملة واحدة بدلاً من update_or_create لكل رمز،
+        # والمؤشرات الاقتصادية والأخبار مرة واحدة لليوم
+        try:
+            with transaction.atomic():
+                ingest_financial_data(rows)
+                store_daily_context(today, economic_indicators)
+            logger.info(f"Successfully updated data for {len(rows)} symbols")
+        except Exception as e:
+            logger.error(f"Failed to write daily data: {str(e)}")
+            raise
+        return rows
 
     def run_daily_update(self):
         """Function to run daily update"""
@@ -0,0 +1,181 @@
+"""
+Streaming CSV import for ``FinancialData``.
+
+The upload is read in chunks with ``pandas.read_csv(chunksize=...)`` so memory stays
+flat regardless of file size; each chunk is validated column-wise and written with one
+bulk upsert in its own transaction.  ``LatestQuote``, the rollups and the response cache
+are refreshed once for the whole file, after the last chunk.  Invalid rows are reported
+and skipped instead of aborting the whole file.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .bulk import refresh_market_data, touched_keys, upsert_financial_data
+
+DEFAULT_DATE_FORMAT = '%m/%d/%Y'
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+# أسماء الأعمدة المقبولة لكل حقل (بدون حساسية لحالة الأحرف)
+COLUMN_ALIASES = {
+    'date': ['date'],
+    'ticker': ['ticker', 'symbol', 'currency'],
+    'open_price': ['open'],
+    'high_price': ['high'],
+    'low_price': ['low'],
+    'close_price': ['price', 'close'],
+    'adj_close': ['adj close', 'adj_close'],
+    'volume': ['vol.', 'vol', 'volume'],
+    'percent_change': ['change %', 'change'],
+}
+PRICE_FIELDS = ['open_price', 'high_price', 'low_price', 'close_price', 'adj_close']
+# حدود أعمدة DecimalField في النموذج
+PRICE_LIMIT = 10 ** 4
+VOLUME_LIMIT = 10 ** 14
+TICKER_MAX_LENGTH = 10
+VOLUME_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+
+
+def _resolve_columns(header) -> Dict[str, str]:
+    lookup = {str(name).strip().lower(): name for name in header}
+    resolved = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                resolved[field] = lookup[alias]
+                break
+    return resolved
+
+
+def _to_number(series: pd.Series, suffixes: bool = False) -> pd.Series:
+    numbers = pd.to_numeric(series, errors='coerce')
+    # تنظيف النصوص فقط للقيم التي ليست أرقاماً مباشرة مثل "1,234" أو "0.5%" أو "1.2M"
+    dirty = numbers.isna() & series.notna()
+    if not dirty.any():
+        return numbers
+    text = series[dirty].str.strip().str.replace(',', '', regex=False).str.rstrip('%')
+    multiplier = 1.0
+    if suffixes:
+        suffix = text.str[-1:].str.upper()
+        has_suffix = suffix.isin(list(VOLUME_SUFFIXES))
+        multiplier = suffix.map(VOLUME_SUFFIXES).where(has_suffix, 1.0)
+        text = text.where(~has_suffix, text.str[:-1])
+    numbers[dirty] = pd.to_numeric(text, errors='coerce') * multiplier
+    return numbers
+
+
+def _to_decimals(values: np.ndarray) -> List[Optional[Decimal]]:
+    """Round to the model's 6 decimal places and convert a whole column at once"""
+    text = np.round(values, 6).astype(str)
+    return [None if value == 'nan' else Decimal(value) for value in text.tolist()]
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def add_error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'failed': self.failed, 'errors': self.errors}
+
+
+def import_financial_csv(fileobj, ticker: Optional[str] = None, date_format: str = DEFAULT_DATE_FORMAT,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportResult:
+    """Import a CSV upload incrementally; ``ticker`` is used when the file has no ticker column"""
+    result = ImportResult()
+    reader = pd.read_csv(fileobj, chunksize=chunk_size, dtype=str, encoding='utf-8-sig', skipinitialspace=True)
+    columns = None
+    keys = set()
+    try:
+        for chunk in reader:
+            if columns is None:
+                columns = _resolve_columns(chunk.columns)
+                missing = [field for field in ('date', 'open_price', 'high_price', 'low_price', 'close_price')
+                           if field not in columns]
+                if 'ticker' not in columns and not ticker:
+                    missing.append('ticker')
+                if missing:
+                    raise ValueError(f"Missing required columns: {', '.join(missing)}")
+            keys |= _import_chunk(chunk, columns, ticker, date_format, result)
+    finally:
+        # الدفعات المكتوبة قبل أي خطأ قد حُفظت، فتُحدَّث بياناتها المشتقة أيضاً
+        if keys:
+            refresh_market_data(keys)
+    return result
+
+
+def _import_chunk(chunk: pd.DataFrame, columns: Dict[str, str], ticker: Optional[str], date_format: str,
+                  result: ImportResult) -> set:
+    """Validate and write one chunk; returns the ``touched_keys`` of the written rows"""
+    # رقم السطر في الملف الأصلي (السطر الأول هو العناوين)
+    line_numbers = chunk.index.to_numpy() + 2
+    errors = pd.Series('', index=chunk.index)
+
+    def flag(mask, message):
+        new = mask & (errors == '')
+        errors[new] = message
+
+    dates = pd.to_datetime(chunk[columns['date']].str.strip(), format=date_format, errors='coerce')
+    flag(dates.isna(), f'invalid date (expected format {date_format})')
+
+    if 'ticker' in columns:
+        tickers = chunk[columns['ticker']].fillna(ticker or '').str.strip()
+    else:
+        tickers = pd.Series(ticker, index=chunk.index)
+    flag(tickers == '', 'missing ticker')
+    flag(tickers.str.len() > TICKER_MAX_LENGTH, f'ticker longer than {TICKER_MAX_LENGTH} characters')
+
+    values = {}
+    for field in ('open_price', 'high_price', 'low_price', 'close_price'):
+        values[field] = _to_number(chunk[columns[field]])
+    values['adj_close'] = _to_number(chunk[columns['adj_close']]) if 'adj_close' in columns else values['close_price']
+    values['adj_close'] = values['adj_close'].fillna(values['close_price'])
+    for field in PRICE_FIELDS:
+        flag(values[field].isna(), f'invalid {field}')
+        flag(values[field].abs() >= PRICE_LIMIT, f'{field} out of range')
+
+    if 'volume' in columns:
+        raw = chunk[columns['volume']]
+        values['volume'] = _to_number(raw, suffixes=True)
+        # الخانة الفارغة حجمها صفر، أما النص غير القابل للتحويل فخطأ في السطر
+        blank = raw.isna() | (raw.str.strip() == '')
+        flag(values['volume'].isna() & ~blank, 'invalid volume')
+        values['volume'] = values['volume'].fillna(0)
+    else:
+        values['volume'] = pd.Series(0.0, index=chunk.index)
+    flag(values['volume'].abs() >= VOLUME_LIMIT, 'volume out of range')
+
+    if 'percent_change' in columns:
+        values['percent_change'] = _to_number(chunk[columns['percent_change']])
+        flag(values['percent_change'].abs() >= PRICE_LIMIT, 'percent_change out of range')
+
+    invalid = (errors != '').to_numpy()
+    for line, message in zip(line_numbers[invalid], errors[invalid]):
+        result.add_error(int(line), message)
+
+    valid = ~invalid
+    if not valid.any():
+        return set()
+    valid_dates = dates[valid].dt.date.tolist()
+    valid_tickers = tickers[valid].tolist()
+    converted = {field: _to_decimals(series.to_numpy(dtype=float)[valid]) for field, series in values.items()}
+
+    # آخر قيمة تفوز إذا تكرر نفس (التاريخ، الرمز) داخل الملف
+    records = {}
+    for i, (row_date, row_ticker) in enumerate(zip(valid_dates, valid_tickers)):
+        record = {'date': row_date, 'ticker': row_ticker}
+        for field, column in converted.items():
+            record[field] = column[i]
+        records[(row_date, row_ticker)] = record
+    result.imported += upsert_financial_data(list(records.values()), batch_size=len(records))
+    result.imported += int(np.count_nonzero(valid)) - len(records)
+    return touched_keys(records.values())
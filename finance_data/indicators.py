@@ -0,0 +1,286 @@
+"""
+Vectorized technical indicators for a whole (ticker x date) panel.
+
+The formulas are the ones used by ``CurrencyDataFetcher.fetch_yahoo_finance_data``
+but every row of the panel is computed at once instead of keeping only ``.iloc[-1]``
+of a 60-day frame, so the same code serves the nightly update and multi-year
+backfills.  Each ticker's series is laid out as one row of a 2-D NumPy array
+(left aligned, NaN padded) so rolling windows never mix tickers.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# معاملات تقدير الحجم لكل زوج عملات
+CURRENCY_VOLUME_MULTIPLIERS = {
+    'EUR=X': 1.2, 'JPY=X': 1.1, 'GBP=X': 1.0, 'AUD=X': 0.8,
+    'CAD=X': 0.7, 'CHF=X': 0.7, 'CNY=X': 0.6, 'SGD=X': 0.5,
+    'NZD=X': 0.4, 'SEK=X': 0.4, 'NOK=X': 0.3, 'MXN=X': 0.3,
+    'SAR=X': 0.3, 'AED=X': 0.3, 'KWD=X': 0.5
+}
+
+PRICE_COLUMNS = ['open_price', 'high_price', 'low_price', 'close_price', 'adj_close']
+INDICATOR_COLUMNS = [
+    'rsi', 'macd', 'macd_signal', 'macd_hist', 'ma_50', 'ma_200', 'close_50ma_diff',
+    'close_200ma_diff', 'upper_bb', 'lower_bb', 'k_percent', 'd_percent', 'atr',
+    'volatility', 'next_high', 'high_change'
+]
+VALUE_COLUMNS = PRICE_COLUMNS + ['volume', 'percent_change'] + INDICATOR_COLUMNS
+
+
+def time_multiplier(hour: int) -> float:
+    """Trading-session multiplier used by the volume estimate"""
+    if 8 <= hour <= 16:
+        return 1.5
+    elif 4 <= hour <= 7 or 17 <= hour <= 20:
+        return 1.0
+    return 0.5
+
+
+def to_decimal(value, default: Optional[str] = None, places: int = 6) -> Optional[Decimal]:
+    """Same conversion as ``CurrencyDataFetcher.safe_decimal_convert``"""
+    if value is None or pd.isna(value):
+        return Decimal(default) if default else None
+    try:
+        return Decimal(str(round(float(value), places)))
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal(default) if default else None
+
+
+def panel_from_frames(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Stack per-symbol yfinance frames (Date index, Open/High/Low/Close) into a long panel"""
+    parts = []
+    for ticker, frame in frames.items():
+        if frame is None or frame.empty:
+            continue
+        part = frame[['Open', 'High', 'Low', 'Close']].copy()
+        if 'Volume' in frame.columns:
+            part['Volume'] = frame['Volume']
+        part['date'] = pd.to_datetime(frame.index).date
+        part['ticker'] = ticker
+        parts.append(part.reset_index(drop=True))
+    if not parts:
+        return pd.DataFrame(columns=['ticker', 'date', 'Open', 'High', 'Low', 'Close'])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _rolling(values: np.ndarray, window: int, func, **kwargs) -> np.ndarray:
+    """Rolling reduction along the date axis, NaN until ``window`` values are available"""
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        windows = sliding_window_view(values, window, axis=1)
+        out[:, window - 1:] = func(windows, axis=-1, **kwargs)
+    return out
+
+
+def _shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    out[:, periods:] = values[:, :-periods]
+    return out
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    idx = np.where(~np.isnan(values), np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+
+def _ewm(values: np.ndarray, span: int) -> np.ndarray:
+    """``Series.ewm(span=span, adjust=False).mean()`` for series without interior NaNs"""
+    alpha = 2.0 / (span + 1.0)
+    old_wt = 1.0 - alpha
+    out = np.empty(values.shape)
+    weighted = values[:, 0].copy()
+    out[:, 0] = weighted
+    for t in range(1, values.shape[1]):
+        cur = values[:, t]
+        blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(np.isnan(weighted), cur, np.where(np.isnan(cur) | (weighted == cur), weighted, blended))
+        out[:, t] = weighted
+    return out
+
+
+class IndicatorPanel:
+    """Columnar indicator result: one NumPy array per ``FinancialData`` field"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['ticker'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def select(self, mask: np.ndarray) -> 'IndicatorPanel':
+        return IndicatorPanel({name: values[mask] for name, values in self.columns.items()})
+
+    def to_records(self) -> Iterator[Dict]:
+        """Yield ``FinancialData`` field dicts with the same Decimal rounding as the fetcher"""
+        converted = {}
+        for name in PRICE_COLUMNS:
+            converted[name] = [to_decimal(v, '0') for v in self.columns[name].tolist()]
+        for name in INDICATOR_COLUMNS + ['percent_change']:
+            converted[name] = [to_decimal(v) for v in self.columns[name].tolist()]
+        converted['volume'] = [to_decimal(v, '0', places=0) for v in self.columns['volume'].tolist()]
+        tickers = self.columns['ticker'].tolist()
+        dates = self.columns['date'].tolist()
+        for i in range(len(tickers)):
+            record = {'date': dates[i], 'ticker': tickers[i]}
+            for name in VALUE_COLUMNS:
+                record[name] = converted[name][i]
+            yield record
+
+
+def compute_indicators(panel: pd.DataFrame, hour: Optional[int] = None) -> IndicatorPanel:
+    """Compute every ``FinancialData`` indicator column for a long (ticker, date) panel.
+
+    ``panel`` needs ``ticker``, ``date``, ``Open``, ``High``, ``Low`` and ``Close`` columns;
+    an optional ``Volume`` column is used as-is where present and non-zero, otherwise
+    the fetcher's volume estimate is applied with the session multiplier for ``hour``.
+    Values at row ``t`` equal what the fetcher computes for a frame ending at ``t``.
+    """
+    if hour is None:
+        hour = datetime.now().hour
+
+    panel = panel.sort_values(['ticker', 'date'], kind='mergesort').reset_index(drop=True)
+    n_rows = len(panel)
+    tickers = panel['ticker'].to_numpy(dtype=object)
+    dates = panel['date'].to_numpy(dtype=object)
+    if n_rows == 0:
+        empty = {name: np.array([], dtype=float) for name in VALUE_COLUMNS}
+        return IndicatorPanel({'ticker': tickers, 'date': dates, **empty})
+
+    names, codes, counts = np.unique(tickers.astype(str), return_inverse=True, return_counts=True)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(n_rows) - starts[codes]
+    shape = (len(names), int(counts.max()))
+
+    def layout(column):
+        grid = np.full(shape, np.nan)
+        grid[codes, pos] = panel[column].astype(float).to_numpy()
+        return grid
+
+    open_, high, low, raw_close = layout('Open'), layout('High'), layout('Low'), layout('Close')
+    length = pos + 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        close = _ffill(raw_close)
+
+        # RSI
+        price_diff = close - _shift(close)
+        gains = np.where(price_diff > 0, price_diff, 0.0)
+        losses = -np.where(price_diff < 0, price_diff, 0.0)
+        rs = _rolling(gains, 14, np.mean) / _rolling(losses, 14, np.mean)
+        rsi = 100 - (100 / (1 + rs))
+
+        # MACD
+        macd_line = _ewm(close, 12) - _ewm(close, 26)
+        signal_line = _ewm(macd_line, 9)
+        macd_histogram = macd_line - signal_line
+
+        # المتوسطات المتحركة وبولينجر باند
+        ma_50 = _rolling(close, 50, np.mean)
+        ma_200 = _rolling(close, 200, np.mean)
+        ma_20 = _rolling(close, 20, np.mean)
+        std_20 = _rolling(close, 20, np.std, ddof=1)
+        upper_bb = ma_20 + (2 * std_20)
+        lower_bb = ma_20 - (2 * std_20)
+
+        # ستوكاستيك %K و %D
+        high_14 = _rolling(high, 14, np.max)
+        low_14 = _rolling(low, 14, np.min)
+        k_valid = ~np.isnan(high_14) & ~np.isnan(low_14) & (high_14 - low_14 != 0)
+        k_all = 100 * ((close - low_14) / (high_14 - low_14))
+        k_percent = np.where(k_valid, k_all, np.nan)
+        k_sum = np.zeros(shape)
+        k_count = np.zeros(shape)
+        for lag in (2, 1, 0):
+            lagged_valid = k_valid if lag == 0 else (_shift(k_valid.astype(float), lag) == 1)
+            lagged_k = k_all if lag == 0 else _shift(k_all, lag)
+            k_sum = k_sum + np.where(lagged_valid, lagged_k, 0.0)
+            k_count = k_count + lagged_valid
+        d_percent = np.where(k_valid & (k_count > 0), k_sum / np.maximum(k_count, 1), np.nan)
+
+        # ATR والتقلب
+        prev_close = _shift(raw_close)
+        true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        atr = _rolling(true_range, 14, np.mean)
+        returns = close / _shift(close) - 1
+        volatility = _rolling(returns, 14, np.std, ddof=1)
+
+        # Next_High
+        padded_high = np.concatenate([np.full((shape[0], 4), np.nan), high], axis=1)
+        high_windows = sliding_window_view(padded_high, 5, axis=1)
+        high_count = (~np.isnan(high_windows)).sum(axis=-1)
+        next_high = np.where(high_count > 0, np.nansum(high_windows, axis=-1) / np.maximum(high_count, 1), np.nan)
+        high_change = np.where(close != 0, ((next_high - close) / close) * 100, np.nan)
+
+        # تقدير الحجم
+        tick_count = _rolling((raw_close != _shift(raw_close)).astype(float), 14, np.sum)
+        base_volume = (np.nan_to_num(atr) * 1000000) * (1 + np.nan_to_num(volatility)) * np.nan_to_num(tick_count)
+
+    def flat(grid):
+        return grid[codes, pos]
+
+    pair_multiplier = np.array([CURRENCY_VOLUME_MULTIPLIERS.get(name, 1.0) for name in names])[codes]
+    estimated_volume = np.round(flat(base_volume) * pair_multiplier * time_multiplier(hour), 0)
+    if 'Volume' in panel.columns:
+        given_volume = panel['Volume'].astype(float).to_numpy()
+        volume = np.where(np.isnan(given_volume) | (given_volume == 0), estimated_volume, given_volume)
+    else:
+        volume = estimated_volume
+
+    macd_ready = length >= 26
+    close_flat = flat(close)
+    raw_close_flat = flat(raw_close)
+
+    # نسبة التغير مقارنة بإغلاق اليوم السابق (تاريخ أمس بالضبط كما في calculate_percent_change)
+    rounded_close = np.array([float(to_decimal(v, '0')) for v in raw_close_flat.tolist()])
+    prev_rounded = np.concatenate(([np.nan], rounded_close[:-1]))
+    prev_is_yesterday = np.zeros(n_rows, dtype=bool)
+    prev_is_yesterday[1:] = (pos[1:] > 0) & np.array(
+        [dates[i] - timedelta(days=1) == dates[i - 1] for i in range(1, n_rows)], dtype=bool
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_change = np.where(
+            prev_is_yesterday & (prev_rounded != 0),
+            (rounded_close - prev_rounded) / prev_rounded * 100,
+            0.0
+        )
+
+    columns = {
+        'ticker': tickers,
+        'date': dates,
+        'open_price': flat(open_),
+        'high_price': flat(high),
+        'low_price': flat(low),
+        'close_price': raw_close_flat,
+        'adj_close': raw_close_flat,
+        'volume': volume,
+        'percent_change': percent_change,
+        'rsi': flat(rsi),
+        'macd': np.where(macd_ready, flat(macd_line), np.nan),
+        'macd_signal': np.where(macd_ready, flat(signal_line), np.nan),
+        'macd_hist': np.where(macd_ready, flat(macd_histogram), np.nan),
+        'ma_50': flat(ma_50),
+        'ma_200': flat(ma_200),
+        'close_50ma_diff': close_flat - flat(ma_50),
+        'close_200ma_diff': close_flat - flat(ma_200),
+        'upper_bb': flat(upper_bb),
+        'lower_bb': flat(lower_bb),
+        'k_percent': flat(k_percent),
+        'd_percent': np.where(length >= 17, flat(d_percent), np.nan),
+        'atr': flat(atr),
+        'volatility': flat(volatility),
+        'next_high': flat(next_high),
+        'high_change': flat(high_change),
+    }
+    return IndicatorPanel(columns)
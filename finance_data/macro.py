@@ -0,0 +1,71 @@
+"""
+Per-date economic context stored next to, not inside, ``FinancialData``.
+
+The macro indicators and the news headlines are the same for every ticker on a given
+day, so they live in ``MacroSnapshot`` and ``NewsDigest`` (one row per date) and the
+market-data rows stay narrow.  API clients that still want them ask for
+``include=macro`` and/or ``include=news``; the context of a page is then loaded with
+one primary-key query per table and merged into each row under the old field names.
+"""
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+
+from .models import MacroSnapshot, NewsDigest
+
+MACRO_FIELDS = ['interest_rate', 'inflation', 'dxy', 'market_sentiment']
+NEWS_FIELD = 'economic_news'
+INCLUDE_OPTIONS = ('macro', 'news')
+
+
+def store_daily_context(day, indicators):
+    """Upsert the macro snapshot and the news digest of ``day`` from the fetcher's indicators"""
+    update_conflicts = {'update_conflicts': True}
+    if connection.features.supports_update_conflicts_with_target:
+        update_conflicts['unique_fields'] = ['date']
+    macro = {name: indicators.get(name) for name in MACRO_FIELDS}
+    MacroSnapshot.objects.bulk_create([MacroSnapshot(date=day, **macro)], update_fields=MACRO_FIELDS,
+                                      **update_conflicts)
+    if indicators.get(NEWS_FIELD):
+        NewsDigest.objects.bulk_create([NewsDigest(date=day, headlines=indicators[NEWS_FIELD])],
+                                       update_fields=['headlines'], **update_conflicts)
+
+
+def requested_includes(request):
+    """Parse include=macro,news"""
+    value = request.query_params.get('include')
+    if not value:
+        return set()
+    include = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = include - set(INCLUDE_OPTIONS)
+    if unknown:
+        raise ValidationError({'include': f"Unknown values: {', '.join(sorted(unknown))}"})
+    return include
+
+
+def context_by_date(dates, include):
+    """Map date -> {field: value} with the requested context of ``dates``"""
+    dates = set(dates)
+    context = {day: {} for day in dates}
+    if 'macro' in include:
+        for day, *values in MacroSnapshot.objects.filter(date__in=dates).values_list('date', *MACRO_FIELDS):
+            # نفس تمثيل DRF للقيم العشرية
+            context[day].update((name, None if value is None else str(value))
+                                for name, value in zip(MACRO_FIELDS, values))
+        for values in context.values():
+            for name in MACRO_FIELDS:
+                values.setdefault(name, None)
+    if 'news' in include:
+        news = dict(NewsDigest.objects.filter(date__in=dates).values_list('date', 'headlines'))
+        for day, values in context.items():
+            values[NEWS_FIELD] = news.get(day)
+    return context
+
+
+def attach_context(instances, rows, include):
+    """Merge the requested context into serialized ``rows`` (same order as ``instances``)"""
+    if not include:
+        return rows
+    context = context_by_date((instance.date for instance in instances), include)
+    for instance, row in zip(instances, rows):
+        row.update(context[instance.date])
+    return rows
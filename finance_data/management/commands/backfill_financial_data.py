@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from finance_data.bulk import DEFAULT_BATCH_SIZE, chunked, refresh_market_data, touched_keys, upsert_financial_data
+from finance_data.indicators import compute_indicators, panel_from_frames
+
+# أيام إضافية قبل تاريخ البداية حتى تكتمل المتوسطات المتحركة (200 يوم تداول)
+WARMUP_DAYS = 400
+
+SOURCES = {
+    'forex-csv': os.path.join(settings.BASE_DIR, 'finance_data', 'forex_data.csv'),
+    'currency-csv': os.path.join(settings.BASE_DIR, 'Data', 'currency_data.csv'),
+    'yahoo': None,
+}
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, 'backfill_checkpoint.json')
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Use YYYY-MM-DD.")
+
+
+def load_forex_csv(path):
+    """Currency,Date(M/D/YYYY),Open,High,Low,Close,Volume"""
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y').dt.date
+    return df.rename(columns={'Currency': 'ticker'})[['ticker', 'date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+def load_currency_csv(path):
+    """yfinance export with a (field, ticker) two-row header and one column block per ticker"""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        fields = next(reader)
+        tickers = next(reader)
+    blocks = {}
+    for index, (field, ticker) in enumerate(zip(fields, tickers)):
+        if ticker and field in ('Open', 'High', 'Low', 'Close', 'Volume'):
+            blocks.setdefault(ticker, {})[field] = index
+    raw = pd.read_csv(path, header=None, skiprows=2, dtype=str)
+    parts = []
+    for ticker, columns in blocks.items():
+        part = pd.DataFrame({field: pd.to_numeric(raw[index], errors='coerce') for field, index in columns.items()})
+        part['date'] = pd.to_datetime(raw[0]).dt.date
+        part['ticker'] = ticker
+        parts.append(part.dropna(subset=['Close']))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def load_yahoo(tickers, start, end):
+    from finance_data.fetch_financial_data import CurrencyDataFetcher
+    fetcher = CurrencyDataFetcher()
+    tickers = tickers or fetcher.currency_pairs
+    frames = fetcher.download_batch(tickers, start=start.isoformat(), end=(end + timedelta(days=1)).isoformat())
+    return panel_from_frames(frames)
+
+
+class Command(BaseCommand):
+    help = "Backfill FinancialData (prices and indicators) for a date range using chunked bulk upserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help='First date to write (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to write (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--tickers', nargs='+', help='Tickers to load, defaults to every ticker in the source')
+        parser.add_argument('--source', choices=sorted(SOURCES), default='forex-csv')
+        parser.add_argument('--csv-path', help='Override the CSV file used by the csv sources')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='JSON file used to resume interrupted runs')
+        parser.add_argument('--reset', action='store_true', help='Ignore any saved checkpoint for this run')
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start'])
+        end = parse_date(options['end']) if options['end'] else date.today()
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        tickers = options['tickers']
+        source = options['source']
+
+        panel = self.load_panel(source, options['csv_path'], tickers, start, end)
+        if panel.empty:
+            raise CommandError(f'No rows found in {source} for the requested tickers and dates')
+
+        # مجموعة الرموز جزء من المفتاح حتى لا يستأنف تشغيل بمجموعة مختلفة من نقطة تشغيل آخر
+        job = f"{source}:{start.isoformat()}:{end.isoformat()}:{','.join(sorted(set(tickers))) if tickers else '*'}"
+        checkpoints = self.read_checkpoints(options['checkpoint'])
+        done = {} if options['reset'] else checkpoints.get(job, {})
+
+        started = time.monotonic()
+        result = compute_indicators(panel)
+        dates = result['date']
+        resume_after = np.array([done.get(ticker, '') for ticker in result['ticker']], dtype=object)
+        iso_dates = np.array([d.isoformat() for d in dates], dtype=object)
+        mask = (dates >= start) & (dates <= end) & (iso_dates > resume_after)
+        pending = result.select(mask)
+        total = len(pending)
+        self.stdout.write(
+            f'Indicators computed for {len(result)} rows in {time.monotonic() - started:.1f}s; '
+            f'{total} rows to write ({int(mask.size - mask.sum())} skipped or outside the range)'
+        )
+
+        written = 0
+        keys = set()
+        try:
+            for chunk in chunked(pending.to_records(), options['chunk_size']):
+                upsert_financial_data(chunk, batch_size=options['chunk_size'])
+                written += len(chunk)
+                keys |= touched_keys(chunk)
+                for record in chunk:
+                    done[record['ticker']] = max(done.get(record['ticker'], ''), record['date'].isoformat())
+                checkpoints[job] = done
+                self.write_checkpoints(options['checkpoint'], checkpoints)
+                last = chunk[-1]
+                self.stdout.write(f'{written}/{total} rows ({written / total:.0%}) - '
+                                  f'{last["ticker"]} up to {last["date"]}')
+        finally:
+            # آخر الأسعار والشموع الأسبوعية والشهرية مرة واحدة للتشغيل، حتى عند الانقطاع
+            if keys:
+                refresh_market_data(keys)
+
+        checkpoints.pop(job, None)
+        self.write_checkpoints(options['checkpoint'], checkpoints)
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {written} rows for {len(set(pending["ticker"]))} tickers in {time.monotonic() - started:.1f}s'
+        ))
+
+    def load_panel(self, source, csv_path, tickers, start, end):
+        if source == 'yahoo':
+            panel = load_yahoo(tickers, start - timedelta(days=WARMUP_DAYS), end)
+        else:
+            path = csv_path or SOURCES[source]
+            if not os.path.exists(path):
+                raise CommandError(f'CSV file not found: {path}')
+            loader = load_forex_csv if source == 'forex-csv' else load_currency_csv
+            panel = loader(path)
+        if panel.empty:
+            return panel
+        if tickers:
+            panel = panel[panel['ticker'].isin(tickers)]
+        warmup_start = start - timedelta(days=WARMUP_DAYS)
+        panel = panel[(panel['date'] >= warmup_start) & (panel['date'] <= end)]
+        return panel.drop_duplicates(['ticker', 'date'], keep='last')
+
+    def read_checkpoints(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def write_checkpoints(self, path, checkpoints):
+        if not path:
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoints, f, indent=2)
+        os.replace(tmp_path, path)
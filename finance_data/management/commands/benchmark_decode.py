@@ -0,0 +1,59 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import DecimalField
+
+from finance_data.models import FinancialData
+from finance_data.numeric import float_array
+
+# كل الأعمدة العشرية في FinancialData
+NUMERIC_FIELDS = [field.name for field in FinancialData._meta.concrete_fields if isinstance(field, DecimalField)]
+
+
+class Command(BaseCommand):
+    help = "Compare the cost of reading FinancialData numbers as Decimal vs DB-side float casts (per 100k rows)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--fields', default=','.join(NUMERIC_FIELDS),
+                            help='comma-separated numeric fields to read')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1 or options['rows'] < 1:
+            raise CommandError('--rows and --runs must be at least 1')
+        fields = [name.strip() for name in options['fields'].split(',') if name.strip()]
+        unknown = set(fields) - set(NUMERIC_FIELDS)
+        if unknown:
+            raise CommandError(f"Not numeric FinancialData fields: {', '.join(sorted(unknown))}")
+
+        queryset = FinancialData.objects.order_by('ticker', 'date')[:options['rows']]
+        rows = queryset.count()
+        if not rows:
+            raise CommandError('FinancialData is empty')
+
+        def decimal_path():
+            # المسار الحالي: كائنات Decimal ثم تحويلها إلى float
+            return np.array([[np.nan if value is None else float(value) for value in row]
+                             for row in queryset.values_list(*fields)], dtype=np.float64)
+
+        def float_path():
+            return float_array(queryset, fields)
+
+        if not np.allclose(decimal_path(), float_path(), equal_nan=True):
+            raise CommandError('Decimal and float reads disagree')
+
+        scale = 100_000 / rows
+        results = {}
+        for name, read in (('decimal', decimal_path), ('float', float_path)):
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                read()
+                timings.append(time.perf_counter() - started)
+            results[name] = statistics.median(timings) * scale
+            self.stdout.write(f"{name:>8}: {results[name] * 1000:.1f} ms per 100k rows "
+                              f"({len(fields)} columns, {rows} rows, median of {len(timings)} runs)")
+        self.stdout.write(self.style.SUCCESS(f"float path is {results['decimal'] / results['float']:.1f}x faster"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from finance_data.partitions import DEFAULT_AHEAD, DEFAULT_GRANULARITY, GRANULARITIES, execute, planned_statements
+
+
+class Command(BaseCommand):
+    help = "Partition FinancialData by date range (MySQL) and create the partitions of the coming periods"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--granularity', choices=GRANULARITIES, default=DEFAULT_GRANULARITY)
+        parser.add_argument('--ahead', type=int, default=DEFAULT_AHEAD,
+                            help='number of future periods to create partitions for')
+        parser.add_argument('--dry-run', action='store_true', help='print the statements without running them')
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+        if connection.vendor != 'mysql' and not options['dry_run']:
+            raise CommandError(f"Range partitioning needs MySQL (database vendor is '{connection.vendor}'); "
+                               "use --dry-run to print the statements")
+
+        statements = planned_statements(options['granularity'], options['ahead'])
+        if not statements:
+            self.stdout.write('Partitions are up to date')
+            return
+        for statement in statements:
+            self.stdout.write(statement + ';')
+        if options['dry_run']:
+            return
+        # ALTER TABLE ينسخ الجدول عند أول تقسيم، وقد يستغرق وقتاً على جدول كبير
+        execute(statements)
+        self.stdout.write(self.style.SUCCESS(f"Executed {len(statements)} statements"))
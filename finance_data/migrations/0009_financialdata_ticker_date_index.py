@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0008_alter_financialdata_adj_close'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['ticker', 'date'], name='financialdata_ticker_date'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_latest_quotes(apps, schema_editor):
+    FinancialData = apps.get_model('finance_data', 'FinancialData')
+    LatestQuote = apps.get_model('finance_data', 'LatestQuote')
+    quotes = []
+    for item in FinancialData.objects.values('ticker').annotate(latest=Max('date')).order_by():
+        rows = list(FinancialData.objects.filter(ticker=item['ticker'], date__lte=item['latest'])
+                    .order_by('-date').values_list('id', 'date', 'open_price', 'high_price', 'low_price',
+                                                   'close_price', 'volume', 'percent_change')[:2])
+        pk, day, open_price, high_price, low_price, close_price, volume, percent_change = rows[0]
+        quotes.append(LatestQuote(
+            ticker=item['ticker'], financial_data_id=pk, date=day, open_price=open_price, high_price=high_price,
+            low_price=low_price, close_price=close_price, volume=volume, percent_change=percent_change,
+            previous_close=rows[1][5] if len(rows) > 1 else None,
+        ))
+    LatestQuote.objects.bulk_create(quotes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0009_financialdata_ticker_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestQuote',
+            fields=[
+                ('ticker', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('open_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('high_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('low_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('close_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('volume', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('percent_change', models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True)),
+                ('previous_close', models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('financial_data', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='finance_data.financialdata')),
+            ],
+        ),
+        migrations.RunPython(populate_latest_quotes, migrations.RunPython.noop),
+    ]
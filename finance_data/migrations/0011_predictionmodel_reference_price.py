@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0010_latestquote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionmodel',
+            name='reference_price',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0011_predictionmodel_reference_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='predictionmodel',
+            index=models.Index(fields=['prediction_date'], name='prediction_date_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_periods(apps, schema_editor):
+    # الإبقاء على أحدث صف لكل (user, period_start, period_end) قبل إضافة القيد
+    TradingAnalytics = apps.get_model('finance_data', 'TradingAnalytics')
+    duplicates = (
+        TradingAnalytics.objects.values('user_id', 'period_start', 'period_end')
+        .annotate(keep=models.Max('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        TradingAnalytics.objects.filter(
+            user_id=group['user_id'], period_start=group['period_start'], period_end=group['period_end'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0012_predictionmodel_prediction_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_periods, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tradinganalytics',
+            constraint=models.UniqueConstraint(fields=('user', 'period_start', 'period_end'),
+                                               name='analytics_user_period_uniq'),
+        ),
+    ]
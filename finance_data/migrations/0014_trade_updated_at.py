@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0013_tradinganalytics_unique_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('finance_data', '0014_trade_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('day', models.DateField()),
+                ('trades_today', models.IntegerField(default=0)),
+                ('realized_loss_today', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('open_exposure', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+            ],
+        ),
+    ]
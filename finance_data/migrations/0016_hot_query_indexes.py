@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:19
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0015_riskcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='entry_day',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast('entry_date', models.DateField()), output_field=models.DateField()),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['is_active', 'ticker', 'condition', 'value'], name='alert_active_lookup'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['date', '-percent_change'], name='financialdata_date_change'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status'], name='trade_user_status'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'entry_day'], name='trade_user_entry_day'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['status', 'ticker'], name='trade_status_ticker'),
+        ),
+    ]
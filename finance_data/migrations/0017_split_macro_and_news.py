@@ -0,0 +1,83 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:21
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+MACRO_FIELDS = ['interest_rate', 'inflation', 'dxy', 'market_sentiment']
+
+
+def copy_context_out(apps, schema_editor):
+    # القيم متطابقة لكل الرموز في نفس اليوم، فيكفي تجميع واحد حسب التاريخ
+    FinancialData = apps.get_model('finance_data', 'FinancialData')
+    MacroSnapshot = apps.get_model('finance_data', 'MacroSnapshot')
+    NewsDigest = apps.get_model('finance_data', 'NewsDigest')
+    days = FinancialData.objects.values('date').annotate(
+        **{name: Max(name) for name in MACRO_FIELDS}, news=Max('economic_news'),
+    ).order_by()
+    snapshots, digests = [], []
+    for day in days.iterator(chunk_size=2000):
+        if any(day[name] is not None for name in MACRO_FIELDS):
+            snapshots.append(MacroSnapshot(date=day['date'], **{name: day[name] for name in MACRO_FIELDS}))
+        if day['news']:
+            digests.append(NewsDigest(date=day['date'], headlines=day['news']))
+    MacroSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    NewsDigest.objects.bulk_create(digests, batch_size=1000)
+
+
+def copy_context_back(apps, schema_editor):
+    FinancialData = apps.get_model('finance_data', 'FinancialData')
+    MacroSnapshot = apps.get_model('finance_data', 'MacroSnapshot')
+    NewsDigest = apps.get_model('finance_data', 'NewsDigest')
+    snapshot = MacroSnapshot.objects.filter(date=OuterRef('date'))
+    FinancialData.objects.update(
+        **{name: Subquery(snapshot.values(name)[:1]) for name in MACRO_FIELDS},
+        economic_news=Subquery(NewsDigest.objects.filter(date=OuterRef('date')).values('headlines')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0016_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MacroSnapshot',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('interest_rate', models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True)),
+                ('inflation', models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True)),
+                ('dxy', models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True)),
+                ('market_sentiment', models.DecimalField(blank=True, decimal_places=6, max_digits=20, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NewsDigest',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('headlines', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.RunPython(copy_context_out, copy_context_back),
+        migrations.RemoveField(
+            model_name='financialdata',
+            name='dxy',
+        ),
+        migrations.RemoveField(
+            model_name='financialdata',
+            name='economic_news',
+        ),
+        migrations.RemoveField(
+            model_name='financialdata',
+            name='inflation',
+        ),
+        migrations.RemoveField(
+            model_name='financialdata',
+            name='interest_rate',
+        ),
+        migrations.RemoveField(
+            model_name='financialdata',
+            name='market_sentiment',
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.5 on 2026-10-18 06:29
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    FinancialData = apps.get_model('finance_data', 'FinancialData')
+    periods = [
+        (apps.get_model('finance_data', 'WeeklyBar'), lambda day: day - timedelta(days=day.weekday())),
+        (apps.get_model('finance_data', 'MonthlyBar'), lambda day: day.replace(day=1)),
+    ]
+    tickers = FinancialData.objects.values_list('ticker', flat=True).distinct().order_by()
+    for ticker in list(tickers):
+        rows = FinancialData.objects.filter(ticker=ticker).order_by('date').values_list(
+            'date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume')
+        for model, start_of in periods:
+            bars = {}
+            for day, open_price, high_price, low_price, close_price, volume in rows:
+                bar = bars.get(start_of(day))
+                if bar is None:
+                    bars[start_of(day)] = model(ticker=ticker, date=start_of(day), last_date=day,
+                                                open_price=open_price, high_price=high_price, low_price=low_price,
+                                                close_price=close_price, volume=volume, bars=1)
+                    continue
+                bar.high_price = max(bar.high_price, high_price)
+                bar.low_price = min(bar.low_price, low_price)
+                bar.close_price, bar.last_date = close_price, day
+                bar.volume += volume
+                bar.bars += 1
+            model.objects.bulk_create(bars.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_data', '0017_split_macro_and_news'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('open_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('high_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('low_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('close_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('volume', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('bars', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'date'), name='monthlybar_ticker_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('open_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('high_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('low_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('close_price', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('volume', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('bars', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'date'), name='weeklybar_ticker_date')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
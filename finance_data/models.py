@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 import random
 import string
 from django.contrib.auth import get_user_model
@@ -25,10 +28,6 @@ class FinancialData(models.Model):
     
     percent_change = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
 
-    interest_rate = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
-    inflation = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
-    dxy = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
-
     label = models.CharField(max_length=20, null=True, blank=True)  # يمكن أن يكون "Buy" أو "Sell" بناءً على المودل
       
     ma_50 = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
@@ -43,11 +42,16 @@ class FinancialData(models.Model):
     volatility = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
     next_high = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
     high_change = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
-    market_sentiment = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
-    economic_news = models.TextField(null=True, blank=True)  # إضافة حقل للأخبار الاقتصادية
 
     class Meta:
         unique_together = ('date', 'ticker')
+        indexes = [
+            # ترقيم الصفحات بالمؤشر (ticker, date) في واجهات القوائم، ويخدم أيضاً
+            # ticker=... ORDER BY date DESC (نوافذ التوقع وآخر سعر) بالمسح العكسي
+            models.Index(fields=['ticker', 'date'], name='financialdata_ticker_date'),
+            # ملخص السوق: date=... ORDER BY percent_change
+            models.Index(fields=['date', '-percent_change'], name='financialdata_date_change'),
+        ]
 
     def __str__(self):
         
@@ -56,6 +60,83 @@ class FinancialData(models.Model):
 
 
 
+class MacroSnapshot(models.Model):
+    """
+    المؤشرات الاقتصادية ليوم واحد (صف واحد لكل تاريخ بدلاً من تكرارها مع كل رمز في FinancialData)
+    """
+    date = models.DateField(primary_key=True)
+    interest_rate = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    inflation = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    dxy = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    market_sentiment = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
+
+    def __str__(self):
+        return f"Macro {self.date}"
+
+
+class NewsDigest(models.Model):
+    """عناوين الأخبار الاقتصادية ليوم واحد"""
+    date = models.DateField(primary_key=True)
+    headlines = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"News {self.date}"
+
+
+class LatestQuote(models.Model):
+    """
+    آخر شمعة لكل رمز، تُحدَّث مع كل كتابة في FinancialData عبر finance_data.quotes
+    """
+    ticker = models.CharField(max_length=10, primary_key=True)
+    # بدون قيد في قاعدة البيانات حتى لا يعيق الحذف أو الإدراج المجمّع لـ FinancialData
+    financial_data = models.ForeignKey(FinancialData, on_delete=models.DO_NOTHING, db_constraint=False,
+                                       related_name='+')
+    date = models.DateField()
+    open_price = models.DecimalField(max_digits=10, decimal_places=6)
+    high_price = models.DecimalField(max_digits=10, decimal_places=6)
+    low_price = models.DecimalField(max_digits=10, decimal_places=6)
+    close_price = models.DecimalField(max_digits=10, decimal_places=6)
+    volume = models.DecimalField(max_digits=20, decimal_places=6)
+    percent_change = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    previous_close = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ticker} @ {self.date}: {self.close_price}"
+
+
+class PriceRollup(models.Model):
+    """
+    شمعة مجمّعة لفترة كاملة، تُحدَّث مع كل كتابة في FinancialData عبر finance_data.rollups
+    """
+    ticker = models.CharField(max_length=10)
+    # بداية الفترة (الاثنين للأسبوع، أول الشهر للشهر) حتى يعمل ترقيم الصفحات بـ (ticker, date)
+    date = models.DateField()
+    last_date = models.DateField()  # آخر يوم تداول داخل الفترة
+    open_price = models.DecimalField(max_digits=10, decimal_places=6)
+    high_price = models.DecimalField(max_digits=10, decimal_places=6)
+    low_price = models.DecimalField(max_digits=10, decimal_places=6)
+    close_price = models.DecimalField(max_digits=10, decimal_places=6)
+    volume = models.DecimalField(max_digits=20, decimal_places=6)
+    bars = models.PositiveIntegerField()  # عدد الأيام المجمّعة
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.ticker} {self.date}..{self.last_date}: {self.close_price}"
+
+
+class WeeklyBar(PriceRollup):
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['ticker', 'date'], name='weeklybar_ticker_date')]
+
+
+class MonthlyBar(PriceRollup):
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['ticker', 'date'], name='monthlybar_ticker_date')]
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     
@@ -124,23 +205,61 @@ class Trade(models.Model):
     leverage = models.DecimalField(max_digits=5, decimal_places=2, default=1.0)
     commission = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(null=True, blank=True)
+    # لمعرفة الصفقات التي تغيّرت منذ آخر تحديث للأرصدة
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # يوم الدخول (UTC) كعمود مخزَّن قابل للفهرسة بدلاً من entry_date__date
+    entry_day = models.GeneratedField(expression=Cast('entry_date', models.DateField()),
+                                      output_field=models.DateField(), db_persist=True)
 
-    def calculate_profit_loss(self):
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='trade_user_status'),
+            models.Index(fields=['user', 'entry_day'], name='trade_user_entry_day'),
+            # فحص الصفقات المفتوحة لكل الرموز
+            models.Index(fields=['status', 'ticker'], name='trade_status_ticker'),
+        ]
+
+    @staticmethod
+    def compute_profit_loss(trade_type, entry_price, exit_price, quantity, leverage, commission):
+        if trade_type == 'BUY':
+            profit_loss = (exit_price - entry_price) * quantity * leverage
+        else:
+            profit_loss = (entry_price - exit_price) * quantity * leverage
+        return profit_loss - commission
+
+    def calculate_profit_loss(self, save=True):
         if self.exit_price and self.status == 'CLOSED':
-            if self.trade_type == 'BUY':
-                self.profit_loss = (self.exit_price - self.entry_price) * self.quantity * self.leverage
-            else:
-                self.profit_loss = (self.entry_price - self.exit_price) * self.quantity * self.leverage
-            self.profit_loss -= self.commission
-            self.save()
+            self.profit_loss = self.compute_profit_loss(self.trade_type, self.entry_price, self.exit_price,
+                                                        self.quantity, self.leverage, self.commission)
+            if save:
+                self.save()
         return self.profit_loss
 
+    @staticmethod
+    def notional(quantity, entry_price, leverage):
+        """قيمة المركز مع الرافعة (تُستخدم في عداد التعرض المفتوح)"""
+        return Decimal(str(quantity)) * Decimal(str(entry_price)) * Decimal(str(leverage))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # تحديث عدادات المخاطر اليومية للمستخدم
+            loss = -self.profit_loss if self.status == 'CLOSED' and (self.profit_loss or 0) < 0 else 0
+            exposure = self.notional(self.quantity, self.entry_price, self.leverage) if self.status == 'OPEN' else 0
+            RiskCounter.apply({self.user_id: (1, loss, exposure)})
+
     def close_trade(self, exit_price):
+        was_open = self.status == 'OPEN'
         self.exit_price = exit_price
         self.exit_date = timezone.now()
         self.status = 'CLOSED'
-        self.calculate_profit_loss()
+        # حفظ واحد بدلاً من حفظين
+        self.calculate_profit_loss(save=False)
         self.save()
+        if was_open:
+            loss = max(-(self.profit_loss or 0), 0)
+            RiskCounter.apply({self.user_id: (0, loss, -self.notional(self.quantity, self.entry_price, self.leverage))})
 
     def __str__(self):
         return f"{self.user.username} - {self.ticker} - {self.trade_type}"
@@ -162,6 +281,8 @@ class PredictionModel(models.Model):
     ticker = models.CharField(max_length=10)
     prediction_date = models.DateField()
     predicted_price = models.DecimalField(max_digits=10, decimal_places=6)
+    # آخر سعر إغلاق معروف وقت التوقع (لقياس صحة الاتجاه)
+    reference_price = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
     prediction_period = models.CharField(max_length=2, choices=PREDICTION_PERIODS)
     confidence_score = models.DecimalField(max_digits=5, decimal_places=2)
     model_version = models.CharField(max_length=50)
@@ -171,6 +292,12 @@ class PredictionModel(models.Model):
     prediction_type = models.CharField(max_length=20, choices=PREDICTION_TYPES)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # التقييم الليلي والإحصائيات تعمل على نطاق من تواريخ التوقع فقط
+            models.Index(fields=['prediction_date'], name='prediction_date_idx'),
+        ]
+
     def calculate_accuracy(self):
         if self.actual_price and self.predicted_price:
             diff = abs(self.actual_price - self.predicted_price)
@@ -196,24 +323,56 @@ class TradingAnalytics(models.Model):
     average_holding_period = models.DurationField(null=True)
     risk_reward_ratio = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     
+    # أكبر قيمة لنسبة المخاطرة/العائد يقبلها الحقل (max_digits=5, decimal_places=2)
+    MAX_RISK_REWARD = Decimal('999.99')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period_start', 'period_end'], name='analytics_user_period_uniq'),
+        ]
+
+    @staticmethod
+    def trade_aggregates():
+        """التجميعات المحسوبة في قاعدة البيانات على الصفقات المغلقة"""
+        profit_loss = Coalesce('profit_loss', Value(Decimal('0')), output_field=models.DecimalField())
+        return {
+            'total_trades': Count('id'),
+            'winning_trades': Count('id', filter=Q(profit_loss__gt=0)),
+            'losing_trades': Count('id', filter=Q(profit_loss__lt=0)),
+            'total_profit_loss': Sum('profit_loss'),
+            'largest_gain': Max(profit_loss),
+            'largest_loss': Min(profit_loss),
+            'average_holding_period': Avg(ExpressionWrapper(F('exit_date') - F('entry_date'),
+                                                            output_field=models.DurationField()),
+                                          filter=Q(exit_date__isnull=False)),
+            'average_win': Avg('profit_loss', filter=Q(profit_loss__gt=0)),
+            'average_loss': Avg('profit_loss', filter=Q(profit_loss__lt=0)),
+        }
+
+    def apply_aggregates(self, row):
+        """نقل نتيجة trade_aggregates إلى حقول الجدول"""
+        self.total_trades = row.get('total_trades') or 0
+        self.winning_trades = row.get('winning_trades') or 0
+        self.losing_trades = row.get('losing_trades') or 0
+        self.win_rate = round(Decimal(self.winning_trades * 100) / self.total_trades, 2) if self.total_trades else 0
+        self.total_profit_loss = row.get('total_profit_loss') or 0
+        self.largest_gain = row.get('largest_gain') or 0
+        self.largest_loss = row.get('largest_loss') or 0
+        self.average_holding_period = row.get('average_holding_period')
+        average_win, average_loss = row.get('average_win'), row.get('average_loss')
+        if average_win and average_loss:
+            ratio = Decimal(average_win) / abs(Decimal(average_loss))
+            self.risk_reward_ratio = min(round(ratio, 2), self.MAX_RISK_REWARD)
+        else:
+            self.risk_reward_ratio = 0
+
     def calculate_analytics(self):
-        trades = Trade.objects.filter(
+        row = Trade.objects.filter(
             user=self.user,
-            entry_date__date__range=(self.period_start, self.period_end),
+            entry_day__range=(self.period_start, self.period_end),
             status='CLOSED'
-        )
-        
-        self.total_trades = trades.count()
-        self.winning_trades = trades.filter(profit_loss__gt=0).count()
-        self.losing_trades = trades.filter(profit_loss__lt=0).count()
-        
-        if self.total_trades > 0:
-            self.win_rate = (self.winning_trades / self.total_trades) * 100
-            
-        self.total_profit_loss = sum(trade.profit_loss or 0 for trade in trades)
-        self.largest_gain = max((trade.profit_loss or 0) for trade in trades)
-        self.largest_loss = min((trade.profit_loss or 0) for trade in trades)
-        
+        ).aggregate(**self.trade_aggregates())
+        self.apply_aggregates(row)
         self.save()
 
     def __str__(self):
@@ -231,32 +390,53 @@ class RiskManagement(models.Model):
     risk_per_trade = models.DecimalField(max_digits=5, decimal_places=2)
     
     def check_risk_limits(self, trade_amount):
-        # التحقق من حدود المخاطر اليومية
-        daily_trades = Trade.objects.filter(
-            user=self.user,
-            entry_date__date=timezone.now().date()
-        ).count()
-        
-        if daily_trades >= self.max_trades_per_day:
-            return False, "تجاوزت الحد الأقصى للصفقات اليومية"
-            
-        if trade_amount > self.max_position_size:
-            return False, "تجاوزت الحد الأقصى لحجم المركز"
-            
-        daily_loss = Trade.objects.filter(
-            user=self.user,
-            exit_date__date=timezone.now().date(),
-            profit_loss__lt=0
-        ).aggregate(models.Sum('profit_loss'))['profit_loss__sum'] or 0
-        
-        if abs(daily_loss) > self.max_daily_loss:
-            return False, "تجاوزت الحد الأقصى للخسارة اليومية"
-            
-        return True, "ضمن حدود المخاطر المسموح بها"
+        # التحقق من حدود المخاطر اليومية من العدادات بدلاً من فحص جدول الصفقات
+        from .risk import check_limits, get_counters
+        return check_limits(self, get_counters([self.user_id])[self.user_id], trade_amount)
 
     def __str__(self):
         return f"Risk Management - {self.user.username}"
 
+
+class RiskCounter(models.Model):
+    """
+    عدادات المخاطر اليومية لكل مستخدم، تُحدَّث ذرياً عند فتح الصفقات وإغلاقها
+    (عدد صفقات اليوم، الخسارة المحققة اليوم، التعرض المفتوح)
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='risk_counter')
+    day = models.DateField()
+    trades_today = models.IntegerField(default=0)
+    realized_loss_today = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    open_exposure = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+
+    @classmethod
+    def apply(cls, deltas, today=None):
+        """
+        إضافة {user_id: (trades, loss, exposure)} إلى العدادات بجملة UPDATE واحدة؛ العدادات
+        اليومية تبدأ من الصفر عند أول تحديث في يوم جديد. المستخدم بدون صف لا يُحدَّث،
+        وصفه يُبنى لاحقاً من جدول الصفقات عند أول فحص.
+        """
+        if not deltas:
+            return 0
+        today = today or timezone.now().date()
+        trades, losses, exposure = [], [], []
+        for user_id, (opened, loss, notional) in deltas.items():
+            same_day = Q(user_id=user_id, day=today)
+            trades += [When(same_day, then=F('trades_today') + opened), When(user_id=user_id, then=Value(opened))]
+            losses += [When(same_day, then=F('realized_loss_today') + Value(Decimal(str(loss)))),
+                       When(user_id=user_id, then=Value(Decimal(str(loss))))]
+            exposure.append(When(user_id=user_id, then=F('open_exposure') + Value(Decimal(str(notional)))))
+        # MySQL ينفذ الإسنادات بالترتيب، لذلك يجب أن يكون day آخرها
+        return cls.objects.filter(user_id__in=list(deltas)).update(
+            trades_today=Case(*trades, output_field=models.IntegerField()),
+            realized_loss_today=Case(*losses, output_field=models.DecimalField()),
+            open_exposure=Case(*exposure, output_field=models.DecimalField()),
+            day=Value(today),
+        )
+
+    def __str__(self):
+        return f"Risk counters - {self.user_id} ({self.day})"
+
 # جدول التنبيهات
 class Alert(models.Model):
     ALERT_TYPES = [
@@ -288,7 +468,14 @@ class Alert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_triggered = models.DateTimeField(null=True, blank=True)
 
-    def check_alert_condition(self, current_price):
+    class Meta:
+        indexes = [
+            # يغطي استعلام محرك التنبيهات بالكامل؛ Django يكتب is_active=True كـ WHERE is_active
+            # فلا يُستخدم الفهرس للبحث، لكن مسحه أصغر بكثير من مسح الجدول
+            models.Index(fields=['is_active', 'ticker', 'condition', 'value'], name='alert_active_lookup'),
+        ]
+
+    def check_alert_condition(self, current_price, previous_price=None):
         if not self.is_active:
             return False
             
@@ -296,9 +483,9 @@ class Alert(models.Model):
             return True
         elif self.condition == 'BELOW' and current_price < self.value:
             return True
-        elif self.condition == 'CROSSES':
-            # يحتاج إلى منطق إضافي للتحقق من التقاطع
-            pass
+        elif self.condition == 'CROSSES' and previous_price is not None:
+            # عبور القيمة بين الإغلاق السابق والسعر الحالي في أي اتجاه
+            return previous_price < self.value <= current_price or previous_price > self.value >= current_price
             
         return False
 
@@ -0,0 +1,48 @@
+"""
+Float read path for ``FinancialData``.
+
+Every numeric column is a ``DecimalField``, so a plain ``values_list`` builds one
+Python ``Decimal`` per value, and analytics and model code immediately convert it back
+to float.  Here the database does the conversion instead (``CAST(... AS DOUBLE)``).
+The driver then hands back native floats, which go straight into NumPy arrays or the
+float-based wire formats.
+
+This is for computation and float outputs only.  Writes, the JSON API and CSV keep
+exact ``Decimal`` values.
+"""
+import numpy as np
+from django.db.models import DecimalField, FloatField
+from django.db.models.functions import Cast
+
+FLOAT_SUFFIX = '_float'
+
+
+def float_values(queryset, fields, named=False):
+    """``values_list`` of ``fields`` with every decimal column read as a float"""
+    opts = queryset.model._meta
+    annotations = {}
+    names = []
+    for name in fields:
+        if isinstance(opts.get_field(name), DecimalField):
+            annotations[name + FLOAT_SUFFIX] = Cast(name, FloatField())
+            names.append(name + FLOAT_SUFFIX)
+        else:
+            names.append(name)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset.values_list(*names, named=named)
+
+
+def table_values(queryset, fields, float_native=False):
+    """Named rows for the table renderers; decimals are read as floats when ``float_native``"""
+    if float_native:
+        return float_values(queryset, fields, named=True)
+    return queryset.values_list(*fields, named=True)
+
+
+def float_array(queryset, fields):
+    """(N, len(fields)) float64 array of numeric ``fields``; NULL becomes NaN"""
+    rows = list(float_values(queryset, fields))
+    if not rows:
+        return np.empty((0, len(fields)), dtype=np.float64)
+    return np.array(rows, dtype=np.float64)
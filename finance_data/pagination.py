@@ -0,0 +1,80 @@
+"""
+Keyset (cursor) pagination over ``(ticker, date)``.
+
+Each page is fetched with ``WHERE (ticker, date) > (last_ticker, last_date)`` on the
+``(ticker, date)`` index, so the cost of a page does not grow with its position in the
+table the way ``OFFSET`` does.
+"""
+import base64
+import json
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+ORDERING = ('ticker', 'date')
+
+
+def encode_cursor(ticker, day):
+    payload = json.dumps([ticker, day.isoformat()]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ticker, day = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(ticker), date.fromisoformat(day)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+
+
+class KeysetPagination:
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.next_cursor = None
+        self.request = None
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return DEFAULT_PAGE_SIZE
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer'})
+        if page_size < 1:
+            raise ValidationError({self.page_size_query_param: 'Must be at least 1'})
+        return min(page_size, MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of ``queryset`` ordered by ``(ticker, date)``"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            ticker, day = decode_cursor(cursor)
+            queryset = queryset.filter(Q(ticker__gt=ticker) | Q(ticker=ticker, date__gt=day))
+
+        # صف إضافي لمعرفة وجود صفحة تالية بدون استعلام count
+        rows = list(queryset.order_by(*ORDERING)[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = encode_cursor(rows[-1].ticker, rows[-1].date)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'next_cursor': self.next_cursor, 'results': data})
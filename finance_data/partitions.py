@@ -0,0 +1,137 @@
+"""
+Monthly or yearly ``RANGE COLUMNS(date)`` partitions of the ``FinancialData`` table (MySQL only).
+
+MySQL requires every unique key of a partitioned table to contain the partitioning
+column.  The ``(date, ticker)`` key already does; the primary key is widened to
+``(id, date)`` when the table is first partitioned (``id`` stays AUTO_INCREMENT, so it is
+still unique in practice).  No foreign key constraint may point at a partitioned table,
+which is why ``LatestQuote.financial_data`` is declared without one.
+
+A trailing ``pmax`` partition catches rows past the last boundary.  The first conversion
+(primary key change and ``PARTITION BY``, both of which copy and lock the table) is only
+run by the ``partition_financial_data`` command.  After that the monthly Celery beat
+task (``finance_data.tasks.maintain_partitions``) splits upcoming periods off ``pmax``
+ahead of time, and skips a table that is not partitioned yet.  ``finance_data.rollups.apply_retention`` drops the
+partitions that lie entirely before the retention cutoff instead of deleting their rows.
+Queries filtering on ``date`` (range views, prediction windows) only read the matching
+partitions.
+"""
+from datetime import date
+
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import FinancialData
+
+GRANULARITIES = ('month', 'year')
+DEFAULT_GRANULARITY = 'month'
+# عدد الفترات القادمة التي تُنشأ أقسامها مسبقاً
+DEFAULT_AHEAD = 3
+CATCH_ALL = 'pmax'
+MAXVALUE = 'MAXVALUE'
+
+
+def period_start(day, granularity):
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day.replace(day=1)
+
+
+def next_period(start, granularity):
+    if granularity == 'year':
+        return start.replace(year=start.year + 1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def partition_bounds(first_day, last_day, granularity='month'):
+    """``[(name, exclusive upper bound)]`` of the partitions covering first_day..last_day"""
+    bounds = []
+    start = period_start(first_day, granularity)
+    while start <= last_day:
+        upper = next_period(start, granularity)
+        bounds.append((start.strftime('p%Y' if granularity == 'year' else 'p%Y%m'), upper))
+        start = upper
+    return bounds
+
+
+def partition_clause(name, upper):
+    value = MAXVALUE if upper is None else f"'{upper.isoformat()}'"
+    return f"PARTITION {name} VALUES LESS THAN ({value})"
+
+
+def _table_and_column():
+    opts = FinancialData._meta
+    return opts.db_table, opts.get_field('date').column
+
+
+def partition_statements(bounds, existing=()):
+    """
+    DDL bringing the table to ``bounds``.  ``existing`` is the current ``[(name, upper)]``
+    list (``upper`` is None for MAXVALUE); empty means the table is not partitioned yet.
+    """
+    table, column = _table_and_column()
+    if not existing:
+        clauses = [partition_clause(name, upper) for name, upper in bounds] + [partition_clause(CATCH_ALL, None)]
+        return [
+            f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `{column}`)",
+            f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`{column}`) ({', '.join(clauses)})",
+        ]
+
+    highest = max((upper for _, upper in existing if upper is not None), default=None)
+    new = [partition_clause(name, upper) for name, upper in bounds if highest is None or upper > highest]
+    if not new:
+        return []
+    catch_all = next((name for name, upper in existing if upper is None), None)
+    if catch_all is None:
+        return [f"ALTER TABLE `{table}` ADD PARTITION ({', '.join(new)})"]
+    # الصفوف التي وصلت إلى pmax (إن وجدت) تُنقل إلى الأقسام الجديدة
+    return [f"ALTER TABLE `{table}` REORGANIZE PARTITION {catch_all} INTO "
+            f"({', '.join(new + [partition_clause(catch_all, None)])})"]
+
+
+def expired_partitions(existing, cutoff):
+    """Names of the partitions whose rows are all older than ``cutoff``"""
+    return [name for name, upper in existing if upper is not None and upper <= cutoff]
+
+
+def drop_statements(names):
+    table, _ = _table_and_column()
+    return [f"ALTER TABLE `{table}` DROP PARTITION {', '.join(names)}"] if names else []
+
+
+def existing_partitions():
+    """Current ``[(name, upper)]`` partitions; empty when not partitioned or not on MySQL"""
+    if connection.vendor != 'mysql':
+        return []
+    table, _ = _table_and_column()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [table],
+        )
+        return [(name, None if description == MAXVALUE else date.fromisoformat(description.strip("'")))
+                for name, description in cursor.fetchall()]
+
+
+def planned_statements(granularity=DEFAULT_GRANULARITY, ahead=DEFAULT_AHEAD, today=None, existing=None):
+    """
+    DDL creating every partition from the oldest row up to ``ahead`` periods after today.
+    ``existing`` defaults to the partitions currently on the table.
+    """
+    today = today or timezone.now().date()
+    first = FinancialData.objects.aggregate(first=Min('date'))['first'] or today
+    last = period_start(today, granularity)
+    for _ in range(ahead):
+        last = next_period(last, granularity)
+    if existing is None:
+        existing = existing_partitions()
+    return partition_statements(partition_bounds(min(first, today), last, granularity), existing)
+
+
+def execute(statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
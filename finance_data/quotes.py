@@ -0,0 +1,62 @@
+"""
+Maintenance and lookup of the ``LatestQuote`` table (latest bar per ticker).
+
+Every FinancialData write path calls ``refresh_latest_quotes`` with the tickers it
+touched, so readers get current prices with a primary-key lookup instead of a
+``Max('date')`` scan over the history.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Max, OuterRef, Q, Subquery
+
+from .models import FinancialData, LatestQuote
+
+QUOTE_FIELDS = ['financial_data_id', 'date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume',
+                'percent_change', 'previous_close', 'updated_at']
+
+
+def refresh_latest_quotes(tickers=None):
+    """Rebuild the quotes of ``tickers`` (every ticker when None) from FinancialData"""
+    history = FinancialData.objects.all()
+    if tickers is not None:
+        tickers = set(tickers)
+        if not tickers:
+            return 0
+        history = history.filter(ticker__in=tickers)
+
+    # استعلام تجميعي واحد على فهرس (ticker, date) ثم جلب الصفوف الأخيرة دفعة واحدة
+    latest_dates = dict(history.values_list('ticker').annotate(latest=Max('date')).order_by())
+    if latest_dates:
+        previous = FinancialData.objects.filter(
+            ticker=OuterRef('ticker'), date__lt=OuterRef('date')
+        ).order_by('-date').values('close_price')[:1]
+        rows = FinancialData.objects.filter(
+            reduce(or_, (Q(ticker=ticker, date=day) for ticker, day in latest_dates.items()))
+        ).annotate(previous=Subquery(previous))
+        quotes = [
+            LatestQuote(ticker=row.ticker, financial_data_id=row.pk, date=row.date, open_price=row.open_price,
+                        high_price=row.high_price, low_price=row.low_price, close_price=row.close_price,
+                        volume=row.volume, percent_change=row.percent_change, previous_close=row.previous)
+            for row in rows
+        ]
+        # MySQL لا يقبل تحديد الأعمدة الفريدة مع ON DUPLICATE KEY UPDATE
+        unique_fields = ['ticker'] if connection.features.supports_update_conflicts_with_target else None
+        LatestQuote.objects.bulk_create(quotes, update_conflicts=True, unique_fields=unique_fields,
+                                        update_fields=QUOTE_FIELDS)
+
+    # رموز حُذفت كل بياناتها
+    if tickers is not None:
+        LatestQuote.objects.filter(ticker__in=tickers - set(latest_dates)).delete()
+    else:
+        LatestQuote.objects.exclude(ticker__in=list(latest_dates)).delete()
+    return len(latest_dates)
+
+
+def latest_prices(tickers=None):
+    """Map ticker -> latest close price with a single primary-key query"""
+    quotes = LatestQuote.objects.all()
+    if tickers is not None:
+        quotes = quotes.filter(ticker__in=set(tickers))
+    return dict(quotes.values_list('ticker', 'close_price'))
@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all download workers.
+
+    ``rate`` tokens are added every second up to ``capacity``; every request
+    takes one token and blocks until one is available.  When the provider
+    answers with HTTP 429 a worker calls ``penalize`` so that *all* workers
+    back off together instead of hammering the API in parallel.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until ``tokens`` are available; returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = max(self._blocked_until - now, (tokens - self._tokens) / self.rate)
+            self._sleep(delay)
+            waited += delay
+
+    def penalize(self, delay: float):
+        """Pause every consumer for ``delay`` seconds (used after a 429)"""
+        with self._lock:
+            now = self._clock()
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self._tokens = 0.0
+            self._updated = now
@@ -0,0 +1,154 @@
+"""
+Compact wire formats for bulk ``FinancialData`` responses.
+
+Table renderers encode ``(columns, rows)`` pairs coming straight from ``values_list``
+instead of serializer output, so no per-row DRF field machinery runs:
+
+* columnar JSON - one array per field, numbers as JSON numbers (``?format=columnar``)
+* CSV - streamed in chunks (``?format=csv``)
+* Apache Arrow IPC stream and Parquet (``?format=arrow`` / ``?format=parquet``), only
+  offered when ``pyarrow`` is installed
+
+The keyset cursor of paginated responses travels in the ``X-Next-Cursor`` and ``Link``
+headers (and inside the body for columnar JSON).
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow اختياري
+    pa = None
+    pq = None
+
+CSV_CHUNK_ROWS = 1000
+ARROW_BATCH_ROWS = 10000
+
+
+def _columns_of(rows, width):
+    # تحويل الصفوف إلى أعمدة دفعة واحدة
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+
+
+def _first_value(values):
+    return next((value for value in values if value is not None), None)
+
+
+class TableRenderer(BaseRenderer):
+    """Base class for renderers fed with ``values_list`` rows by ``table_response``"""
+
+    charset = None
+    # الصيغ التي تكتب الأرقام كـ float تقرأ الأعمدة العشرية من قاعدة البيانات كـ float مباشرة
+    float_native = False
+
+    def render_table(self, columns, rows, next_cursor=None):
+        """Yield the encoded table as one or more byte strings"""
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # الأخطاء والرسائل العادية (مثل 400 و 404) تُرسل كـ JSON
+        return json.dumps(data, default=str).encode()
+
+
+class ColumnarJSONRenderer(TableRenderer):
+    media_type = 'application/vnd.finance.columnar+json'
+    format = 'columnar'
+    charset = 'utf-8'
+    float_native = True
+
+    def render_table(self, columns, rows, next_cursor=None):
+        data = {}
+        for name, values in zip(columns, _columns_of(rows, len(columns))):
+            sample = _first_value(values)
+            if isinstance(sample, Decimal):
+                values = [None if value is None else float(value) for value in values]
+            elif hasattr(sample, 'isoformat'):
+                values = [None if value is None else value.isoformat() for value in values]
+            data[name] = values
+        yield json.dumps({'columns': data, 'next_cursor': next_cursor}, separators=(',', ':')).encode()
+
+
+class CSVRenderer(TableRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render_table(self, columns, rows, next_cursor=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for start in range(0, len(rows), CSV_CHUNK_ROWS):
+            writer.writerows(rows[start:start + CSV_CHUNK_ROWS])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+
+def arrow_table(columns, rows):
+    """Build a ``pyarrow.Table``; Decimal columns become float64"""
+    arrays = []
+    for values in _columns_of(rows, len(columns)):
+        if isinstance(_first_value(values), Decimal):
+            arrays.append(pa.array([None if value is None else float(value) for value in values], type=pa.float64()))
+        else:
+            arrays.append(pa.array(values))
+    return pa.Table.from_arrays(arrays, names=list(columns))
+
+
+class ArrowStreamRenderer(TableRenderer):
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    float_native = True
+
+    def render_table(self, columns, rows, next_cursor=None):
+        table = arrow_table(columns, rows)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=ARROW_BATCH_ROWS):
+                writer.write_batch(batch)
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+        yield sink.getvalue()
+
+
+class ParquetRenderer(TableRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+    float_native = True
+
+    def render_table(self, columns, rows, next_cursor=None):
+        # Parquet يكتب الفهرس في نهاية الملف لذلك يُرسل دفعة واحدة
+        sink = io.BytesIO()
+        pq.write_table(arrow_table(columns, rows), sink)
+        yield sink.getvalue()
+
+
+TABLE_RENDERER_CLASSES = [ColumnarJSONRenderer, CSVRenderer]
+if pa is not None:
+    TABLE_RENDERER_CLASSES += [ArrowStreamRenderer, ParquetRenderer]
+
+# JSON العادي يبقى الافتراضي، والصيغ المضغوطة تُختار عبر Accept أو ?format=
+MARKET_DATA_RENDERER_CLASSES = list(api_settings.DEFAULT_RENDERER_CLASSES) + TABLE_RENDERER_CLASSES
+
+
+def table_response(renderer, columns, rows, paginator=None):
+    """Stream ``rows`` (``values_list`` tuples) in the format of ``renderer``"""
+    next_cursor = paginator.next_cursor if paginator else None
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    response = StreamingHttpResponse(renderer.render_table(columns, rows, next_cursor), content_type=content_type)
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+        response['Link'] = f'<{paginator.get_next_link()}>; rel="next"'
+    return response
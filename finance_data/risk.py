@@ -0,0 +1,108 @@
+"""
+Pre-trade risk checks backed by per-user running counters.
+
+``RiskCounter`` keeps, for every user, the number of trades opened today, the loss
+realised today and the notional of the open positions.  ``Trade.save`` (new trades),
+``Trade.close_trade`` and the trade sweep add to it with atomic ``UPDATE`` statements,
+and the daily values restart at zero on the first write of a new day, so a check reads
+one row instead of counting and summing ``Trade``.
+
+A missing counter row is rebuilt from ``Trade`` once (``rebuild_counters``), which also
+serves as the nightly resync for edits made outside those write paths.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from .models import RiskCounter, RiskManagement, Trade
+
+COUNTER_FIELDS = ['day', 'trades_today', 'realized_loss_today', 'open_exposure']
+
+
+def rebuild_counters(user_ids=None, today=None):
+    """Recompute the counters of ``user_ids`` (default: every user with risk limits) from Trade"""
+    today = today or timezone.now().date()
+    if user_ids is None:
+        user_ids = RiskManagement.objects.values_list('user_id', flat=True)
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    notional = ExpressionWrapper(F('quantity') * F('entry_price') * F('leverage'),
+                                 output_field=DecimalField(max_digits=20, decimal_places=6))
+    rows = {
+        row['user_id']: row
+        for row in Trade.objects.filter(
+            Q(entry_day=today) | Q(exit_date__date=today) | Q(status='OPEN'), user_id__in=user_ids,
+        ).values('user_id').annotate(
+            trades_today=Count('id', filter=Q(entry_day=today)),
+            realized_loss_today=Sum('profit_loss', filter=Q(exit_date__date=today, profit_loss__lt=0)),
+            open_exposure=Sum(notional, filter=Q(status='OPEN')),
+        ).order_by()
+    }
+    counters = {}
+    for user_id in user_ids:
+        row = rows.get(user_id, {})
+        counters[user_id] = RiskCounter(
+            user_id=user_id, day=today, trades_today=row.get('trades_today') or 0,
+            realized_loss_today=-(row.get('realized_loss_today') or 0),
+            open_exposure=row.get('open_exposure') or 0,
+        )
+    unique_fields = ['user'] if connection.features.supports_update_conflicts_with_target else None
+    RiskCounter.objects.bulk_create(counters.values(), update_conflicts=True, unique_fields=unique_fields,
+                                    update_fields=COUNTER_FIELDS)
+    return counters
+
+
+def get_counters(user_ids, today=None):
+    """Counters of ``user_ids`` as of ``today``; missing rows are rebuilt from Trade"""
+    today = today or timezone.now().date()
+    counters = RiskCounter.objects.in_bulk(list(user_ids))
+    missing = [user_id for user_id in user_ids if user_id not in counters]
+    if missing:
+        counters.update(rebuild_counters(missing, today))
+    for counter in counters.values():
+        if counter.day != today:
+            # لم تُفتح أو تُغلق صفقات اليوم بعد
+            counter.day, counter.trades_today, counter.realized_loss_today = today, 0, Decimal('0')
+    return counters
+
+
+def check_limits(limits, counter, trade_amount):
+    """Apply ``limits`` (RiskManagement) to ``counter``; returns (allowed, message)"""
+    if counter.trades_today >= limits.max_trades_per_day:
+        return False, "تجاوزت الحد الأقصى للصفقات اليومية"
+
+    if trade_amount > limits.max_position_size:
+        return False, "تجاوزت الحد الأقصى لحجم المركز"
+
+    if counter.realized_loss_today > limits.max_daily_loss:
+        return False, "تجاوزت الحد الأقصى للخسارة اليومية"
+
+    return True, "ضمن حدود المخاطر المسموح بها"
+
+
+def check_orders(orders, today=None):
+    """
+    Validate many ``(user_id, trade_amount)`` or ``(user_id, trade_amount, leverage)``
+    orders with two or three queries in total.
+    Orders are checked in sequence and every accepted order counts towards the next
+    ones of the same user (its open exposure in ``Trade.notional`` units).  Users
+    without risk limits are always allowed.
+    """
+    user_ids = {order[0] for order in orders}
+    limits = RiskManagement.objects.in_bulk(list(user_ids), field_name='user_id')
+    counters = get_counters([user_id for user_id in user_ids if user_id in limits], today)
+
+    results = []
+    for user_id, trade_amount, *leverage in orders:
+        if user_id not in limits:
+            results.append((True, "ضمن حدود المخاطر المسموح بها"))
+            continue
+        allowed, message = check_limits(limits[user_id], counters[user_id], trade_amount)
+        if allowed:
+            counters[user_id].trades_today += 1
+            counters[user_id].open_exposure += Trade.notional(trade_amount, 1, leverage[0] if leverage else 1)
+        results.append((allowed, message))
+    return results
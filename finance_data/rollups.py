@@ -0,0 +1,155 @@
+"""
+Weekly and monthly OHLC rollups of ``FinancialData`` and the retention of raw rows.
+
+``WeeklyBar`` and ``MonthlyBar`` hold one row per ticker and period, keyed by the first
+day of the period.  Every FinancialData write path calls ``refresh_rollups`` with the
+``(ticker, date)`` pairs it touched.  Only the periods that contain those dates are
+recomputed, from one range query, so a daily ingestion rewrites one week and one month
+per ticker.  Long-range reads ask for ``interval=week|month`` and are served from these
+tables instead of the raw rows.
+
+When ``FINANCIAL_DATA_RETENTION_DAYS`` is set, ``apply_retention`` removes the raw rows
+older than the retention cutoff.  The cutoff is a Monday on or before a month start, so
+no weekly period and no later monthly period is ever cut.  A period that starts before
+the cutoff is frozen: ``refresh_rollups`` no longer recomputes it, because its raw rows
+are (partly) gone and its bar already holds the full period.
+"""
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .cache import invalidate_market_data
+from .models import FinancialData, LatestQuote, MonthlyBar, WeeklyBar
+from .partitions import drop_statements, execute, existing_partitions, expired_partitions, next_period
+from .quotes import refresh_latest_quotes
+
+BAR_FIELDS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume')
+ROLLUP_FIELDS = ['last_date', *BAR_FIELDS, 'bars']
+BULK_BATCH_SIZE = 1000
+# المؤشرات (المتوسط المتحرك 200 يوم) ونوافذ التوقع تحتاج هذا القدر من التاريخ على الأقل
+MIN_RETENTION_DAYS = 400
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def week_end(start):
+    return start + timedelta(days=6)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(start):
+    return next_period(start, 'month') - timedelta(days=1)
+
+
+# الفترة -> (الجدول، بداية الفترة من أي يوم فيها، آخر يوم من بدايتها)
+PERIODS = {
+    'week': (WeeklyBar, week_start, week_end),
+    'month': (MonthlyBar, month_start, month_end),
+}
+
+
+def retention_cutoff(today=None):
+    """First day of raw history that is kept, or None when retention is disabled"""
+    days = getattr(settings, 'FINANCIAL_DATA_RETENTION_DAYS', None)
+    if not days:
+        return None
+    today = today or timezone.now().date()
+    return week_start(month_start(today - timedelta(days=max(days, MIN_RETENTION_DAYS))))
+
+
+def refresh_rollups(keys, today=None):
+    """Recompute the weekly and monthly bars of the periods containing ``keys`` ((ticker, date) pairs)"""
+    cutoff = retention_cutoff(today)
+    periods = set()
+    for ticker, day in keys:
+        for period, (_, start_of, _) in PERIODS.items():
+            start = start_of(day)
+            if cutoff is None or start >= cutoff:
+                periods.add((period, ticker, start))
+    return rebuild_periods(periods)
+
+
+def rebuild_periods(periods):
+    """Rewrite the ``(period, ticker, start)`` rollup rows from FinancialData; returns the bars written"""
+    if not periods:
+        return 0
+    ranges = {}
+    for period, ticker, start in periods:
+        end = PERIODS[period][2](start)
+        low, high = ranges.get(ticker, (start, end))
+        ranges[ticker] = (min(low, start), max(high, end))
+    rows = FinancialData.objects.filter(
+        reduce(or_, (Q(ticker=ticker, date__range=span) for ticker, span in ranges.items()))
+    ).order_by('ticker', 'date').values_list('ticker', 'date', *BAR_FIELDS)
+
+    bars = {}
+    for ticker, day, open_price, high_price, low_price, close_price, volume in rows:
+        for period, (model, start_of, _) in PERIODS.items():
+            key = (period, ticker, start_of(day))
+            if key not in periods:
+                continue
+            bar = bars.get(key)
+            if bar is None:
+                bars[key] = model(ticker=ticker, date=key[2], last_date=day, open_price=open_price,
+                                  high_price=high_price, low_price=low_price, close_price=close_price,
+                                  volume=volume, bars=1)
+                continue
+            # الصفوف مرتبة حسب التاريخ: الإغلاق وآخر يوم من آخر صف
+            bar.high_price = max(bar.high_price, high_price)
+            bar.low_price = min(bar.low_price, low_price)
+            bar.close_price = close_price
+            bar.last_date = day
+            bar.volume += volume
+            bar.bars += 1
+
+    unique_fields = ['ticker', 'date'] if connection.features.supports_update_conflicts_with_target else None
+    for period, (model, _, _) in PERIODS.items():
+        written = [bar for (name, _, _), bar in bars.items() if name == period]
+        if written:
+            model.objects.bulk_create(written, batch_size=BULK_BATCH_SIZE, update_conflicts=True,
+                                      unique_fields=unique_fields, update_fields=ROLLUP_FIELDS)
+        # فترات حُذفت كل صفوفها
+        emptied = [(ticker, start) for name, ticker, start in periods if name == period and
+                   (name, ticker, start) not in bars]
+        if emptied:
+            model.objects.filter(reduce(or_, (Q(ticker=ticker, date=start) for ticker, start in emptied))).delete()
+    return len(bars)
+
+
+def apply_retention(today=None):
+    """
+    Remove raw FinancialData rows older than the retention cutoff.  On a partitioned
+    MySQL table whole partitions are dropped; the remaining rows are deleted one month
+    at a time.  Returns ``{'cutoff', 'partitions_dropped', 'rows_deleted'}``.
+    """
+    cutoff = retention_cutoff(today)
+    result = {'cutoff': cutoff, 'partitions_dropped': 0, 'rows_deleted': 0}
+    if cutoff is None:
+        return result
+
+    expired = expired_partitions(existing_partitions(), cutoff)
+    execute(drop_statements(expired))
+    result['partitions_dropped'] = len(expired)
+
+    start = FinancialData.objects.filter(date__lt=cutoff).aggregate(first=Min('date'))['first']
+    while start is not None and start < cutoff:
+        # دفعات شهرية حتى لا يقفل حذف واحد كبير الجدول طويلاً
+        end = min(next_period(month_start(start), 'month'), cutoff)
+        result['rows_deleted'] += FinancialData.objects.filter(date__gte=start, date__lt=end).delete()[0]
+        start = end
+
+    if expired or result['rows_deleted']:
+        # رموز لم تعد لها بيانات بعد الحد
+        refresh_latest_quotes(LatestQuote.objects.filter(date__lt=cutoff).values_list('ticker', flat=True))
+        invalidate_market_data()
+    return result
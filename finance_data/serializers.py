@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import FinancialData, UserProfile
+from .models import FinancialData, MonthlyBar, UserProfile, WeeklyBar
 
 
 class FinancialDataSerializer(serializers.ModelSerializer):
@@ -39,6 +39,13 @@ class FinancialDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = FinancialData
         fields = '__all__'  # سيتم تضمين جميع الحقول تلقائيًا
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # إرجاع الحقول المطلوبة فقط عند تمرير fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
     
     def get_percent_change_formatted(self, obj):
         if obj.percent_change:
@@ -85,4 +92,16 @@ class FinancialDataModelSerializer(serializers.ModelSerializer):
             percent_change = ((obj.close_price - obj.open_price) / obj.open_price) * 100
             return f"{percent_change:.2f}%"
         except (TypeError, ZeroDivisionError):
-            return "0.00%"
\ No newline at end of file
+            return "0.00%"
+
+
+class WeeklyBarSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WeeklyBar
+        fields = ['ticker', 'date', 'last_date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume',
+                  'bars']
+
+
+class MonthlyBarSerializer(WeeklyBarSerializer):
+    class Meta(WeeklyBarSerializer.Meta):
+        model = MonthlyBar
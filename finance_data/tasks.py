@@ -4,15 +4,15 @@ import django
 django.setup()
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Sum, Avg
+from django.db import connection
 from django.contrib.auth import get_user_model
-from decimal import Decimal
 #from .currency_data_fetcher import CurrencyDataFetcher
-from .models import (
-    FinancialData, Trade, PredictionModel, TradingAnalytics,
-    Alert, UserProfile, RiskManagement
-)
 from .fetch_financial_data import CurrencyDataFetcher
+from .alerts import check_alerts as evaluate_alerts
+from .partitions import execute, existing_partitions, planned_statements
+from .risk import rebuild_counters
+from .rollups import apply_retention as remove_expired_rows
+from .trading import refresh_balances, refresh_balances_incrementally, refresh_trading_analytics, sweep_open_trades
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -36,13 +36,21 @@ def update_currency_data(self):
         fetcher.run_daily_update()
         
         logger.info(f"Currency data updated successfully at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        return "Currency data updated successfully"
     
     except Exception as e:
         error_msg = f"Error occurred while updating currency data: {str(e)}"
         logger.error(error_msg, exc_info=True)
         raise self.retry(exc=e)
 
+    # التوقعات وتقييمها بعد اكتمال تحديث الأسعار (مع إعادة المحاولات) بدلاً من وقت ثابت في الجدول،
+    # وفشل الإرسال إلى الوسيط لا يعيد تنزيل الأسعار التي حُفظت بالفعل
+    for task in (update_predictions, reconcile_predictions):
+        try:
+            task.delay()
+        except Exception as e:
+            logger.error(f"Failed to dispatch {task.name} after the currency update: {str(e)}", exc_info=True)
+    return "Currency data updated successfully"
+
 @shared_task
 def simple_test_task():
     """
@@ -56,40 +64,28 @@ def simple_test_task():
 # 2. تحديث التوقعات
 @shared_task
 def update_predictions():
-    """تحديث التوقعات اليومية لكل العملات"""
+    """تحديث التوقعات اليومية لكل العملات باستخدام نموذج LSTM"""
     try:
-        today = timezone.now().date()
-        tickers = FinancialData.objects.values_list('ticker', flat=True).distinct()
-        
-        for ticker in tickers:
-            # جلب البيانات التاريخية
-            historical_data = FinancialData.objects.filter(
-                ticker=ticker,
-                date__gte=today - timedelta(days=30)
-            ).order_by('date')
-            
-            if not historical_data.exists():
-                continue
-                
-            # حساب التوقعات (هنا يمكنك استخدام نموذج التعلم الآلي الخاص بك)
-            last_price = historical_data.last().close_price
-            predicted_price = last_price * Decimal('1.001')  # مثال بسيط
-            
-            # تخزين التوقعات
-            PredictionModel.objects.create(
-                ticker=ticker,
-                prediction_date=today,
-                predicted_price=predicted_price,
-                prediction_period='1D',
-                confidence_score=Decimal('0.75'),
-                model_version='1.0',
-                features_used={'price_history': True}
-            )
-        
-        logger.info("Predictions updated successfully")
+        # الاستيراد هنا حتى لا يُحمَّل torch إلا عند تشغيل هذه المهمة
+        from financial_prediction.forecasting import run_daily_forecast
+        predictions = run_daily_forecast()
+        logger.info(f"Predictions updated successfully ({len(predictions)} rows)")
     except Exception as e:
         logger.error(f"Error updating predictions: {str(e)}")
 
+# تقييم التوقعات السابقة بالأسعار الفعلية
+@shared_task
+def reconcile_predictions():
+    """ملء actual_price و accuracy للتوقعات التي حان تاريخها"""
+    try:
+        from financial_prediction.evaluation import prediction_error_stats, reconcile_predictions as reconcile
+        scored = reconcile()
+        logger.info(f"Predictions reconciled successfully ({scored} rows)")
+        for row in prediction_error_stats():
+            logger.info(f"Prediction stats {row}")
+    except Exception as e:
+        logger.error(f"Error reconciling predictions: {str(e)}")
+
 # 3. تحديث التحليلات
 @shared_task
 def update_trading_analytics():
@@ -97,14 +93,8 @@ def update_trading_analytics():
     try:
         today = timezone.now().date()
         period_start = today - timedelta(days=30)
-        
-        for user in User.objects.filter(profile__is_trader=True):
-            analytics, created = TradingAnalytics.objects.get_or_create(
-                user=user,
-                period_start=period_start,
-                period_end=today
-            )
-            analytics.calculate_analytics()
+        # استعلام تجميعي واحد لكل المتداولين ثم إدراج/تحديث مجمّع
+        refresh_trading_analytics(period_start, today)
         
         logger.info("Trading analytics updated successfully")
     except Exception as e:
@@ -115,22 +105,9 @@ def update_trading_analytics():
 def check_alerts():
     """فحص جميع التنبيهات النشطة"""
     try:
-        active_alerts = Alert.objects.filter(is_active=True)
-        
-        for alert in active_alerts:
-            try:
-                # جلب آخر سعر
-                latest_price = FinancialData.objects.filter(
-                    ticker=alert.ticker
-                ).latest('date').close_price
-                
-                if alert.check_alert_condition(latest_price):
-                    alert.trigger_alert()
-                    
-            except Exception as alert_error:
-                logger.error(f"Error processing alert {alert.id}: {str(alert_error)}")
-                
-        logger.info("Alerts checked successfully")
+        # آخر سعرين لكل رمز مرة واحدة، ثم بحث ثنائي في عتبات التنبيهات المرتبة
+        triggered = evaluate_alerts()
+        logger.info(f"Alerts checked successfully ({len(triggered)} triggered)")
     except Exception as e:
         logger.error(f"Error checking alerts: {str(e)}")
 
@@ -139,54 +116,59 @@ def check_alerts():
 def update_trade_statuses():
     """تحديث حالة الصفقات المفتوحة"""
     try:
-        open_trades = Trade.objects.filter(status='OPEN')
-        
-        for trade in open_trades:
-            try:
-                latest_price = FinancialData.objects.filter(
-                    ticker=trade.ticker
-                ).latest('date').close_price
-                
-                # فحص Stop Loss
-                if trade.stop_loss:
-                    if (trade.trade_type == 'BUY' and latest_price <= trade.stop_loss) or \
-                       (trade.trade_type == 'SELL' and latest_price >= trade.stop_loss):
-                        trade.close_trade(latest_price)
-                        continue
-                
-                # فحص Take Profit
-                if trade.take_profit:
-                    if (trade.trade_type == 'BUY' and latest_price >= trade.take_profit) or \
-                       (trade.trade_type == 'SELL' and latest_price <= trade.take_profit):
-                        trade.close_trade(latest_price)
-                        
-            except Exception as trade_error:
-                logger.error(f"Error processing trade {trade.id}: {str(trade_error)}")
-                
-        logger.info("Trade statuses updated successfully")
+        # آخر شمعة لكل رمز مرة واحدة، وكل الإغلاقات في تحديث مجمّع واحد
+        result = sweep_open_trades()
+        logger.info(f"Trade statuses updated successfully ({result['closed']} of {result['checked']} closed "
+                    f"in {result['seconds']:.3f}s)")
     except Exception as e:
         logger.error(f"Error updating trade statuses: {str(e)}")
 
 # 6. تحديث إحصائيات المستخدمين
 @shared_task
-def update_user_statistics():
-    """تحديث إحصائيات جميع المستخدمين"""
+def update_user_statistics(incremental=False):
+    """تحديث إحصائيات جميع المستخدمين (أو من تغيّرت صفقاتهم فقط عند incremental)"""
+    try:
+        # تحديث واحد لأرصدة كل المتداولين من مجموع أرباح/خسائر صفقاتهم المغلقة
+        updated = refresh_balances_incrementally() if incremental else refresh_balances()
+        logger.info(f"User statistics updated successfully ({updated} profiles)")
+    except Exception as e:
+        logger.error(f"Error updating user statistics: {str(e)}")
+
+# 7. إعادة مزامنة عدادات المخاطر
+@shared_task
+def rebuild_risk_counters():
+    """إعادة بناء عدادات المخاطر من جدول الصفقات لتصحيح أي تعديل تم خارج مسارات الكتابة"""
+    try:
+        counters = rebuild_counters()
+        logger.info(f"Risk counters rebuilt successfully ({len(counters)} users)")
+    except Exception as e:
+        logger.error(f"Error rebuilding risk counters: {str(e)}")
+
+# 8. حذف الصفوف اليومية الأقدم من مدة الاحتفاظ
+@shared_task
+def apply_retention():
+    """حذف صفوف FinancialData الأقدم من FINANCIAL_DATA_RETENTION_DAYS (تبقى في الشموع الأسبوعية والشهرية)"""
+    try:
+        result = remove_expired_rows()
+        logger.info(f"Retention applied (cutoff {result['cutoff']}, {result['partitions_dropped']} partitions "
+                    f"dropped, {result['rows_deleted']} rows deleted)")
+    except Exception as e:
+        logger.error(f"Error applying retention: {str(e)}")
+
+# 9. إنشاء أقسام FinancialData للأشهر القادمة
+@shared_task
+def maintain_partitions():
+    """إنشاء الأقسام الزمنية القادمة لجدول FinancialData (MySQL فقط)"""
+    if connection.vendor != 'mysql':
+        return
     try:
-        for profile in UserProfile.objects.filter(is_trader=True):
-            try:
-                # حساب إجمالي الأرباح/الخسائر
-                total_pnl = Trade.objects.filter(
-                    user=profile.user,
-                    status='CLOSED'
-                ).aggregate(Sum('profit_loss'))['profit_loss__sum'] or 0
-                
-                # تحديث الرصيد
-                profile.balance = total_pnl
-                profile.save()
-                
-            except Exception as profile_error:
-                logger.error(f"Error updating profile {profile.id}: {str(profile_error)}")
-                
-        logger.info("User statistics updated successfully")
+        existing = existing_partitions()
+        if not existing:
+            # التقسيم الأول ينسخ الجدول ويقفله، فلا يُشغَّل دون إشراف
+            logger.warning("FinancialData is not partitioned yet; run the partition_financial_data command first")
+            return
+        statements = planned_statements(existing=existing)
+        execute(statements)
+        logger.info(f"FinancialData partitions maintained ({len(statements)} statements)")
     except Exception as e:
-        logger.error(f"Error updating user statistics: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error maintaining partitions: {str(e)}")
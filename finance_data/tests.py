@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import skipIf
+from yfinance.exceptions import YFRateLimitError
+
+from .alerts import AlertIndex, check_alerts
+from .fetch_financial_data import CurrencyDataFetcher
+from .importers import import_financial_csv
+from .indicators import INDICATOR_COLUMNS, compute_indicators, panel_from_frames
+from .bulk import ingest_financial_data, refresh_market_data, upsert_financial_data
+from .cache import local_cache
+from .models import (Alert, FinancialData, LatestQuote, MacroSnapshot, MonthlyBar, NewsDigest, RiskCounter, RiskManagement, Trade,
+                     TradingAnalytics, UserProfile, WeeklyBar)
+from .partitions import expired_partitions, partition_bounds, partition_statements
+from .quotes import latest_prices
+from .numeric import float_array
+from .renderers import pa
+from .risk import check_orders, rebuild_counters
+from .rollups import apply_retention
+from .trading import OPEN_TRADE_FIELDS, refresh_balances, refresh_balances_incrementally, refresh_trading_analytics, sweep_open_trades
+from .rate_limiter import TokenBucket
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_ohlc_frame(rows=60, seed=0, start='2024-01-01'):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.004, rows))
+    open_ = close + rng.normal(0, 0.002, rows)
+    high = np.maximum(open_, close) + rng.uniform(0, 0.003, rows)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.003, rows)
+    index = pd.bdate_range(start, periods=rows)
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': 0}, index=index)
+
+
+class StubYahoo:
+    """Local yfinance stand-in that injects latency and HTTP 429 responses"""
+
+    def __init__(self, latency=0.05, rate_limited_calls=0):
+        self.latency = latency
+        self.rate_limited_calls = rate_limited_calls
+        self.calls = 0
+        self.batch_calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, session=None):
+        stub = self
+
+        class Ticker:
+            def history(self, period, interval):
+                with stub._lock:
+                    stub.calls += 1
+                    throttled = stub.calls <= stub.rate_limited_calls
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    time.sleep(stub.latency)
+                    if throttled:
+                        raise YFRateLimitError()
+                    return make_ohlc_frame(seed=sum(map(ord, symbol)))
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+        return Ticker()
+
+    def download(self, symbols, **kwargs):
+        self.batch_calls += 1
+        time.sleep(self.latency)
+        frames = {symbol: make_ohlc_frame(seed=sum(map(ord, symbol))) for symbol in symbols}
+        return pd.concat(frames, axis=1)
+
+
+def empty_batch(symbols, **kwargs):
+    return pd.DataFrame()
+
+
+def stub_indicators(fetcher):
+    return mock.patch.multiple(
+        fetcher,
+        fetch_interest_rate=mock.Mock(return_value=Decimal('5.25')),
+        fetch_inflation=mock.Mock(return_value=Decimal('3.1')),
+        fetch_dxy=mock.Mock(return_value=Decimal('103.5')),
+        fetch_market_sentiment=mock.Mock(return_value=Decimal('0')),
+        fetch_economic_news=mock.Mock(return_value=''),
+    )
+
+
+class ConcurrentIngestionTests(SimpleTestCase):
+    def test_fetches_all_symbols_concurrently(self):
+        stub = StubYahoo(latency=0.1)
+        fetcher = CurrencyDataFetcher(max_workers=5, rate_limiter=TokenBucket(100, 10), ticker_factory=stub,
+                                      batch_downloader=empty_batch)
+        with stub_indicators(fetcher):
+            started = time.monotonic()
+            _, symbol_data = fetcher.fetch_all(fetcher.currency_pairs)
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(set(symbol_data), set(fetcher.currency_pairs))
+        self.assertTrue(all(symbol_data.values()))
+        self.assertGreater(stub.max_active, 1)
+        # 15 serial calls would need at least 1.5s of latency alone
+        self.assertLess(elapsed, 15 * stub.latency)
+
+    def test_rate_limited_requests_are_retried(self):
+        stub = StubYahoo(latency=0.01, rate_limited_calls=3)
+        fetcher = CurrencyDataFetcher(max_workers=3, rate_limiter=TokenBucket(100, 3), ticker_factory=stub,
+                                      batch_downloader=empty_batch)
+        with mock.patch('finance_data.fetch_financial_data.RATE_LIMIT_BACKOFF_SECONDS', 0.01), \
+                stub_indicators(fetcher):
+            _, symbol_data = fetcher.fetch_all(fetcher.currency_pairs)
+
+        self.assertTrue(all(symbol_data.values()))
+        self.assertEqual(stub.calls, len(fetcher.currency_pairs) + 3)
+
+    def test_batched_download_replaces_per_symbol_requests(self):
+        stub = StubYahoo(latency=0.01)
+        fetcher = CurrencyDataFetcher(rate_limiter=TokenBucket(100, 1), ticker_factory=stub,
+                                      batch_downloader=stub.download)
+        with mock.patch.multiple(fetcher, fetch_inflation=mock.Mock(return_value=Decimal('3.1')),
+                                 fetch_market_sentiment=mock.Mock(return_value=Decimal('0')),
+                                 fetch_economic_news=mock.Mock(return_value='')):
+            indicators, symbol_data = fetcher.fetch_all(fetcher.currency_pairs)
+
+        self.assertEqual(stub.batch_calls, 1)
+        self.assertEqual(stub.calls, 0)
+        self.assertTrue(all(symbol_data.values()))
+        irx = make_ohlc_frame(seed=sum(map(ord, '^IRX')))
+        self.assertEqual(indicators['interest_rate'], fetcher.safe_decimal_convert(irx['Close'].iloc[-1]))
+
+    def test_batched_frames_match_single_symbol_path(self):
+        stub = StubYahoo(latency=0)
+        fetcher = CurrencyDataFetcher(rate_limiter=TokenBucket(100, 1), ticker_factory=stub,
+                                      batch_downloader=stub.download)
+        frames = fetcher.download_batch(['EUR=X', 'JPY=X'])
+        with mock.patch('finance_data.fetch_financial_data.datetime') as fake_datetime:
+            fake_datetime.now.return_value.hour = 12
+            self.assertEqual(fetcher.fetch_yahoo_finance_data('EUR=X', frames['EUR=X']),
+                             fetcher.fetch_yahoo_finance_data('EUR=X'))
+
+    def test_token_bucket_paces_requests(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # first token is free, the next five are paced at 50/s
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 50 * 0.9)
+
+
+class DailyUpdateTests(TestCase):
+    def test_update_daily_data_writes_every_pair(self):
+        fetcher = CurrencyDataFetcher(max_workers=4, rate_limiter=TokenBucket(100, 4),
+                                      ticker_factory=StubYahoo(latency=0.01), batch_downloader=empty_batch)
+        with stub_indicators(fetcher):
+            fetcher.update_daily_data()
+
+        self.assertEqual(FinancialData.objects.count(), len(fetcher.currency_pairs))
+        self.assertFalse(FinancialData.objects.filter(rsi__isnull=True).exists())
+        # المؤشرات الاقتصادية تُخزَّن مرة واحدة لليوم
+        snapshot = MacroSnapshot.objects.get()
+        self.assertEqual((snapshot.interest_rate, snapshot.dxy), (Decimal('5.25'), Decimal('103.5')))
+        self.assertFalse(NewsDigest.objects.exists())
+
+    def test_forecast_runs_only_after_a_successful_price_update(self):
+        from . import tasks
+
+        with mock.patch.object(tasks, 'CurrencyDataFetcher') as fetcher, \
+                mock.patch.object(tasks.update_predictions, 'delay') as predict, \
+                mock.patch.object(tasks.reconcile_predictions, 'delay') as reconcile:
+            fetcher.return_value.run_daily_update.side_effect = RuntimeError('rate limited')
+            result = tasks.update_currency_data.apply()
+            self.assertFalse(result.successful())
+            predict.assert_not_called()
+
+            fetcher.return_value.run_daily_update.side_effect = None
+            self.assertTrue(tasks.update_currency_data.apply().successful())
+            predict.assert_called_once_with()
+            reconcile.assert_called_once_with()
+
+            # وسيط غير متاح لحظة الإرسال: لا إعادة لتنزيل الأسعار، ويُرسل التقييم رغم ذلك
+            fetcher.reset_mock()
+            predict.side_effect = ConnectionError('broker unavailable')
+            self.assertTrue(tasks.update_currency_data.apply().successful())
+            fetcher.return_value.run_daily_update.assert_called_once_with()
+            self.assertEqual(reconcile.call_count, 2)
+
+    def test_percent_change_uses_prefetched_previous_close(self):
+        fetcher = CurrencyDataFetcher(rate_limiter=TokenBucket(100, 4),
+                                      ticker_factory=StubYahoo(latency=0), batch_downloader=empty_batch)
+        yesterday = datetime.now().date() - timedelta(days=1)
+        FinancialData.objects.create(date=yesterday, ticker='EUR=X', open_price=1, high_price=1, low_price=1,
+                                     close_price=Decimal('1.000000'), adj_close=1, volume=0)
+        with stub_indicators(fetcher):
+            rows = fetcher.update_daily_data()
+
+        eur = FinancialData.objects.get(ticker='EUR=X', date=yesterday + timedelta(days=1))
+        expected = fetcher.percent_change_from(eur.close_price, Decimal('1.000000'))
+        self.assertAlmostEqual(eur.percent_change, expected, places=5)
+        self.assertEqual(len(rows), len(fetcher.currency_pairs))
+
+
+class IndicatorEquivalenceTests(SimpleTestCase):
+    """The vectorized engine must reproduce fetch_yahoo_finance_data row for row"""
+
+    symbols = ['EUR=X', 'JPY=X', 'KWD=X']
+
+    def setUp(self):
+        self.fetcher = CurrencyDataFetcher(rate_limiter=TokenBucket(1000, 1))
+        self.frames = {symbol: make_ohlc_frame(rows=240, seed=i) for i, symbol in enumerate(self.symbols)}
+        # بعض القيم المفقودة ونطاق صفري لاختبار الحالات الحدية
+        self.frames['JPY=X'].iloc[100, self.frames['JPY=X'].columns.get_loc('Close')] = np.nan
+        self.frames['KWD=X'].iloc[30:50, :4] = 1.25
+
+    def assert_row_matches(self, expected, row):
+        for field, value in expected.items():
+            actual = row[field]
+            if value is None:
+                self.assertIsNone(actual, field)
+            else:
+                self.assertIsNotNone(actual, field)
+                self.assertAlmostEqual(float(actual), float(value), delta=2e-6, msg=field)
+
+    def check_equivalence(self, window=None):
+        panel = panel_from_frames(self.frames)
+        if window:
+            panel = panel.groupby('ticker', group_keys=False).tail(window)
+        result = compute_indicators(panel, hour=12)
+        records = list(result.to_records())
+        with mock.patch('finance_data.fetch_financial_data.datetime') as fake_datetime:
+            fake_datetime.now.return_value.hour = 12
+            for symbol, frame in self.frames.items():
+                rows = [record for record in records if record['ticker'] == symbol]
+                frame = frame.tail(window) if window else frame
+                for end in range(14, len(frame) + 1, 7):
+                    data = frame.iloc[:end].copy()
+                    data.name = symbol
+                    expected = self.fetcher.fetch_yahoo_finance_data(symbol, data)
+                    self.assert_row_matches(expected, rows[end - 1])
+
+    def test_full_history_matches_scalar_path(self):
+        self.check_equivalence()
+
+    def test_sixty_day_window_matches_scalar_path(self):
+        self.check_equivalence(window=60)
+
+    def test_columnar_result_covers_every_row(self):
+        result = compute_indicators(panel_from_frames(self.frames), hour=12)
+        self.assertEqual(len(result), 240 * len(self.symbols))
+        for column in INDICATOR_COLUMNS:
+            self.assertEqual(result[column].shape, (len(result),))
+        self.assertFalse(np.isnan(result['ma_200'][result['ticker'] == 'EUR=X'][199:]).any())
+
+
+class CsvImportTests(TestCase):
+    csv = (
+        'Date,Price,Open,High,Low,Vol.,Change %\n'
+        '01/02/2024,"1,234.5",1230,1240,1220,1.5M,0.50%\n'
+        '13/40/2024,1.1,1.1,1.1,1.1,,0%\n'
+        '01/03/2024,abc,1.1,1.2,1.0,10K,-0.2%\n'
+        '01/04/2024,1.2,1.1,1.3,1.0,,1.1%\n'
+        '01/04/2024,1.25,1.1,1.3,1.0,,1.2%\n'
+        '01/05/2024,1.3,1.2,1.4,1.1,1.2X,0.1%\n'
+    )
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        result = import_financial_csv(io.StringIO(self.csv), ticker='XRP/USDT', chunk_size=2)
+
+        self.assertEqual(result.failed, 3)
+        self.assertEqual([error['row'] for error in result.errors], [3, 4, 7])
+        self.assertEqual(result.errors[2]['error'], 'invalid volume')
+        self.assertEqual(FinancialData.objects.count(), 2)
+        first = FinancialData.objects.get(date='2024-01-02')
+        self.assertEqual(first.close_price, Decimal('1234.5'))
+        self.assertEqual(first.volume, Decimal('1500000'))
+        self.assertEqual(first.percent_change, Decimal('0.5'))
+        # آخر صف مكرر هو الذي يُحفظ
+        self.assertEqual(FinancialData.objects.get(date='2024-01-04').close_price, Decimal('1.25'))
+        # الحجم الفارغ يُحفظ صفراً
+        self.assertEqual(FinancialData.objects.get(date='2024-01-04').volume, Decimal('0'))
+
+    def test_derived_data_is_refreshed_once_per_file(self):
+        with mock.patch('finance_data.importers.refresh_market_data', wraps=refresh_market_data) as refresh:
+            import_financial_csv(io.StringIO(self.csv), ticker='XRP/USDT', chunk_size=2)
+        refresh.assert_called_once()
+        self.assertEqual(LatestQuote.objects.get().date, datetime(2024, 1, 4).date())
+        self.assertEqual(MonthlyBar.objects.get().bars, 2)
+
+        # الكتابة المجمّعة وحدها لا تحدّث الجداول المشتقة
+        upsert_financial_data([{'date': datetime(2024, 2, 1).date(), 'ticker': 'XRP/USDT', 'open_price': Decimal('1'),
+                                'high_price': Decimal('1'), 'low_price': Decimal('1'), 'close_price': Decimal('1'),
+                                'adj_close': Decimal('1'), 'volume': Decimal('0')}])
+        self.assertEqual(LatestQuote.objects.get().date, datetime(2024, 1, 4).date())
+
+    def test_ticker_column_overrides_default(self):
+        data = 'Date,Ticker,Open,High,Low,Close\n2024-01-02,EUR=X,1.1,1.2,1.0,1.15\n'
+        result = import_financial_csv(io.StringIO(data), date_format='%Y-%m-%d')
+
+        self.assertEqual(result.imported, 1)
+        self.assertTrue(FinancialData.objects.filter(ticker='EUR=X').exists())
+
+    def test_missing_columns_raise(self):
+        with self.assertRaises(ValueError):
+            import_financial_csv(io.StringIO('Date,Open\n01/02/2024,1\n'), ticker='XRP/USDT')
+
+    def test_bulk_upsert_rejects_values_exceeding_max_digits(self):
+        record = {'date': datetime(2024, 1, 2).date(), 'ticker': 'EUR=X', 'open_price': Decimal('1.1'),
+                  'high_price': Decimal('1.2'), 'low_price': Decimal('1.0'), 'close_price': Decimal('1.15'),
+                  'adj_close': Decimal('1.15'), 'volume': Decimal('0')}
+        # close_price: 10 أرقام منها 6 عشرية
+        for value in (Decimal('12345.5'), 12345.5, Decimal('NaN')):
+            with self.assertRaises(ValidationError) as context:
+                upsert_financial_data([record, {**record, 'date': datetime(2024, 1, 3).date(), 'close_price': value}])
+            self.assertIn('close_price', context.exception.message_dict)
+        self.assertFalse(FinancialData.objects.exists())
+
+        upsert_financial_data([{**record, 'close_price': Decimal('9999.999999')}])
+        self.assertEqual(FinancialData.objects.get().close_price, Decimal('9999.999999'))
+
+
+class BackfillCommandTests(TestCase):
+    command = 'finance_data.management.commands.backfill_financial_data'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.csv_path = os.path.join(tmp.name, 'forex.csv')
+        self.checkpoint = os.path.join(tmp.name, 'checkpoint.json')
+        # 260 يوم تداول لكل رمز حتى يكتمل المتوسط المتحرك 200
+        frames = []
+        for seed, ticker in enumerate(('EUR=X', 'JPY=X')):
+            frame = make_ohlc_frame(rows=260, seed=seed, start='2023-01-02')
+            frame.insert(0, 'Date', frame.index.strftime('%m/%d/%Y'))
+            frame.insert(0, 'Currency', ticker)
+            frames.append(frame)
+        pd.concat(frames).to_csv(self.csv_path, index=False)
+
+    def backfill(self, *args):
+        call_command('backfill_financial_data', '--start', '2023-01-02', '--end', '2023-12-31',
+                     '--csv-path', self.csv_path, '--checkpoint', self.checkpoint, *args, stdout=io.StringIO())
+
+    def checkpoints(self):
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def test_backfill_from_csv_with_indicators(self):
+        self.backfill()
+
+        self.assertEqual(FinancialData.objects.filter(ticker='EUR=X').count(), 260)
+        self.assertEqual(FinancialData.objects.filter(ticker='JPY=X').count(), 260)
+        rows = FinancialData.objects.filter(ticker='EUR=X').order_by('date')
+        self.assertIsNone(rows.first().ma_200)
+        self.assertIsNotNone(rows.last().ma_200)
+        self.assertIsNotNone(rows.last().rsi)
+        self.assertEqual(self.checkpoints(), {})
+
+    def test_interrupted_run_resumes_after_done_tickers(self):
+        calls = []
+
+        def failing_upsert(records, batch_size):
+            calls.append({record['ticker'] for record in records})
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return upsert_financial_data(records, batch_size=batch_size)
+
+        # دفعة واحدة لكل رمز: الأول يُكتب والثاني يفشل
+        with mock.patch(f'{self.command}.upsert_financial_data', side_effect=failing_upsert):
+            with self.assertRaises(RuntimeError):
+                self.backfill('--chunk-size', '260')
+        self.assertEqual(list(self.checkpoints().values()), [{'EUR=X': '2023-12-29'}])
+
+        with mock.patch(f'{self.command}.upsert_financial_data', side_effect=upsert_financial_data) as upsert:
+            self.backfill('--chunk-size', '260')
+        self.assertEqual({record['ticker'] for call in upsert.call_args_list for record in call.args[0]}, {'JPY=X'})
+        self.assertEqual(FinancialData.objects.filter(ticker='JPY=X').count(), 260)
+        self.assertEqual(self.checkpoints(), {})
+
+    def save_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'forex-csv:2023-01-02:2023-12-31:EUR=X': {'EUR=X': '2023-12-29'}}, f)
+
+    def test_checkpoint_is_scoped_to_ticker_set_and_reset(self):
+        self.save_checkpoint()
+
+        # تشغيل بمجموعة رموز مختلفة لا يستخدم نقطة التشغيل الأخرى
+        self.backfill('--tickers', 'EUR=X', 'JPY=X')
+        self.assertEqual(FinancialData.objects.count(), 520)
+        self.assertIn('forex-csv:2023-01-02:2023-12-31:EUR=X', self.checkpoints())
+
+        FinancialData.objects.all().delete()
+        self.backfill('--tickers', 'EUR=X')
+        self.assertFalse(FinancialData.objects.exists())
+        self.save_checkpoint()
+        self.backfill('--tickers', 'EUR=X', '--reset')
+        self.assertEqual(FinancialData.objects.filter(ticker='EUR=X').count(), 260)
+        self.assertEqual(self.checkpoints(), {})
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        start = datetime(2024, 1, 1).date()
+        FinancialData.objects.bulk_create([
+            FinancialData(date=start + timedelta(days=day), ticker=ticker, open_price=1, high_price=1, low_price=1,
+                          close_price=day, adj_close=1, volume=0)
+            for ticker in ('EUR=X', 'JPY=X') for day in range(5)
+        ])
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        url = '/api/get-financial-data/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen += [(row['ticker'], row['date']) for row in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/get-financial-data/', {'fields': 'date,close_price', 'ticker': 'JPY=X'})
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(set(response.data['results'][0]), {'date', 'close_price'})
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get('/api/get-financial-data/', {'fields': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/get-financial-data/', {'cursor': '!!'}).status_code, 404)
+
+    def test_macro_and_news_only_when_requested(self):
+        MacroSnapshot.objects.create(date=datetime(2024, 1, 1).date(), interest_rate=Decimal('5.25'))
+        NewsDigest.objects.create(date=datetime(2024, 1, 2).date(), headlines='Rates on hold')
+
+        plain = self.client.get('/api/financial-data/', {'ticker': 'EUR=X'}).data['results'][0]
+        self.assertNotIn('interest_rate', plain)
+        self.assertNotIn('economic_news', plain)
+
+        with self.assertNumQueries(3):  # page, macro, news
+            rows = self.client.get('/api/financial-data/', {'ticker': 'EUR=X', 'include': 'macro,news',
+                                                            'fields': 'close_price'}).data['results']
+        self.assertEqual((rows[0]['interest_rate'], rows[0]['dxy'], rows[0]['economic_news']),
+                         ('5.250000', None, None))
+        self.assertEqual((rows[1]['interest_rate'], rows[1]['economic_news']), (None, 'Rates on hold'))
+
+        pk = FinancialData.objects.get(ticker='JPY=X', date='2024-01-01').pk
+        self.assertEqual(self.client.get(f'/api/financial-data/{pk}/', {'include': 'macro'}).data['interest_rate'],
+                         '5.250000')
+        self.assertEqual(self.client.get('/api/get-financial-data/', {'include': 'weather'}).status_code, 400)
+
+
+class CompactFormatTests(KeysetPaginationTests):
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_columnar_json(self):
+        response = self.client.get('/api/get-financial-data/', {'format': 'columnar', 'fields': 'close_price'})
+        body = json.loads(self.content(response))
+
+        self.assertEqual(list(body['columns']), ['ticker', 'date', 'close_price'])
+        self.assertEqual(body['columns']['close_price'][:3], [0.0, 1.0, 2.0])
+        self.assertEqual(body['columns']['date'][0], '2024-01-01')
+        self.assertIsNone(body['next_cursor'])
+
+    def test_csv_follows_cursor_header(self):
+        rows = []
+        params = {'page_size': 4, 'fields': 'close_price'}
+        while True:
+            response = self.client.get('/api/financial-data/', params, HTTP_ACCEPT='text/csv')
+            self.assertTrue(response['Content-Type'].startswith('text/csv'))
+            rows += list(csv.reader(io.StringIO(self.content(response).decode())))[1:]
+            if not response.has_header('X-Next-Cursor'):
+                break
+            params['cursor'] = response['X-Next-Cursor']
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0], ['EUR=X', '2024-01-01', '0.000000'])
+
+    @skipIf(pa is None, 'pyarrow is not installed')
+    def test_arrow_stream(self):
+        response = self.client.get('/api/get-financial-data/', {'format': 'arrow', 'fields': 'close_price,rsi'})
+        table = pa.ipc.open_stream(self.content(response)).read_all()
+
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column('close_price').type, pa.float64())
+        self.assertEqual(table.column('rsi').null_count, 10)
+
+
+class FloatReadTests(TestCase):
+    setUp = KeysetPaginationTests.setUp
+
+    def test_float_array_matches_decimal_values(self):
+        FinancialData.objects.filter(ticker='JPY=X', date='2024-01-03').update(rsi=Decimal('55.123456'))
+        fields = ['close_price', 'rsi', 'volume']
+        queryset = FinancialData.objects.order_by('ticker', 'date')
+        array = float_array(queryset, fields)
+
+        expected = np.array([[np.nan if value is None else float(value) for value in row]
+                             for row in queryset.values_list(*fields)])
+        self.assertEqual(array.dtype, np.float64)
+        np.testing.assert_array_equal(array, expected)
+        self.assertEqual(float_array(queryset.none(), fields).shape, (0, 3))
+
+    def test_only_float_formats_cast_in_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(self.client.get('/api/get-financial-data/', {'format': 'columnar'}).streaming_content)
+        self.assertIn('CAST(', queries[0]['sql'])
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(self.client.get('/api/get-financial-data/', {'format': 'csv'}).streaming_content)
+        self.assertNotIn('CAST(', queries[0]['sql'])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_decode', rows=10, runs=1, fields='close_price,rsi', stdout=out)
+        self.assertIn('per 100k rows', out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LatestQuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def write(self, ticker, day, close):
+        ingest_financial_data([{'date': datetime(2024, 1, day).date(), 'ticker': ticker, 'open_price': close,
+                                'high_price': close, 'low_price': close, 'close_price': close, 'adj_close': close,
+                                'volume': Decimal('0')}])
+
+    def test_write_path_keeps_latest_quote_current(self):
+        self.write('EUR=X', 2, Decimal('1.1'))
+        self.write('EUR=X', 3, Decimal('1.2'))
+        # كتابة تاريخ قديم لا تغيّر آخر سعر
+        self.write('EUR=X', 1, Decimal('1.0'))
+        self.write('JPY=X', 3, Decimal('150'))
+
+        quote = LatestQuote.objects.get(ticker='EUR=X')
+        self.assertEqual((quote.close_price, quote.previous_close), (Decimal('1.2'), Decimal('1.1')))
+        self.assertEqual(latest_prices(), {'EUR=X': Decimal('1.2'), 'JPY=X': Decimal('150')})
+
+        FinancialData.objects.filter(ticker='JPY=X').delete()
+        self.write('EUR=X', 4, Decimal('1.3'))
+        self.assertEqual(LatestQuote.objects.get(ticker='EUR=X').previous_close, Decimal('1.2'))
+
+    def test_latest_endpoint_is_a_single_query(self):
+        for ticker in ('EUR=X', 'JPY=X', 'GBP=X'):
+            self.write(ticker, 2, Decimal('1.1'))
+            self.write(ticker, 3, Decimal('1.2'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/financial-data/latest/')
+        self.assertEqual([row['ticker'] for row in response.data], ['EUR=X', 'GBP=X', 'JPY=X'])
+        self.assertEqual({row['date'] for row in response.data}, {'2024-01-03'})
+
+    def test_latest_endpoint_includes_macro_and_news_on_request(self):
+        self.write('EUR=X', 3, Decimal('1.2'))
+        MacroSnapshot.objects.create(date=datetime(2024, 1, 3).date(), dxy=Decimal('101.5'))
+        NewsDigest.objects.create(date=datetime(2024, 1, 3).date(), headlines='Rates on hold')
+
+        self.assertNotIn('dxy', self.client.get('/api/financial-data/latest/').data[0])
+        with self.assertNumQueries(3):  # quotes, macro, news
+            row = self.client.get('/api/financial-data/latest/', {'include': 'macro,news'}).data[0]
+        self.assertEqual((row['dxy'], row['inflation'], row['economic_news']), ('101.500000', None, 'Rates on hold'))
+        self.assertEqual(self.client.get('/api/financial-data/latest/', {'include': 'weather'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(LatestQuoteTests):
+    def test_cached_until_next_ingestion(self):
+        self.write('EUR=X', 2, Decimal('1.1'))
+        first = self.client.get('/api/currency-price/', {'ticker': 'EUR=X', 'date': '2024-01-02'})
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/currency-price/', {'date': '2024-01-02', 'ticker': 'EUR=X'})
+        self.assertEqual(first.data, second.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.write('EUR=X', 2, Decimal('1.5'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/currency-price/', {'ticker': 'EUR=X', 'date': '2024-01-02'})
+        self.assertEqual(response.data['close_price'], '1.500000')
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/currency-price/', {'ticker': 'EUR=X', 'date': '2024-01-02'})
+                         .status_code, 404)
+        self.write('EUR=X', 2, Decimal('1.1'))
+        self.assertEqual(self.client.get('/api/currency-price/', {'ticker': 'EUR=X', 'date': '2024-01-02'})
+                         .status_code, 200)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                           'LOCATION': 'redis://127.0.0.1:1/0'}})
+    def test_unreachable_cache_falls_back_to_database(self):
+        self.write('EUR=X', 2, Decimal('1.1'))
+        response = self.client.get('/api/financial-data/latest/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class AlertEngineTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='trader')
+
+    def alert(self, ticker, condition, value):
+        return Alert.objects.create(user=self.user, ticker=ticker, alert_type='PRICE', condition=condition,
+                                    value=Decimal(value), notification_method='EMAIL')
+
+    def quote(self, ticker, previous, close):
+        for day, price in ((2, previous), (3, close)):
+            ingest_financial_data([{'date': datetime(2024, 1, day).date(), 'ticker': ticker,
+                                    'open_price': Decimal(price), 'high_price': Decimal(price),
+                                    'low_price': Decimal(price), 'close_price': Decimal(price),
+                                    'adj_close': Decimal(price), 'volume': Decimal('0')}])
+
+    def test_matches_model_conditions(self):
+        self.quote('EUR=X', '1.10', '1.20')
+        self.quote('JPY=X', '150', '148')
+        rng = np.random.default_rng(0)
+        for ticker, low, high in (('EUR=X', 1.0, 1.3), ('JPY=X', 145, 155), ('GBP=X', 1.0, 2.0)):
+            for condition in ('ABOVE', 'BELOW', 'CROSSES'):
+                for value in rng.uniform(low, high, 20):
+                    self.alert(ticker, condition, f'{value:.4f}')
+                # القيم على الحدود تماماً
+                self.alert(ticker, condition, '1.20')
+                self.alert(ticker, condition, '150')
+        inactive = self.alert('EUR=X', 'ABOVE', '1.0')
+        inactive.is_active = False
+        inactive.save()
+
+        quotes = {quote.ticker: quote for quote in LatestQuote.objects.all()}
+        expected = {
+            alert.id for alert in Alert.objects.all()
+            if alert.ticker in quotes and alert.check_alert_condition(quotes[alert.ticker].close_price,
+                                                                      quotes[alert.ticker].previous_close)
+        }
+        self.assertTrue(expected)
+        self.assertNotIn(inactive.id, expected)
+
+        with self.assertNumQueries(5):  # alerts, quotes, savepoint + UPDATE + release
+            triggered = check_alerts()
+        self.assertEqual(set(triggered), expected)
+        self.assertEqual(set(Alert.objects.filter(last_triggered__isnull=False).values_list('id', flat=True)),
+                         expected)
+
+    def test_crosses_in_both_directions(self):
+        index = AlertIndex([(1, 'EUR=X', 'CROSSES', Decimal('1.1')), (2, 'EUR=X', 'CROSSES', Decimal('1.2')),
+                            (3, 'EUR=X', 'CROSSES', Decimal('1.3'))])
+        self.assertEqual(index.matches('EUR=X', Decimal('1.2'), Decimal('1.05')), [1, 2])
+        self.assertEqual(index.matches('EUR=X', Decimal('1.1'), Decimal('1.25')), [1, 2])
+        self.assertEqual(index.matches('EUR=X', Decimal('1.2'), Decimal('1.2')), [])
+        self.assertEqual(index.matches('EUR=X', Decimal('1.2'), None), [])
+
+    def test_evaluates_100k_alerts_quickly(self):
+        rng = np.random.default_rng(1)
+        tickers = [f'T{i}=X' for i in range(50)]
+        conditions = ('ABOVE', 'BELOW', 'CROSSES')
+        alerts = [(i, tickers[i % 50], conditions[i % 3], Decimal(f'{value:.4f}'))
+                  for i, value in enumerate(rng.uniform(0.5, 1.5, 100_000))]
+        quotes = {ticker: (Decimal('1.01'), Decimal('0.99')) for ticker in tickers}
+
+        started = time.perf_counter()
+        triggered = AlertIndex(alerts).evaluate(quotes)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(triggered), sum(
+            (condition == 'ABOVE' and value < Decimal('1.01')) or (condition == 'BELOW' and value > Decimal('1.01'))
+            or (condition == 'CROSSES' and Decimal('0.99') < value <= Decimal('1.01'))
+            for _, _, condition, value in alerts))
+        self.assertLess(elapsed, 1.0)
+
+
+class TradeSweepTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='trader')
+        ingest_financial_data([{'date': datetime(2024, 1, 3).date(), 'ticker': 'EUR=X', 'open_price': Decimal('1.10'),
+                                'high_price': Decimal('1.15'), 'low_price': Decimal('1.05'),
+                                'close_price': Decimal('1.12'), 'adj_close': Decimal('1.12'), 'volume': Decimal('0')}])
+
+    def trade(self, trade_type, stop_loss=None, take_profit=None, ticker='EUR=X'):
+        return Trade.objects.create(user=self.user, ticker=ticker, trade_type=trade_type, quantity=Decimal('1000'),
+                                    entry_price=Decimal('1.10'), stop_loss=stop_loss, take_profit=take_profit,
+                                    leverage=Decimal('2'), commission=Decimal('1.50'))
+
+    def test_close_matches_close_trade(self):
+        hit = [self.trade('BUY', take_profit=Decimal('1.12')), self.trade('SELL', stop_loss=Decimal('1.11')),
+               self.trade('BUY', stop_loss=Decimal('1.12'))]
+        missed = [self.trade('BUY', stop_loss=Decimal('1.06'), take_profit=Decimal('1.14')),
+                  self.trade('SELL', stop_loss=Decimal('0')), self.trade('BUY', take_profit=Decimal('1'), ticker='JPY=X')]
+
+        with self.assertNumQueries(6):  # trades, quotes, savepoint + UPDATE + risk counters + release
+            result = sweep_open_trades()
+        self.assertEqual((result['checked'], result['closed']), (6, 3))
+
+        for trade in hit:
+            expected = Trade.objects.get(pk=trade.pk)
+            trade.close_trade(Decimal('1.12'))
+            self.assertEqual(expected.status, 'CLOSED')
+            self.assertEqual(expected.exit_price, Decimal('1.12'))
+            self.assertEqual(expected.profit_loss, trade.profit_loss)
+        self.assertEqual(set(Trade.objects.filter(status='OPEN').values_list('id', flat=True)),
+                         {trade.id for trade in missed})
+
+    def test_intraday_range_closes_at_level(self):
+        buy = self.trade('BUY', stop_loss=Decimal('1.06'), take_profit=Decimal('1.14'))
+        sell = self.trade('SELL', take_profit=Decimal('1.07'))
+        untouched = self.trade('SELL', stop_loss=Decimal('1.20'))
+
+        self.assertEqual(sweep_open_trades(use_range=True)['closed'], 2)
+        buy.refresh_from_db()
+        sell.refresh_from_db()
+        # المستويان لُمسا في نفس اليوم: وقف الخسارة أولاً
+        self.assertEqual((buy.exit_price, buy.profit_loss), (Decimal('1.06'), Decimal('-81.50')))
+        self.assertEqual((sell.exit_price, sell.profit_loss), (Decimal('1.07'), Decimal('58.50')))
+        self.assertEqual(Trade.objects.get(pk=untouched.pk).status, 'OPEN')
+
+
+class TradingAnalyticsTests(TestCase):
+    start = datetime(2024, 1, 1).date()
+    end = datetime(2024, 1, 31).date()
+
+    def setUp(self):
+        User = get_user_model()
+        self.trader, self.idle, self.viewer = (User.objects.create(username=name)
+                                                for name in ('trader', 'idle', 'viewer'))
+        for user, is_trader in ((self.trader, True), (self.idle, True), (self.viewer, False)):
+            UserProfile.objects.create(user=user, is_trader=is_trader)
+        entry = timezone.make_aware(datetime(2024, 1, 10, 9))
+        for profit_loss, hours in (('30', 2), ('10', 4), ('-20', 6), ('0', 8)):
+            trade = Trade.objects.create(user=self.trader, ticker='EUR=X', trade_type='BUY', quantity=1,
+                                         entry_price=1, status='CLOSED', profit_loss=Decimal(profit_loss),
+                                         exit_date=entry + timedelta(hours=hours))
+            Trade.objects.filter(pk=trade.pk).update(entry_date=entry)
+        # خارج الفترة أو غير مغلقة
+        Trade.objects.create(user=self.trader, ticker='EUR=X', trade_type='BUY', quantity=1, entry_price=1)
+
+    def test_single_grouped_query_for_all_traders(self):
+        with self.assertNumQueries(3):  # traders, aggregate, upsert
+            self.assertEqual(refresh_trading_analytics(self.start, self.end), 2)
+        analytics = TradingAnalytics.objects.get(user=self.trader)
+        self.assertEqual((analytics.total_trades, analytics.winning_trades, analytics.losing_trades), (4, 2, 1))
+        self.assertEqual(analytics.win_rate, Decimal('50'))
+        self.assertEqual(analytics.total_profit_loss, Decimal('20'))
+        self.assertEqual((analytics.largest_gain, analytics.largest_loss), (Decimal('30'), Decimal('-20')))
+        self.assertEqual(analytics.average_holding_period, timedelta(hours=5))
+        self.assertEqual(analytics.risk_reward_ratio, Decimal('1'))
+        self.assertEqual(TradingAnalytics.objects.get(user=self.idle).total_trades, 0)
+        self.assertFalse(TradingAnalytics.objects.filter(user=self.viewer).exists())
+
+        # نفس النتيجة عبر الحساب الفردي، وإعادة التشغيل تحدّث الصف نفسه
+        single = TradingAnalytics(user=self.trader, period_start=self.start, period_end=self.end)
+        single.apply_aggregates(Trade.objects.filter(user=self.trader, status='CLOSED')
+                                .aggregate(**TradingAnalytics.trade_aggregates()))
+        self.assertEqual(single.risk_reward_ratio, analytics.risk_reward_ratio)
+        Trade.objects.filter(profit_loss=Decimal('-20')).update(profit_loss=Decimal('-40'))
+        refresh_trading_analytics(self.start, self.end)
+        self.assertEqual(TradingAnalytics.objects.count(), 2)
+        self.assertEqual(TradingAnalytics.objects.get(user=self.trader).risk_reward_ratio, Decimal('0.5'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BalanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.users = [User.objects.create(username=f'trader{i}') for i in range(3)]
+        for user in self.users:
+            UserProfile.objects.create(user=user, is_trader=True, balance=Decimal('999'))
+        for user, profit_loss in ((self.users[0], '10.50'), (self.users[0], '-2.25'), (self.users[1], '7')):
+            Trade.objects.create(user=user, ticker='EUR=X', trade_type='BUY', quantity=1, entry_price=1,
+                                 status='CLOSED', profit_loss=Decimal(profit_loss))
+        Trade.objects.create(user=self.users[1], ticker='EUR=X', trade_type='BUY', quantity=1, entry_price=1)
+
+    def balances(self):
+        return list(UserProfile.objects.order_by('user__username').values_list('balance', flat=True))
+
+    def test_single_update_for_all_traders(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(refresh_balances(), 3)
+        self.assertEqual(self.balances(), [Decimal('8.25'), Decimal('7'), Decimal('0')])
+
+    def test_incremental_only_touches_changed_users(self):
+        self.assertEqual(refresh_balances_incrementally(), 3)
+        UserProfile.objects.update(balance=Decimal('999'))
+        trade = Trade.objects.get(user=self.users[1], status='OPEN')
+        trade.close_trade(Decimal('1.5'))
+
+        self.assertEqual(refresh_balances_incrementally(), 1)
+        self.assertEqual(self.balances(), [Decimal('999'), Decimal('7.50'), Decimal('999')])
+        self.assertEqual(refresh_balances_incrementally(), 0)
+
+
+class RiskEngineTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='trader')
+        self.limits = RiskManagement.objects.create(
+            user=self.user, max_position_size=Decimal('1000'), max_daily_loss=Decimal('50'),
+            max_total_risk=Decimal('10'), stop_loss_percentage=Decimal('2'), take_profit_ratio=Decimal('2'),
+            max_trades_per_day=3, risk_per_trade=Decimal('1'))
+        # نفس إعادة المزامنة الليلية
+        rebuild_counters()
+
+    def open_trade(self):
+        return Trade.objects.create(user=self.user, ticker='EUR=X', trade_type='BUY', quantity=Decimal('100'),
+                                    entry_price=Decimal('1.10'), leverage=Decimal('2'))
+
+    def assert_matches_trades(self):
+        counter = RiskCounter.objects.get(user=self.user)
+        rebuilt = rebuild_counters([self.user.id])[self.user.id]
+        for field in ('trades_today', 'realized_loss_today', 'open_exposure'):
+            self.assertEqual(getattr(counter, field), getattr(rebuilt, field), field)
+
+    def test_counters_follow_trades_without_scans(self):
+        first, second = self.open_trade(), self.open_trade()
+        self.assert_matches_trades()
+        self.assertEqual(RiskCounter.objects.get(user=self.user).open_exposure, Decimal('440'))
+
+        first.close_trade(Decimal('0.80'))
+        self.assert_matches_trades()
+        counter = RiskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.trades_today, counter.realized_loss_today), (2, Decimal('60')))
+
+        with self.assertNumQueries(1):
+            allowed, message = self.limits.check_risk_limits(Decimal('100'))
+        self.assertEqual((allowed, message), (False, "تجاوزت الحد الأقصى للخسارة اليومية"))
+        self.assertEqual(second.status, 'OPEN')
+
+    def test_new_day_resets_daily_counters(self):
+        self.open_trade()
+        RiskCounter.objects.filter(user=self.user).update(day=timezone.now().date() - timedelta(days=1))
+        self.assertEqual(check_orders([(self.user.id, Decimal('10'))]), [(True, "ضمن حدود المخاطر المسموح بها")])
+        self.open_trade()
+        counter = RiskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.trades_today, counter.open_exposure), (1, Decimal('440')))
+
+    def test_batch_mode_counts_accepted_orders(self):
+        other = get_user_model().objects.create(username='other')
+        self.open_trade()
+        orders = [(self.user.id, Decimal('100')), (self.user.id, Decimal('5000')), (other.id, Decimal('5000')),
+                  (self.user.id, Decimal('100')), (self.user.id, Decimal('100'))]
+        with self.assertNumQueries(2):
+            results = check_orders(orders)
+        self.assertEqual([allowed for allowed, _ in results], [True, False, True, True, False])
+        self.assertEqual(results[4][1], "تجاوزت الحد الأقصى للصفقات اليومية")
+
+    def test_fresh_trader_can_open_a_position(self):
+        # متداول جديد بلا ملف شخصي ولا صفقات مغلقة (رصيد صفري)
+        newcomer = get_user_model().objects.create(username='newcomer')
+        RiskManagement.objects.create(
+            user=newcomer, max_position_size=Decimal('1000'), max_daily_loss=Decimal('50'),
+            max_total_risk=Decimal('10'), stop_loss_percentage=Decimal('2'), take_profit_ratio=Decimal('2'),
+            max_trades_per_day=3, risk_per_trade=Decimal('1'))
+        self.assertEqual(check_orders([(newcomer.id, Decimal('500'), Decimal('10'))]),
+                         [(True, "ضمن حدود المخاطر المسموح بها")])
+
+        UserProfile.objects.create(user=newcomer)
+        self.assertEqual(newcomer.risk_management.check_risk_limits(Decimal('500')),
+                         (True, "ضمن حدود المخاطر المسموح بها"))
+
+    def test_closing_without_profit_loss_still_updates_counters(self):
+        trade = self.open_trade()
+        # سعر خروج صفري يترك profit_loss فارغاً في calculate_profit_loss
+        trade.close_trade(Decimal('0'))
+
+        trade.refresh_from_db()
+        self.assertEqual((trade.status, trade.profit_loss), ('CLOSED', None))
+        counter = RiskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.open_exposure, counter.realized_loss_today), (Decimal('0'), Decimal('0')))
+        self.assert_matches_trades()
+
+
+class QueryPlanTests(TestCase):
+    """Regression guard: the hot queries must keep using their composite indexes"""
+    day = datetime(2024, 1, 3).date()
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, plan)
+
+    def test_financial_data_queries(self):
+        # نافذة التوقع وآخر سعر لرمز واحد
+        self.assertUsesIndex(FinancialData.objects.filter(ticker='EUR=X', date__lt=self.day).order_by('-date')[:12],
+                             'financialdata_ticker_date')
+        self.assertUsesIndex(FinancialData.objects.filter(ticker='EUR=X').order_by('-date')[:1],
+                             'financialdata_ticker_date')
+        # ملخص السوق
+        self.assertUsesIndex(FinancialData.objects.filter(date=self.day, percent_change__gt=0)
+                             .order_by('-percent_change')[:5], 'financialdata_date_change')
+
+    def test_trade_and_alert_queries(self):
+        self.assertUsesIndex(Trade.objects.filter(user_id=1, status='CLOSED'), 'trade_user_status')
+        self.assertUsesIndex(Trade.objects.filter(user_id=1, entry_day=self.day), 'trade_user_entry_day')
+        self.assertUsesIndex(Trade.objects.filter(user_id=1, entry_day__range=(self.day, self.day), status='CLOSED')
+                             .values('user_id').annotate(total=Count('id')), 'trade_user_')
+        self.assertUsesIndex(Trade.objects.filter(status='OPEN').values_list(*OPEN_TRADE_FIELDS),
+                             'trade_status_ticker')
+        self.assertUsesIndex(Alert.objects.filter(is_active=True).values_list('id', 'ticker', 'condition', 'value'),
+                             'COVERING INDEX alert_active_lookup')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StorageTests(TestCase):
+    """Weekly/monthly rollups, raw-row retention and the MySQL partition DDL"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        # 15 يوم تداول من الاثنين 22 يناير إلى الجمعة 9 فبراير 2024
+        self.days = list(pd.bdate_range('2024-01-22', periods=15).date)
+        ingest_financial_data([
+            {'date': day, 'ticker': 'EUR=X', 'open_price': Decimal(i), 'high_price': Decimal(i + 10),
+             'low_price': Decimal(i) - 1, 'close_price': Decimal(i) + Decimal('0.5'), 'adj_close': Decimal(i),
+             'volume': Decimal('100')}
+            for i, day in enumerate(self.days, start=1)
+        ])
+
+    def bar(self, model, day):
+        return model.objects.filter(ticker='EUR=X', date=day).values_list(
+            'open_price', 'high_price', 'low_price', 'close_price', 'volume', 'bars', 'last_date').first()
+
+    def test_rollups_follow_writes(self):
+        self.assertEqual(WeeklyBar.objects.count(), 3)
+        self.assertEqual(self.bar(WeeklyBar, self.days[5]),
+                         (6, 20, 5, Decimal('10.5'), 500, 5, self.days[9]))
+        self.assertEqual(self.bar(MonthlyBar, datetime(2024, 1, 1).date()),
+                         (1, 18, 0, Decimal('8.5'), 800, 8, datetime(2024, 1, 31).date()))
+
+        pk = FinancialData.objects.get(ticker='EUR=X', date=self.days[14]).pk
+        self.assertEqual(self.client.delete(f'/api/financial-data/{pk}/').status_code, 204)
+        self.assertEqual(self.bar(MonthlyBar, datetime(2024, 2, 1).date())[3:6], (Decimal('14.5'), 600, 6))
+
+        # نقل صف إلى رمز آخر يحدّث فترات الرمزين
+        pk = FinancialData.objects.get(ticker='EUR=X', date=self.days[9]).pk
+        data = self.client.get(f'/api/financial-data/{pk}/').data
+        data.update(ticker='JPY=X')
+        self.assertEqual(self.client.put(f'/api/financial-data/{pk}/', data, content_type='application/json')
+                         .status_code, 200)
+        self.assertEqual(self.bar(WeeklyBar, self.days[5])[3:7], (Decimal('9.5'), 400, 4, self.days[8]))
+        self.assertEqual(WeeklyBar.objects.get(ticker='JPY=X').last_date, self.days[9])
+
+        pk = FinancialData.objects.get(ticker='JPY=X').pk
+        self.client.delete(f'/api/financial-data/{pk}/')
+        self.assertFalse(WeeklyBar.objects.filter(ticker='JPY=X').exists())
+        self.assertFalse(MonthlyBar.objects.filter(ticker='JPY=X').exists())
+
+    def test_failed_refresh_rolls_back_the_write(self):
+        pk = FinancialData.objects.get(ticker='EUR=X', date=self.days[0]).pk
+        data = self.client.get(f'/api/financial-data/{pk}/').data
+        with mock.patch('finance_data.views.refresh_rollups', side_effect=RuntimeError('rollups unavailable')):
+            with self.assertRaises(RuntimeError):
+                self.client.delete(f'/api/financial-data/{pk}/')
+            with self.assertRaises(RuntimeError):
+                self.client.put(f'/api/financial-data/{pk}/', {**data, 'ticker': 'JPY=X'},
+                                content_type='application/json')
+        self.assertEqual(FinancialData.objects.get(pk=pk).ticker, 'EUR=X')
+        self.assertEqual(LatestQuote.objects.get().ticker, 'EUR=X')
+
+    def test_interval_reads_rollups(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/financial-data/', {'interval': 'week', 'ticker': 'eur=x',
+                                                                'start_date': '2024-02-01', 'end_date': '2024-02-05'})
+        self.assertEqual([row['date'] for row in response.data['results']], ['2024-01-29', '2024-02-05'])
+        self.assertEqual(response.data['results'][0]['close_price'], '10.500000')
+
+        response = self.client.get('/api/financial-data/', {'interval': 'month', 'format': 'columnar'})
+        columns = json.loads(b''.join(response.streaming_content))['columns']
+        self.assertEqual((columns['date'], columns['bars']), (['2024-01-01', '2024-02-01'], [8, 7]))
+        self.assertEqual(self.client.get('/api/financial-data/', {'interval': 'hour'}).status_code, 400)
+
+    @override_settings(FINANCIAL_DATA_RETENTION_DAYS=400)
+    def test_retention_keeps_rollups_and_freezes_old_periods(self):
+        january = datetime(2024, 1, 1).date()
+        monthly = self.bar(MonthlyBar, january)
+        # الحد: الاثنين 29 يناير (بداية أسبوع أول فبراير)
+        with mock.patch('finance_data.rollups.timezone.now', return_value=timezone.make_aware(datetime(2025, 3, 16))):
+            result = apply_retention()
+            self.assertEqual((result['cutoff'], result['rows_deleted']), (self.days[5], 5))
+            self.assertFalse(FinancialData.objects.filter(date__lt=self.days[5]).exists())
+            self.assertEqual(self.bar(WeeklyBar, self.days[0])[5], 5)
+
+            ingest_financial_data([{'date': self.days[6], 'ticker': 'EUR=X', 'open_price': Decimal('7'),
+                                    'high_price': Decimal('99'), 'low_price': Decimal('6'),
+                                    'close_price': Decimal('7.5'), 'adj_close': Decimal('7'), 'volume': Decimal('100')}])
+        # شهر يناير بدأ قبل الحد فلا يُعاد حسابه من الصفوف المتبقية
+        self.assertEqual(self.bar(MonthlyBar, january), monthly)
+        self.assertEqual(self.bar(WeeklyBar, self.days[5])[1], 99)
+        self.assertEqual(apply_retention()['cutoff'].weekday(), 0)
+
+    def test_partition_statements(self):
+        bounds = partition_bounds(datetime(2023, 11, 15).date(), datetime(2024, 1, 2).date())
+        self.assertEqual([name for name, _ in bounds], ['p202311', 'p202312', 'p202401'])
+        self.assertEqual(bounds[-1][1], datetime(2024, 2, 1).date())
+        self.assertEqual(partition_bounds(datetime(2023, 5, 1).date(), datetime(2024, 1, 1).date(), 'year'),
+                         [('p2023', datetime(2024, 1, 1).date()), ('p2024', datetime(2025, 1, 1).date())])
+
+        create = partition_statements(bounds)
+        self.assertIn('ADD PRIMARY KEY (`id`, `date`)', create[0])
+        self.assertIn("PARTITION p202401 VALUES LESS THAN ('2024-02-01'), PARTITION pmax VALUES LESS THAN (MAXVALUE)",
+                      create[1])
+
+        existing = [('p202311', datetime(2023, 12, 1).date()), ('p202312', datetime(2024, 1, 1).date()),
+                    ('pmax', None)]
+        self.assertEqual(partition_statements(bounds, existing), [
+            "ALTER TABLE `finance_data_financialdata` REORGANIZE PARTITION pmax INTO "
+            "(PARTITION p202401 VALUES LESS THAN ('2024-02-01'), PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        ])
+        self.assertEqual(partition_statements(bounds[:2], existing), [])
+        self.assertEqual(expired_partitions(existing, datetime(2024, 1, 1).date()), ['p202311', 'p202312'])
+
+        out = io.StringIO()
+        call_command('partition_financial_data', '--dry-run', stdout=out)
+        self.assertIn('PARTITION p202401', out.getvalue())
+
+    def test_scheduled_task_only_extends_a_partitioned_table(self):
+        from . import tasks
+        partitioned = [('p202311', datetime(2023, 12, 1).date()), ('pmax', None)]
+        with mock.patch.object(tasks, 'connection', vendor='mysql'), mock.patch.object(tasks, 'execute') as execute, \
+                mock.patch.object(tasks, 'existing_partitions', side_effect=[[], partitioned]):
+            # جدول غير مقسم: لا تغيير للمفتاح الأساسي ولا PARTITION BY من العامل
+            tasks.maintain_partitions()
+            execute.assert_not_called()
+
+            tasks.maintain_partitions()
+            statements = execute.call_args.args[0]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('REORGANIZE PARTITION pmax INTO', statements[0])
@@ -0,0 +1,196 @@
+"""
+Set-based maintenance of trades and trading analytics.
+
+``sweep_open_trades`` loads every OPEN trade as plain tuples, fetches one bar per
+ticker from ``LatestQuote`` and decides stop-loss / take-profit hits for the whole book
+with NumPy masks.  Only the trades that close are turned into model instances, and they
+are written with a single ``bulk_update`` inside one transaction.
+
+With ``use_range=True`` the bar's high/low is used, so a level touched during the day
+closes the trade at that level even if the close came back; when both levels were
+touched the stop loss wins.  Otherwise the close is compared and used as exit price,
+like ``Trade.close_trade``.
+
+``refresh_trading_analytics`` computes the statistics of every trader with a single
+``GROUP BY user_id`` aggregate and upserts them with one ``bulk_create``, and
+``refresh_balances`` rewrites trader balances with one correlated ``UPDATE``.
+"""
+import logging
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import LatestQuote, RiskCounter, Trade, TradingAnalytics, UserProfile
+from .risk import rebuild_counters
+
+logger = logging.getLogger(__name__)
+
+OPEN_TRADE_FIELDS = ('id', 'ticker', 'trade_type', 'quantity', 'entry_price', 'stop_loss', 'take_profit',
+                     'leverage', 'commission', 'user_id')
+CLOSE_FIELDS = ['exit_price', 'exit_date', 'status', 'profit_loss', 'updated_at']
+BULK_UPDATE_BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+BALANCE_WATERMARK_KEY = 'user-statistics:balances-since'
+ANALYTICS_UNIQUE_FIELDS = ['user', 'period_start', 'period_end']
+ANALYTICS_FIELDS = ['total_trades', 'winning_trades', 'losing_trades', 'win_rate', 'total_profit_loss',
+                    'largest_gain', 'largest_loss', 'average_holding_period', 'risk_reward_ratio']
+
+
+def latest_bars(tickers=None):
+    """Map ticker -> (high, low, close) of the latest bar"""
+    quotes = LatestQuote.objects.all()
+    if tickers is not None:
+        quotes = quotes.filter(ticker__in=set(tickers))
+    return {ticker: (high, low, close)
+            for ticker, high, low, close in quotes.values_list('ticker', 'high_price', 'low_price', 'close_price')}
+
+
+def as_array(values):
+    # NaN للقيم الفارغة حتى تكون كل المقارنات معها False
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def find_exits(trades, bars, use_range=False):
+    """
+    ``trades`` are OPEN_TRADE_FIELDS tuples and ``bars`` maps ticker -> (high, low, close).
+    Returns ``[(trade, exit_price)]`` for the trades whose stop loss or take profit is hit.
+    """
+    trades = [trade for trade in trades if trade[1] in bars]
+    if not trades:
+        return []
+    _, tickers, trade_types, _, _, stop_losses, take_profits, _, _, _ = zip(*trades)
+    high, low, close = (as_array(column) for column in zip(*(bars[ticker] for ticker in tickers)))
+    if not use_range:
+        high = low = close
+    buy = np.array(trade_types) == 'BUY'
+    # مستوى 0 يعني غير محدد كما في الفحص القديم (if trade.stop_loss)
+    stop_loss = as_array(level or None for level in stop_losses)
+    take_profit = as_array(level or None for level in take_profits)
+
+    # الشراء يخسر عند الهبوط والبيع يخسر عند الصعود
+    adverse = np.where(buy, low, high)
+    favourable = np.where(buy, high, low)
+    with np.errstate(invalid='ignore'):
+        stop_hit = np.where(buy, adverse <= stop_loss, adverse >= stop_loss)
+        profit_hit = ~stop_hit & np.where(buy, favourable >= take_profit, favourable <= take_profit)
+
+    exits = []
+    for i in np.flatnonzero(stop_hit | profit_hit):
+        trade = trades[i]
+        if not use_range:
+            exit_price = bars[trade[1]][2]
+        else:
+            exit_price = trade[5] if stop_hit[i] else trade[6]
+        exits.append((trade, exit_price))
+    return exits
+
+
+def sweep_open_trades(bars=None, use_range=False, now=None):
+    """
+    Close every OPEN trade whose stop loss / take profit is hit by ``bars`` (default: the
+    latest bar of each ticker).  Returns ``{'checked', 'closed', 'seconds'}``.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+    trades = list(Trade.objects.filter(status='OPEN').values_list(*OPEN_TRADE_FIELDS))
+    if bars is None:
+        bars = latest_bars({trade[1] for trade in trades})
+
+    closing = []
+    # تغيّر عدادات المخاطر لكل مستخدم: (صفقات، خسارة محققة، تعرض)
+    deltas = {}
+    for (trade_id, _, trade_type, quantity, entry_price, _, _, leverage, commission, user_id), exit_price \
+            in find_exits(trades, bars, use_range):
+        profit_loss = Trade.compute_profit_loss(trade_type, entry_price, exit_price, quantity, leverage,
+                                                commission).quantize(CENT)
+        closing.append(Trade(id=trade_id, exit_price=exit_price, exit_date=now, status='CLOSED',
+                             profit_loss=profit_loss, updated_at=now))
+        _, loss, exposure = deltas.get(user_id, (0, 0, 0))
+        deltas[user_id] = (0, loss + max(-profit_loss, 0), exposure - Trade.notional(quantity, entry_price, leverage))
+
+    closed = 0
+    if closing:
+        with transaction.atomic():
+            # الشرط status='OPEN' يمنع الكتابة فوق صفقة أغلقها المستخدم أثناء الفحص
+            closed = Trade.objects.filter(status='OPEN').bulk_update(closing, CLOSE_FIELDS,
+                                                                    batch_size=BULK_UPDATE_BATCH_SIZE)
+            if closed == len(closing):
+                RiskCounter.apply(deltas, now.date())
+            else:
+                # بعض الصفقات أُغلقت من مكان آخر أثناء الفحص: إعادة البناء من جدول الصفقات
+                rebuild_counters(deltas, now.date())
+    result = {'checked': len(trades), 'closed': closed, 'seconds': time.monotonic() - started}
+    logger.info(f"Trade sweep closed {closed} of {len(trades)} open trades in {result['seconds']:.3f}s")
+    return result
+
+
+def refresh_trading_analytics(period_start, period_end, user_ids=None):
+    """
+    Recompute ``TradingAnalytics`` of every trader (or ``user_ids``) for the period with one
+    grouped aggregate over closed trades and one bulk upsert.  Returns the rows written.
+    """
+    traders = UserProfile.objects.filter(is_trader=True).values('user_id') if user_ids is None else user_ids
+    user_ids = list(traders.values_list('user_id', flat=True)) if user_ids is None else list(user_ids)
+    if not user_ids:
+        return 0
+    rows = {
+        row['user_id']: row
+        for row in Trade.objects.filter(
+            user_id__in=traders,
+            entry_day__range=(period_start, period_end),
+            status='CLOSED',
+        ).values('user_id').annotate(**TradingAnalytics.trade_aggregates()).order_by()
+    }
+
+    analytics = []
+    for user_id in user_ids:
+        entry = TradingAnalytics(user_id=user_id, period_start=period_start, period_end=period_end)
+        # المستخدم بدون صفقات مغلقة يحصل على صف بقيم صفرية
+        entry.apply_aggregates(rows.get(user_id, {}))
+        analytics.append(entry)
+    unique_fields = ANALYTICS_UNIQUE_FIELDS if connection.features.supports_update_conflicts_with_target else None
+    TradingAnalytics.objects.bulk_create(analytics, batch_size=BULK_UPDATE_BATCH_SIZE, update_conflicts=True,
+                                         unique_fields=unique_fields, update_fields=ANALYTICS_FIELDS)
+    return len(analytics)
+
+
+def refresh_balances(since=None):
+    """
+    Set every trader's balance to the sum of their closed trades' profit/loss in one
+    UPDATE.  With ``since`` only users with a trade modified at or after that time are
+    rewritten.  Returns the number of profiles updated.
+    """
+    total = Trade.objects.filter(user_id=OuterRef('user_id'), status='CLOSED').order_by().values('user_id') \
+        .annotate(total=Sum('profit_loss')).values('total')
+    profiles = UserProfile.objects.filter(is_trader=True)
+    if since is not None:
+        profiles = profiles.filter(user_id__in=Trade.objects.filter(updated_at__gte=since).values('user_id'))
+    # تحديث عمود balance فقط بدلاً من save() الذي يعيد كتابة كل الأعمدة
+    return profiles.update(balance=Coalesce(Subquery(total), Value(Decimal('0')), output_field=DecimalField()))
+
+
+def refresh_balances_incrementally():
+    """
+    ``refresh_balances`` limited to trades changed since the previous call.  The watermark
+    lives in the Django cache; without one (first run, cache flushed or unreachable) every
+    balance is recomputed.  Deleted trades are only picked up by a full refresh.
+    """
+    started = timezone.now()
+    try:
+        since = cache.get(BALANCE_WATERMARK_KEY)
+    except Exception as e:
+        logger.warning(f"Balance watermark unavailable: {str(e)}")
+        since = None
+    updated = refresh_balances(since)
+    try:
+        # وقت البداية وليس النهاية حتى لا تضيع التعديلات التي حدثت أثناء التحديث
+        cache.set(BALANCE_WATERMARK_KEY, started, timeout=None)
+    except Exception as e:
+        logger.warning(f"Balance watermark not saved: {str(e)}")
+    return updated
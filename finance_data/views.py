@@ -10,18 +10,77 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.crypto import get_random_string
-from django.db.models import Max
+from django.db import transaction
 from finance_data.permissions import IsAdmin , IsUser
-from .models import FinancialData, UserProfile
+from .models import FinancialData, LatestQuote, MonthlyBar, UserProfile, WeeklyBar
 from .serializers import *
 from django.utils import timezone
 from rest_framework.permissions import IsAuthenticated
-import csv
+import pandas as pd
 from django.http import JsonResponse
+from .importers import DEFAULT_DATE_FORMAT, import_financial_csv
+from .macro import attach_context, requested_includes
+from .numeric import table_values
+from .cache import cached_response, invalidate_market_data
+from .pagination import KeysetPagination
+from .quotes import refresh_latest_quotes
+from .renderers import MARKET_DATA_RENDERER_CLASSES, TableRenderer, table_response
+from .rollups import refresh_rollups
+from rest_framework.exceptions import ValidationError
+
+# الرمز الافتراضي للملفات التي لا تحتوي على عمود ticker
+DEFAULT_UPLOAD_TICKER = 'XRP/USDT'
+
+# الحقول التي يمكن طلبها عبر fields=
+SELECTABLE_FIELDS = [field.name for field in FinancialData._meta.concrete_fields] + ['percent_change_formatted']
+
+# interval=week|month: الشموع المجمّعة بدلاً من الصفوف اليومية
+ROLLUP_INTERVALS = {
+    'week': (WeeklyBar, WeeklyBarSerializer),
+    'month': (MonthlyBar, MonthlyBarSerializer),
+}
+
+
+def requested_fields(request):
+    """
+    قراءة معامل fields (مثل fields=date,ticker,close_price) والتحقق من أسماء الحقول
+    """
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in SELECTABLE_FIELDS]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return fields
+
+
+def table_columns(fields, default=None):
+    """
+    أعمدة values_list للصيغ المضغوطة (ticker و date موجودان دائماً لأنهما مفتاح الصف)
+    """
+    columns = [name for name in (fields or default or SELECTABLE_FIELDS) if name != 'percent_change_formatted']
+    for key in ('date', 'ticker'):
+        if key not in columns:
+            columns.insert(0, key)
+    return columns
+
+
+def project_fields(queryset, fields):
+    """
+    تحميل الأعمدة المطلوبة فقط من قاعدة البيانات (ticker و date مطلوبان دائماً للمؤشر)
+    """
+    if fields is None:
+        return queryset
+    columns = {'ticker', 'date'} | (set(fields) - {'percent_change_formatted'})
+    if 'percent_change_formatted' in fields:
+        columns.add('percent_change')
+    return queryset.only(*columns)
 
 
 class FinancialDataListView(APIView):
     permission_classes = [AllowAny]
+    renderer_classes = MARKET_DATA_RENDERER_CLASSES
        
     def get(self, request):
         ticker = request.query_params.get('ticker')
@@ -36,8 +95,18 @@ class FinancialDataListView(APIView):
         if end_date:
             queryset = queryset.filter(date__lte=end_date)
 
-        serializer = FinancialDataSerializer(queryset, many=True)
-        return Response(serializer.data)
+        fields = requested_fields(request)
+        paginator = KeysetPagination()
+        if isinstance(request.accepted_renderer, TableRenderer):
+            columns = table_columns(fields)
+            rows = table_values(queryset, columns, request.accepted_renderer.float_native)
+            page = paginator.paginate_queryset(rows, request)
+            return table_response(request.accepted_renderer, columns, page, paginator)
+
+        include = requested_includes(request)
+        page = paginator.paginate_queryset(project_fields(queryset, fields), request)
+        serializer = FinancialDataSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(attach_context(page, serializer.data, include))
 
 
 
@@ -181,10 +250,16 @@ class PromoteUserToAdminView(APIView):
 
 
 class FinancialMarketView(APIView):
+    renderer_classes = MARKET_DATA_RENDERER_CLASSES
+
     def get(self, request):
         """
         الحصول على بيانات السوق مع دعم الفلترة
         """
+        interval = request.query_params.get('interval')
+        if interval:
+            return self.get_rollups(request, interval)
+
         queryset = FinancialData.objects.all()
         
         # فلترة حسب رمز العملة
@@ -198,20 +273,68 @@ class FinancialMarketView(APIView):
         if start_date and end_date:
             queryset = queryset.filter(date__range=[start_date, end_date])
         
-        # تحويل queryset إلى بيانات JSON
-        serializer = FinancialDataSerializer(queryset, many=True)
-        
-        # إرجاع الاستجابة
-        if queryset.exists():
-            return Response(serializer.data)
+        # تحويل الصفحة الحالية فقط إلى بيانات JSON
+        fields = requested_fields(request)
+        # المؤشرات الاقتصادية والأخبار تُضاف فقط عند طلبها (include=macro,news)
+        include = requested_includes(request)
+        paginator = KeysetPagination()
+        table = isinstance(request.accepted_renderer, TableRenderer)
+        if table:
+            columns = table_columns(fields)
+            queryset = table_values(queryset, columns, request.accepted_renderer.float_native)
         else:
+            queryset = project_fields(queryset, fields)
+        page = paginator.paginate_queryset(queryset, request)
+
+        # إرجاع الاستجابة (الصفحة الأولى الفارغة تعني عدم وجود بيانات مطابقة)
+        if not page and not request.query_params.get(paginator.cursor_query_param):
             return Response({"message": "لا توجد بيانات مطابقة للمعايير المحددة."}, status=status.HTTP_404_NOT_FOUND)
+        if table:
+            return table_response(request.accepted_renderer, columns, page, paginator)
+        serializer = FinancialDataSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(attach_context(page, serializer.data, include))
 
+    def get_rollups(self, request, interval):
+        """
+        الشموع الأسبوعية أو الشهرية من جداول التجميع (لا تقرأ الصفوف اليومية)
+        """
+        if interval not in ROLLUP_INTERVALS:
+            raise ValidationError({'interval': f"Unknown interval. Use one of: {', '.join(ROLLUP_INTERVALS)}"})
+        model, serializer_class = ROLLUP_INTERVALS[interval]
+        queryset = model.objects.all()
+
+        ticker = request.query_params.get('ticker')
+        if ticker:
+            queryset = queryset.filter(ticker__iexact=ticker)
+
+        # الفترات التي تتقاطع مع المدى المطلوب
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        if start_date and end_date:
+            queryset = queryset.filter(date__lte=end_date, last_date__gte=start_date)
+
+        paginator = KeysetPagination()
+        table = isinstance(request.accepted_renderer, TableRenderer)
+        if table:
+            columns = serializer_class.Meta.fields
+            queryset = table_values(queryset, columns, request.accepted_renderer.float_native)
+        page = paginator.paginate_queryset(queryset, request)
+
+        if not page and not request.query_params.get(paginator.cursor_query_param):
+            return Response({"message": "لا توجد بيانات مطابقة للمعايير المحددة."}, status=status.HTTP_404_NOT_FOUND)
+        if table:
+            return table_response(request.accepted_renderer, columns, page, paginator)
+        return paginator.get_paginated_response(serializer_class(page, many=True).data)
 
     def post(self, request):
         serializer = FinancialDataSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # الكتابة وتحديث آخر الأسعار والشموع المجمّعة معاً أو لا شيء
+            with transaction.atomic():
+                instance = serializer.save()
+                refresh_latest_quotes([instance.ticker])
+                refresh_rollups([(instance.ticker, instance.date)])
+                invalidate_market_data()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         print(serializer.errors)  # طباعة الأخطاء للتحقق منها
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -229,11 +352,12 @@ class FinancialMarketDetailView(APIView):
         """
         الحصول على تفاصيل بيانات سوق محددة
         """
+        include = requested_includes(request)
         instance = self.get_object(pk)
         if not instance:
             return Response(status=status.HTTP_404_NOT_FOUND)
         serializer = FinancialDataSerializer(instance)
-        return Response(serializer.data)
+        return Response(attach_context([instance], [serializer.data], include)[0])
 
     def put(self, request, pk):
         """
@@ -242,9 +366,14 @@ class FinancialMarketDetailView(APIView):
         instance = self.get_object(pk)
         if not instance:
             return Response(status=status.HTTP_404_NOT_FOUND)
+        old_ticker, old_date = instance.ticker, instance.date
         serializer = FinancialDataSerializer(instance, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                refresh_latest_quotes({old_ticker, instance.ticker})
+                refresh_rollups([(old_ticker, old_date), (instance.ticker, instance.date)])
+                invalidate_market_data()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -255,31 +384,33 @@ class FinancialMarketDetailView(APIView):
         instance = self.get_object(pk)
         if not instance:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            refresh_latest_quotes([instance.ticker])
+            refresh_rollups([(instance.ticker, instance.date)])
+            invalidate_market_data()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
 class LatestMarketDataView(APIView):
+    @cached_response('latest')
     def get(self, request):
         """
         الحصول على أحدث بيانات السوق
         """
-        latest = FinancialData.objects.values('ticker').annotate(latest_date=Max('date')).order_by('ticker')
-        
-        # الآن نحتاج إلى الحصول على السجلات الكاملة بناءً على أحدث التواريخ
-        latest_data = []
-        for item in latest:
-            ticker = item['ticker']
-            date = item['latest_date']
-            latest_record = FinancialData.objects.get(ticker=ticker, date=date)
-            latest_data.append(latest_record)
+        include = requested_includes(request)
+        # استعلام واحد: جدول آخر الأسعار مع السجل الكامل لكل رمز
+        quotes = LatestQuote.objects.select_related('financial_data').order_by('ticker')
+        latest_data = [quote.financial_data for quote in quotes]
 
         serializer = FinancialDataSerializer(latest_data, many=True)
-        return Response(serializer.data)
+        # المؤشرات الاقتصادية والأخبار تُضاف فقط عند طلبها (include=macro,news)
+        return Response(attach_context(latest_data, serializer.data, include))
     
     
 
 class MarketSummaryView(APIView):
+    @cached_response('summary')
     def get(self, request):
         """
         الحصول على ملخص السوق
@@ -300,6 +431,7 @@ class MarketSummaryView(APIView):
         return Response(summary)
 
 class TechnicalAnalysisView(APIView):
+    @cached_response('technical-analysis')
     def get(self, request, pk):
         """
         الحصول على التحليل الفني لعملة محددة
@@ -388,38 +520,27 @@ class UploadFinancialData(APIView):
         if 'file' not in request.FILES:
             return JsonResponse({"error": "No file uploaded"}, status=400)
 
-        file = request.FILES['file']
-        decoded_file = file.read().decode('utf-8').splitlines()
-        reader = csv.DictReader(decoded_file)
-
-        for row in reader:
-            # تحويل التاريخ من MM/DD/YYYY إلى YYYY-MM-DD
-            date_obj = datetime.strptime(row['Date'], '%m/%d/%Y')
-            formatted_date = date_obj.strftime('%Y-%m-%d')
-
-            data = {
-                'date': formatted_date,
-                'ticker': 'XRP/USDT',
-                'open_price': row['Open'],
-                'high_price': row['High'],
-                'low_price': row['Low'],
-                'close_price': row['Price'],
-                'volume': row['Vol'],
-                'percent_change': row['Change %'].rstrip('%'),
-                'adj_close': row['Price'], 
-            }
-            serializer = FinancialDataSerializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-            else:
-                return JsonResponse(serializer.errors, status=400)
+        # الرمز يمكن أن يأتي من عمود في الملف أو كمعامل في الطلب
+        ticker = request.data.get('ticker') or request.query_params.get('ticker') or DEFAULT_UPLOAD_TICKER
+        date_format = (request.data.get('date_format') or request.query_params.get('date_format')
+                       or DEFAULT_DATE_FORMAT)
 
-        return JsonResponse({"message": "Data uploaded successfully"}, status=201)
+        try:
+            result = import_financial_csv(request.FILES['file'], ticker=ticker, date_format=date_format)
+        except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        summary = result.as_dict()
+        if result.imported == 0 and result.failed:
+            return JsonResponse({"error": "No valid rows found", **summary}, status=400)
+        return JsonResponse({"message": "Data uploaded successfully", **summary}, status=201)
     
 
 
 
 class FinancialDataModel(APIView):
+    renderer_classes = MARKET_DATA_RENDERER_CLASSES
+
     def get(self, request, *args, **kwargs):
 
         date_str = request.query_params.get('date', None)
@@ -437,6 +558,11 @@ class FinancialDataModel(APIView):
             date__range=[start_date, date]
         ).order_by('date')  # ترتيب البيانات حسب التاريخ
 
+        if isinstance(request.accepted_renderer, TableRenderer):
+            columns = table_columns(None, FinancialDataModelSerializer.Meta.fields) + ['percent_change']
+            rows = table_values(financial_data, columns, request.accepted_renderer.float_native)
+            return table_response(request.accepted_renderer, columns, list(rows))
+
         serializer = FinancialDataModelSerializer(financial_data, many=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -448,6 +574,7 @@ class FinancialDataModel(APIView):
 class CurrencyPriceAPIView(APIView):
    
     
+    @cached_response('currency-price')
     def get(self, request):
         ticker = request.GET.get('ticker')
         date = request.GET.get('date')
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_init
 from celery.schedules import crontab
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance_project.settings')
@@ -23,15 +24,12 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(['finance_data'])
 
 app.conf.beat_schedule = {
+    # update_predictions و reconcile_predictions تُطلقان من نهاية هذه المهمة بعد نجاحها
     'update_currency_data_every_midnight': {
         'task': 'finance_data.tasks.update_currency_data',
         'schedule': crontab(hour=0, minute=0),  # كل منتصف ليل
         #'schedule': timedelta(minutes=5),
     },
-    'update_predictions_every_midnight': {
-        'task': 'finance_data.tasks.update_predictions',
-        'schedule': crontab(hour=0, minute=0),
-    },
     'update_trading_analytics_every_midnight': {
         'task': 'finance_data.tasks.update_trading_analytics',
         'schedule': crontab(hour=0, minute=0),
@@ -48,4 +46,29 @@ app.conf.beat_schedule = {
         'task': 'finance_data.tasks.update_user_statistics',
         'schedule': crontab(hour=0, minute=0),
     },
-}
\ No newline at end of file
+    'rebuild_risk_counters_every_midnight': {
+        'task': 'finance_data.tasks.rebuild_risk_counters',
+        # بعد فحص الصفقات حتى تشمل الإغلاقات الليلية
+        'schedule': crontab(hour=0, minute=15),
+    },
+    'apply_retention_every_night': {
+        'task': 'finance_data.tasks.apply_retention',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'partition_financial_data_every_month': {
+        'task': 'finance_data.tasks.maintain_partitions',
+        'schedule': crontab(hour=1, minute=30, day_of_month=1),
+    },
+    'update_changed_balances_every_15_minutes': {
+        'task': 'finance_data.tasks.update_user_statistics',
+        'schedule': crontab(minute='*/15'),
+        'kwargs': {'incremental': True},
+    },
+}
+
+
+@worker_init.connect
+def warm_up_predictor(**kwargs):
+    # يعمل في العملية الرئيسية قبل إنشاء عمليات prefork فتتشارك الأوزان
+    from financial_prediction.registry import warm_up
+    warm_up()
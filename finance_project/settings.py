@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -156,6 +157,21 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 
+# تحميل نموذج التنبؤ عند بدء التشغيل بدلاً من أول طلب (PREDICTOR_WARMUP=1)
+PREDICTOR_WARMUP = os.environ.get('PREDICTOR_WARMUP') == '1'
+
+# عدد أيام الصفوف اليومية المحفوظة في FinancialData (0 = بدون حذف)؛ الأقدم تبقى فقط في
+# الشموع الأسبوعية والشهرية. الحد الأدنى الفعلي 400 يوم (finance_data.rollups)
+FINANCIAL_DATA_RETENTION_DAYS = int(os.environ.get('FINANCIAL_DATA_RETENTION_DAYS', '0'))
+
+# كاش الاستجابات على نفس خادم Redis (قاعدة بيانات منفصلة عن Celery)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }
+}
+
 
 
 # إعدادات التسجيل
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FinancialPredictionConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "financial_prediction"
+
+    def ready(self):
+        # تحميل النموذج مسبقاً في العملية الأم قبل التفرع (gunicorn --preload)
+        from .registry import warm_up
+        warm_up()
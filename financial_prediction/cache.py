@@ -0,0 +1,80 @@
+"""
+Memoization of model predictions.
+
+Entries are keyed by ``(model version, ticker, as-of date)`` where the model version is
+a hash of the weights and scaler files, so replacing either file makes every older entry
+unreachable.  Each entry also records a digest of the input price window and the
+FinancialData ingestion generation it was validated against:
+
+* same generation - no FinancialData write since, the entry is served without any query
+* new generation - the window is re-read and the entry is reused only if its digest is
+  unchanged, so edits inside the input window always trigger a recomputation
+
+Storage is an in-process LRU in front of the Django cache (Redis); when the cache is
+unavailable predictions are simply computed.
+"""
+import hashlib
+import logging
+
+from django.core.cache import cache
+
+from finance_data.cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'prediction'
+LOCAL_CACHE_SIZE = 4096
+PREDICTION_TIMEOUT = 60 * 60 * 24 * 30
+
+local_predictions = LocalLRUCache(LOCAL_CACHE_SIZE)
+
+
+def file_digest(*paths):
+    """Hash of the contents of the model files"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def window_digest(window):
+    rows = [tuple(str(value) for value in row) for row in window]
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+
+def prediction_key(model_version, ticker, date_obj):
+    return f'{KEY_PREFIX}:{model_version}:{ticker}:{date_obj.isoformat()}'
+
+
+def get_cached(keys):
+    """Return {key: entry} for the keys found in the local or shared tier"""
+    found = {}
+    missing = []
+    for key in keys:
+        entry = local_predictions.get(key)
+        if entry is None:
+            missing.append(key)
+        else:
+            found[key] = entry
+    if missing:
+        try:
+            shared = cache.get_many(missing)
+        except Exception as e:
+            logger.warning(f"Prediction cache read failed: {str(e)}")
+            shared = {}
+        for key, entry in shared.items():
+            local_predictions.set(key, entry)
+        found.update(shared)
+    return found
+
+
+def store(entries):
+    """Save {key: entry} in both tiers"""
+    for key, entry in entries.items():
+        local_predictions.set(key, entry)
+    try:
+        cache.set_many(entries, PREDICTION_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Prediction cache write failed: {str(e)}")
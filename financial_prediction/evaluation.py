@@ -0,0 +1,77 @@
+"""
+Set-based scoring of stored predictions against realised closes.
+
+``reconcile_predictions`` fills ``actual_price`` and ``accuracy`` for every pending
+prediction with two UPDATE statements (correlated subquery on the ``(date, ticker)``
+unique index) instead of loading and saving rows one by one.  Only predictions whose
+target date falls inside ``RECONCILE_LOOKBACK_DAYS`` are considered, so the statement
+touches a bounded slice of ``prediction_date`` no matter how large the table grows.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (Avg, Case, Count, DecimalField, Exists, ExpressionWrapper, F, FloatField, OuterRef,
+                              Q, Subquery, Value, When)
+from django.db.models.functions import Abs, Cast, Greatest
+from django.utils import timezone
+
+from finance_data.models import FinancialData, PredictionModel
+
+RECONCILE_LOOKBACK_DAYS = 60
+DEFAULT_STATS_DAYS = 30
+# أقل قيمة يقبلها حقل accuracy (max_digits=5, decimal_places=2)
+MIN_ACCURACY = Decimal('-999.99')
+
+
+def reconcile_predictions(today=None, lookback_days=RECONCILE_LOOKBACK_DAYS):
+    """Fill actual_price/accuracy of pending predictions; returns the number of rows scored"""
+    today = today or timezone.now().date()
+    pending = PredictionModel.objects.filter(
+        actual_price__isnull=True,
+        prediction_date__gt=today - timedelta(days=lookback_days),
+        prediction_date__lte=today,
+    )
+    close = FinancialData.objects.filter(ticker=OuterRef('ticker'), date=OuterRef('prediction_date'))
+
+    with transaction.atomic():
+        scored = pending.filter(Exists(close)).update(actual_price=Subquery(close.values('close_price')[:1]))
+        # نفس معادلة PredictionModel.calculate_accuracy
+        accuracy = (1 - Abs(F('actual_price') - F('predicted_price')) / F('actual_price')) * 100
+        PredictionModel.objects.filter(
+            accuracy__isnull=True, actual_price__gt=0,
+            prediction_date__gt=today - timedelta(days=lookback_days),
+        ).update(accuracy=Greatest(
+            ExpressionWrapper(accuracy, output_field=DecimalField(max_digits=5, decimal_places=2)),
+            Value(MIN_ACCURACY),
+        ))
+    return scored
+
+
+def prediction_error_stats(days=DEFAULT_STATS_DAYS, today=None):
+    """
+    Rolling error statistics per (model_version, prediction_period) over the scored
+    predictions of the last ``days`` days: count, MAE, MAPE (%) and directional hit rate
+    (%) relative to ``reference_price``.
+    """
+    today = today or timezone.now().date()
+    error = Abs(Cast(F('actual_price'), FloatField()) - Cast(F('predicted_price'), FloatField()))
+    reference = F('reference_price')
+    hit = Case(
+        When(Q(predicted_price__gt=reference, actual_price__gt=reference)
+             | Q(predicted_price__lt=reference, actual_price__lt=reference)
+             | Q(predicted_price=reference, actual_price=reference), then=Value(100.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    rows = PredictionModel.objects.filter(
+        actual_price__isnull=False,
+        prediction_date__gt=today - timedelta(days=days),
+        prediction_date__lte=today,
+    ).values('model_version', 'prediction_period').annotate(
+        count=Count('id'),
+        mae=Avg(error),
+        mape=Avg(error / Cast(F('actual_price'), FloatField()) * 100, filter=Q(actual_price__gt=0)),
+        hit_rate=Avg(hit, filter=Q(reference_price__isnull=False)),
+    ).order_by('model_version', 'prediction_period')
+    return list(rows)
@@ -0,0 +1,69 @@
+"""
+Nightly multi-horizon forecasts for every ticker.
+
+All tickers are scored together: one query loads every price window, each rollout step
+is a single batched forward pass over the whole universe, and the results are written
+with one ``bulk_create``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from finance_data.models import LatestQuote, PredictionModel
+from financial_prediction.predictor import FEATURE_COLUMNS, WINDOW_SIZE
+from financial_prediction.registry import get_predictor
+
+# عدد أيام التداول لكل أفق توقع
+HORIZON_STEPS = {'1D': 1, '1W': 5, '1M': 21}
+DEFAULT_CONFIDENCE = Decimal('0.75')
+
+
+def run_daily_forecast(tickers=None, horizons=HORIZON_STEPS):
+    """Forecast ``horizons`` for ``tickers`` (default: every ticker with a latest quote)"""
+    predictor = get_predictor()
+    quotes = LatestQuote.objects.order_by('ticker')
+    if tickers is not None:
+        quotes = quotes.filter(ticker__in=tickers)
+    # آخر يوم لكل رمز؛ النافذة تنتهي به (التاريخ المطلوب هو اليوم التالي)
+    latest = list(quotes.values_list('ticker', 'date', 'close_price'))
+    windows = predictor.fetch_windows([(day + timedelta(days=1), ticker) for ticker, day, _ in latest])
+
+    ready = [(quote, window) for quote, window in zip(latest, windows) if len(window) >= WINDOW_SIZE]
+    if not ready:
+        return []
+    steps = max(horizons.values())
+    closes = predictor.rollout([window for _, window in ready], steps)
+
+    predictions = []
+    for ((ticker, day, close_price), _), path in zip(ready, closes):
+        for period, horizon in horizons.items():
+            # أيام التداول من الاثنين إلى الجمعة
+            target = np.busday_offset(day, horizon, roll='forward').astype(object)
+            predictions.append(PredictionModel(
+                ticker=ticker,
+                prediction_date=target,
+                predicted_price=Decimal(str(round(float(path[horizon - 1]), 6))),
+                reference_price=close_price,
+                prediction_period=period,
+                prediction_type='PRICE',
+                confidence_score=DEFAULT_CONFIDENCE,
+                model_version=predictor.model_version,
+                features_used={'features': FEATURE_COLUMNS, 'window': WINDOW_SIZE, 'steps': horizon,
+                               'as_of': day.isoformat()},
+            ))
+
+    with transaction.atomic():
+        # إعادة التشغيل في نفس اليوم تستبدل التوقعات التي لم تُقيَّم بعد
+        PredictionModel.objects.filter(
+            reduce(or_, (Q(ticker=prediction.ticker, prediction_period=prediction.prediction_period,
+                           prediction_date=prediction.prediction_date) for prediction in predictions)),
+            model_version=predictor.model_version,
+            actual_price__isnull=True,
+        ).delete()
+        PredictionModel.objects.bulk_create(predictions)
+    return predictions
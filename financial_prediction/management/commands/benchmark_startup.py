@@ -0,0 +1,54 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# وحدات ثقيلة يجب ألا تُستورد عند تشغيل أوامر manage.py العادية
+HEAVY_MODULES = ('torch', 'sklearn', 'joblib', 'yfinance')
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start time of a manage.py command (default: check) in fresh processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--target', default='check', help='manage.py command to time')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        command = [sys.executable, manage_py, *options['target'].split()]
+
+        timings = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            result = subprocess.run(command, capture_output=True, text=True)
+            timings.append(time.perf_counter() - started)
+            if result.returncode != 0:
+                raise CommandError(f"'{options['target']}' failed:\n{result.stderr}")
+
+        self.stdout.write(
+            f"manage.py {options['target']}: median {statistics.median(timings):.2f}s, "
+            f"min {min(timings):.2f}s, max {max(timings):.2f}s over {len(timings)} runs"
+        )
+
+        # تحديد الوحدات الثقيلة التي استُوردت وكلفتها التراكمية
+        result = subprocess.run([sys.executable, '-X', 'importtime', *command[1:]], capture_output=True, text=True)
+        imported = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            name = name.strip()
+            if name in HEAVY_MODULES:
+                imported[name] = int(cumulative) / 1e6
+        if imported:
+            for name, seconds in imported.items():
+                self.stdout.write(self.style.WARNING(f'  imports {name} ({seconds:.2f}s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"  none of {', '.join(HEAVY_MODULES)} imported"))
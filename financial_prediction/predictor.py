@@ -1,13 +1,61 @@
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
 import torch
 import torch.nn as nn
 import numpy as np
 import joblib
 from datetime import datetime, timedelta
-import os
 from finance_data.models import FinancialData  # استيراد النموذج الخاص بك
-import pandas as pd
+from finance_data.cache import current_generation
+from finance_data.numeric import float_values
+from financial_prediction.cache import file_digest, get_cached, prediction_key, store, window_digest
+from financial_prediction.registry import SCALER_PATH, WEIGHTS_PATH
+from bisect import bisect_left
+from functools import reduce
+from operator import or_
+from django.db.models import Q
+
+FEATURE_COLUMNS = ["Open", "High", "Low", "5d_sma", "9d_sma", "17d_sma", "Close"]
+# أعمدة Open, High, Low, Close من خرج النموذج لبناء صف اليوم التالي
+NEXT_ROW_COLUMNS = [0, 1, 2, 6]
+WINDOW_SIZE = 11  # عدد الأيام التي يأخذها النموذج
+HISTORY_ROWS = 12  # صف إضافي لحساب المتوسطات المتحركة
+# أيام تقويمية تكفي عادةً لـ 12 يوم تداول (عطل نهاية الأسبوع والأعياد)
+LOOKBACK_DAYS = 45
+PRICE_FIELDS = ['ticker', 'date', 'open_price', 'high_price', 'low_price', 'close_price']
+
+SMA_WINDOWS = (5, 9, 17)
+
+
+def moving_average(values, window):
+    """
+    متوسط متحرك بمجموع تراكمي؛ الصفوف التي لا تكفي للنافذة تأخذ القيمة نفسها
+    (مثل rolling(window).mean().fillna(values) في pandas)
+    """
+    result = values.copy()
+    if len(values) >= window:
+        cumsum = np.cumsum(np.concatenate(([0.0], values)))
+        result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+def scaler_affine(scaler, num_features):
+    """
+    معاملات التحجيم x * scale + offset لكل خاصية من MinMaxScaler أو StandardScaler.
+    تعيد (None, None) لأي مقياس آخر فيُستخدم transform مباشرة.
+    """
+    if hasattr(scaler, 'min_') and hasattr(scaler, 'scale_'):
+        scale, offset = scaler.scale_, scaler.min_
+    elif hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+        std = getattr(scaler, 'scale_', None)
+        mean = getattr(scaler, 'mean_', None)
+        scale = 1 / std if std is not None else np.ones(1)
+        offset = -mean * scale if mean is not None else np.zeros(1)
+    else:
+        return None, None
+    # مقياس بخاصية واحدة يُطبق على كل الأعمدة كما في التدريب
+    shape = (num_features,)
+    return (np.broadcast_to(np.asarray(scale, dtype=np.float64), shape).copy(),
+            np.broadcast_to(np.asarray(offset, dtype=np.float64), shape).copy())
+
 
 class NeuralNetwork(nn.Module):
     def __init__(self, num_feature):
@@ -21,94 +69,177 @@ class NeuralNetwork(nn.Module):
         return x
 
 class FinancialPredictor:
-    def __init__(self):
+    def __init__(self, weights_path=WEIGHTS_PATH, scaler_path=SCALER_PATH):
         self.num_features = 7  # عدد الخصائص المستخدمة
         self.model = NeuralNetwork(self.num_features)
 
-        # تحميل الأوزان
-        weights_path = os.path.join(os.path.dirname(__file__), "models", "saved_weights_all (1).pt")
-        self.model.load_state_dict(torch.load(weights_path, map_location=torch.device('cpu')))
+        # تحميل الأوزان عبر mmap حتى تتشارك العمليات المتفرعة نفس صفحات الذاكرة
+        state_dict = torch.load(weights_path, map_location=torch.device('cpu'), mmap=True, weights_only=True)
+        self.model.load_state_dict(state_dict, assign=True)
         self.model.eval()
 
         # تحميل المقياس
-        scaler_path = os.path.join(os.path.dirname(__file__), "models", "scaler_all.pkl")
         self.scaler = joblib.load(scaler_path)
-
-    def calculate_moving_averages(self, df):
-        """حساب المتوسطات المتحركة"""
-        df["5d_sma"] = df["Close"].astype(float).rolling(5).mean().fillna(df["Close"])
-        df["9d_sma"] = df["Close"].astype(float).rolling(9).mean().fillna(df["Close"])
-        df["17d_sma"] = df["Close"].astype(float).rolling(17).mean().fillna(df["Close"])
-        return df
-
-    def preprocess_data(self, queryset):
-        """معالجة البيانات وإعدادها للتنبؤ"""
-        # تحويل QuerySet إلى DataFrame
-        df = pd.DataFrame.from_records(queryset.values())
-        
-        # تحويل الأعمدة إلى الأنواع الصحيحة
-        columns_to_convert = ['open_price', 'high_price', 'low_price', 'close_price']
-        for col in columns_to_convert:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # إعادة تسمية الأعمدة
-        df = df.rename(columns={
-            'open_price': 'Open', 
-            'high_price': 'High', 
-            'low_price': 'Low', 
-            'close_price': 'Close'
-        })
-        
-        # التأكد من ترتيب البيانات تصاعدياً حسب التاريخ
-        df = df.sort_values('date')
-        
-        # حساب المتوسطات المتحركة
-        df = self.calculate_moving_averages(df)
-        
-        return df
+        self.scale, self.offset = scaler_affine(self.scaler, self.num_features)
+        # إصدار النموذج يدخل في مفاتيح الكاش، فتغيير أي من الملفين يبطل النتائج القديمة
+        self.model_version = file_digest(weights_path, scaler_path)
+
+    def calculate_moving_averages(self, close):
+        """حساب المتوسطات المتحركة (5, 9, 17) لمصفوفة أسعار الإغلاق"""
+        return [moving_average(close, window) for window in SMA_WINDOWS]
+
+    def window_features(self, rows):
+        """تحويل آخر 12 صفاً (Open, High, Low, Close) إلى مصفوفة الخصائص (11, 7)"""
+        prices = np.asarray(rows, dtype=np.float64)
+        close = prices[:, 3]
+        features = np.column_stack([prices[:, :3], *self.calculate_moving_averages(close), close])
+        return features[-WINDOW_SIZE:]
+
+    def scale_features(self, data):
+        """تحجيم كل الخصائص بعملية واحدة على المصفوفة"""
+        if self.scale is None:
+            flat = data.reshape(-1, data.shape[-1])
+            data_scaled = np.zeros_like(flat, dtype=np.float64)
+            for i in range(flat.shape[1]):
+                data_scaled[:, i] = self.scaler.transform(flat[:, i].reshape(-1, 1)).flatten()
+            return data_scaled.reshape(data.shape)
+        return data * self.scale + self.offset
+
+    def predict_prices(self, batch):
+        """التنبؤ لدفعة كاملة (N, 11, 7) في تمرير أمامي واحد"""
+        data_tensor = torch.tensor(batch, dtype=torch.float32)
+        with torch.no_grad():
+            prediction = self.model(data_tensor)
+        # الخرج (1, N, 7) والعمود الأخير هو سعر الإغلاق
+        predicted_scaled = prediction.numpy()[0][:, -1].astype(np.float64)
+        if self.scale is None:
+            return self.scaler.inverse_transform(predicted_scaled.reshape(-1, 1)).flatten()
+        return (predicted_scaled - self.offset[-1]) / self.scale[-1]
 
     def predict_price(self, data):
         """التنبؤ بالسعر"""
-        data_tensor = torch.tensor(data, dtype=torch.float32).unsqueeze(0)
+        return self.predict_prices(np.asarray(data)[np.newaxis])[0]
+
+    def predict_outputs(self, batch):
+        """كل خصائص اليوم التالي (N, 7) بعد إلغاء التحجيم"""
+        data_tensor = torch.tensor(batch, dtype=torch.float32)
         with torch.no_grad():
             prediction = self.model(data_tensor)
-        predicted_scaled = prediction.numpy().flatten()
-        predicted_original = self.scaler.inverse_transform(predicted_scaled.reshape(-1, 1)).flatten()
-        return predicted_original[-1]
+        predicted_scaled = prediction.numpy()[0].astype(np.float64)
+        if self.scale is None:
+            return np.column_stack([
+                self.scaler.inverse_transform(predicted_scaled[:, [i]]).ravel()
+                for i in range(predicted_scaled.shape[1])
+            ])
+        return (predicted_scaled - self.offset) / self.scale
+
+    def rollout(self, windows, steps):
+        """
+        توقع متكرر لعدة أيام: يُضاف اليوم المتوقع (Open, High, Low, Close) إلى النافذة
+        ويُعاد حساب المتوسطات، مع تمرير أمامي واحد لكل الرموز في كل خطوة.
+        تعيد مصفوفة أسعار الإغلاق (N, steps).
+        """
+        histories = [np.asarray(window, dtype=np.float64)[-HISTORY_ROWS:] for window in windows]
+        closes = np.empty((len(histories), steps))
+        for step in range(steps):
+            batch = np.stack([self.window_features(history) for history in histories])
+            outputs = self.predict_outputs(self.scale_features(batch))
+            closes[:, step] = outputs[:, -1]
+            next_rows = outputs[:, NEXT_ROW_COLUMNS]
+            histories = [np.vstack([history[-(HISTORY_ROWS - 1):], row]) for history, row in zip(histories, next_rows)]
+        return closes
+
+    def fetch_windows(self, requests):
+        """
+        جلب نوافذ الأسعار لكل الطلبات (date, ticker) في استعلام واحد.
+        تُعاد قائمة بآخر 12 صفاً قبل التاريخ لكل طلب.
+        """
+        ranges = {}
+        for date_obj, ticker in requests:
+            start, end = ranges.get(ticker, (date_obj, date_obj))
+            ranges[ticker] = (min(start, date_obj), max(end, date_obj))
+
+        history = {ticker: [] for ticker in ranges}
+        if ranges:
+            condition = reduce(or_, (
+                Q(ticker=ticker, date__gte=start - timedelta(days=LOOKBACK_DAYS), date__lt=end)
+                for ticker, (start, end) in ranges.items()
+            ))
+            # الأسعار تُقرأ كـ float من قاعدة البيانات بدون المرور بـ Decimal
+            rows = float_values(FinancialData.objects.filter(condition).order_by('ticker', 'date'), PRICE_FIELDS)
+            for ticker, date_obj, *prices in rows:
+                history[ticker].append((date_obj, prices))
+
+        windows = []
+        for date_obj, ticker in requests:
+            rows = history[ticker]
+            end = bisect_left(rows, date_obj, key=lambda row: row[0])
+            window = [prices for _, prices in rows[max(0, end - HISTORY_ROWS):end]]
+            if len(window) < WINDOW_SIZE:
+                # فجوة في البيانات أطول من نافذة البحث: استعلام منفصل لهذا الطلب فقط
+                window = list(float_values(FinancialData.objects.filter(ticker=ticker, date__lt=date_obj)
+                                           .order_by('-date'), PRICE_FIELDS[2:])[:HISTORY_ROWS])
+                window.reverse()
+            windows.append(window)
+        return windows
+
+    def predict_many(self, requests, use_cache=True):
+        """
+        التنبؤ لعدة أزواج (date_str, ticker) باستعلام واحد وتمرير أمامي واحد للنموذج.
+        تُعاد النتائج بنفس ترتيب الطلبات: {'date', 'ticker', 'prediction', 'error'}.
+        """
+        results = [{'date': date_str, 'ticker': ticker, 'prediction': None, 'error': None}
+                   for date_str, ticker in requests]
+        valid = []
+        for index, (date_str, ticker) in enumerate(requests):
+            try:
+                valid.append((index, datetime.strptime(date_str, "%Y-%m-%d").date(), ticker))
+            except (TypeError, ValueError):
+                results[index]['error'] = "صيغة التاريخ غير صحيحة، استخدم YYYY-MM-DD."
+
+        # النتائج المخزنة التي لم تتغير البيانات منذ حسابها لا تحتاج أي استعلام
+        generation = current_generation() if use_cache else None
+        keys = {index: prediction_key(self.model_version, ticker, date_obj) for index, date_obj, ticker in valid}
+        cached = get_cached(keys.values()) if generation is not None else {}
+        pending = []
+        for item in valid:
+            entry = cached.get(keys[item[0]])
+            if entry is not None and entry['generation'] == generation:
+                results[item[0]]['prediction'] = entry['prediction']
+            else:
+                pending.append(item)
+
+        windows = self.fetch_windows([(date_obj, ticker) for _, date_obj, ticker in pending])
+        ready = []
+        features = []
+        fresh = {}
+        for (index, _, _), window in zip(pending, windows):
+            if len(window) < WINDOW_SIZE:
+                results[index]['error'] = "لا توجد بيانات كافية قبل هذا التاريخ للتنبؤ."
+                continue
+            digest = window_digest(window)
+            entry = cached.get(keys[index])
+            if entry is not None and entry['digest'] == digest:
+                # بيانات النافذة نفسها لم تتغير
+                results[index]['prediction'] = entry['prediction']
+                fresh[keys[index]] = dict(entry, generation=generation)
+                continue
+            ready.append((index, digest))
+            features.append(self.window_features(window))
+
+        if ready:
+            predictions = self.predict_prices(self.scale_features(np.stack(features)))
+            for (index, digest), prediction in zip(ready, predictions):
+                results[index]['prediction'] = round(float(prediction), 4)
+                fresh[keys[index]] = {'prediction': results[index]['prediction'], 'digest': digest,
+                                      'generation': generation}
+        if generation is not None and fresh:
+            store(fresh)
+        return results
 
     def predict(self, date_str, ticker):
         try:
-            # تحويل التاريخ
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-
-            # جلب البيانات من قاعدة البيانات
-            queryset = FinancialData.objects.filter(
-                ticker=ticker,
-                date__lt=date_obj
-            ).order_by('-date')[:12]  # زيادة العدد إلى 12 للسماح بحساب المتوسطات المتحركة
-
-            if queryset.count() < 11:
-                return None, "لا توجد بيانات كافية قبل هذا التاريخ للتنبؤ."
-
-            # معالجة البيانات
-            data_df = self.preprocess_data(queryset)
-
-            # تجهيز البيانات للتنبؤ
-            data_input = data_df.iloc[-11:][
-                ["Open", "High", "Low", "5d_sma", "9d_sma", "17d_sma", "Close"]
-            ].values.astype(np.float64)
-
-            # تحجيم البيانات
-            data_scaled = np.zeros_like(data_input, dtype=np.float64)
-            for i in range(data_input.shape[1]):
-                data_scaled[:, i] = self.scaler.transform(data_input[:, i].reshape(-1, 1)).flatten()
-
-            # التنبؤ
-            prediction = self.predict_price(data_scaled)
-
-            return round(float(prediction), 4), None
-
-        except FinancialData.DoesNotExist:
-            return None, "ملف البيانات الخاص بهذه الشركة غير موجود."
+            result = self.predict_many([(date_str, ticker)])[0]
+            return result['prediction'], result['error']
         except Exception as e:
-            return None, str(e)
\ No newline at end of file
+            return None, str(e)
@@ -0,0 +1,72 @@
+"""
+Process-wide registry for the prediction model.
+
+Importing this module is cheap: torch, scikit-learn and the model files are only
+loaded on the first ``get_predictor()`` call, so ``manage.py`` commands, migrations and
+Celery workers that never predict do not pay for them.
+
+For prefork servers (gunicorn ``--preload``, Celery prefork pool) set
+``PREDICTOR_WARMUP`` so the model is loaded once in the parent process; the weights are
+memory-mapped and the children share those pages copy-on-write instead of each loading
+its own copy.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+WEIGHTS_PATH = os.path.join(MODELS_DIR, "saved_weights_all (1).pt")
+SCALER_PATH = os.path.join(MODELS_DIR, "scaler_all.pkl")
+
+_predictor = None
+_signature = None
+_lock = threading.Lock()
+
+
+def model_files_signature():
+    """(mtime, size) of the model files, used to notice when they are replaced"""
+    signature = []
+    for path in (WEIGHTS_PATH, SCALER_PATH):
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def get_predictor():
+    """Return the shared FinancialPredictor, loading it on first use or after the files change"""
+    global _predictor, _signature
+    signature = model_files_signature()
+    if _predictor is None or signature != _signature:
+        with _lock:
+            if _predictor is None or signature != _signature:
+                # الاستيراد هنا حتى لا يُحمَّل torch عند تشغيل Django
+                from .predictor import FinancialPredictor
+                started = time.monotonic()
+                _predictor = FinancialPredictor()
+                _signature = signature
+                logger.info(f"Prediction model {_predictor.model_version} loaded in "
+                            f"{time.monotonic() - started:.2f}s")
+    return _predictor
+
+
+def is_loaded():
+    return _predictor is not None
+
+
+def reset():
+    """Drop the loaded model so the next call reloads it (model files replaced, tests)"""
+    global _predictor
+    with _lock:
+        _predictor = None
+
+
+def warm_up(force=False):
+    """Load the model now when ``PREDICTOR_WARMUP`` is enabled (or ``force`` is set)"""
+    if force or getattr(settings, 'PREDICTOR_WARMUP', False):
+        return get_predictor()
+    return None
@@ -1,3 +1,282 @@
-from django.test import TestCase
+import json
+import subprocess
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import torch
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from django.core.cache import cache
+
+from finance_data.cache import bump_generation
+from finance_data.models import FinancialData, PredictionModel
+from finance_data.quotes import refresh_latest_quotes
+from financial_prediction import registry
+from financial_prediction.cache import local_predictions
+from financial_prediction.evaluation import prediction_error_stats, reconcile_predictions
+from financial_prediction.forecasting import run_daily_forecast
+from financial_prediction.predictor import FinancialPredictor
+
+TICKERS = ['EUR=X', 'JPY=X', 'GBP=X']
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_history(days=40, start=date(2024, 1, 1)):
+    rows = []
+    for offset, ticker in enumerate(TICKERS):
+        rng = np.random.default_rng(offset)
+        close = 1 + offset * 0.3 + np.cumsum(rng.normal(0, 0.01, days))
+        for day in range(days):
+            # بدون عطل نهاية الأسبوع
+            if (start + timedelta(days=day)).weekday() >= 5:
+                continue
+            price = Decimal(str(round(close[day], 6)))
+            rows.append(FinancialData(date=start + timedelta(days=day), ticker=ticker, open_price=price,
+                                      high_price=price + Decimal('0.01'), low_price=price - Decimal('0.01'),
+                                      close_price=price, adj_close=price, volume=0))
+    FinancialData.objects.bulk_create(rows)
+
+
+def reference_prediction(predictor, date_obj, ticker):
+    """The original single-pair algorithm: pandas preprocessing and a batch-of-1 forward pass"""
+    queryset = FinancialData.objects.filter(ticker=ticker, date__lt=date_obj).order_by('-date')[:12]
+    df = pd.DataFrame.from_records(queryset.values())
+    for column in ['open_price', 'high_price', 'low_price', 'close_price']:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df = df.rename(columns={'open_price': 'Open', 'high_price': 'High', 'low_price': 'Low', 'close_price': 'Close'})
+    df = df.sort_values('date')
+    for window in (5, 9, 17):
+        df[f'{window}d_sma'] = df['Close'].astype(float).rolling(window).mean().fillna(df['Close'])
+    data = df.iloc[-11:][["Open", "High", "Low", "5d_sma", "9d_sma", "17d_sma", "Close"]].values.astype(np.float64)
+    scaled = np.zeros_like(data)
+    for i in range(data.shape[1]):
+        scaled[:, i] = predictor.scaler.transform(data[:, i].reshape(-1, 1)).flatten()
+    with torch.no_grad():
+        output = predictor.model(torch.tensor(scaled, dtype=torch.float32).unsqueeze(0))
+    return predictor.scaler.inverse_transform(output.numpy().flatten().reshape(-1, 1)).flatten()[-1]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BatchPredictionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_history()
+
+    def setUp(self):
+        cache.clear()
+        local_predictions.clear()
+        self.predictor = FinancialPredictor()
+
+    def test_predict_many_matches_single_pair_algorithm(self):
+        # 2024-01-16 has exactly 11 rows of history, the others 12
+        requests = [('2024-02-05', ticker) for ticker in TICKERS] + [('2024-01-25', 'EUR=X'), ('2024-01-16', 'JPY=X')]
+        with mock.patch.object(self.predictor.model, 'forward', wraps=self.predictor.model.forward) as forward:
+            results = self.predictor.predict_many(requests, use_cache=False)
+
+        self.assertEqual(forward.call_count, 1)
+        self.assertEqual(forward.call_args[0][0].shape, (5, 11, 7))
+        for (date_str, ticker), result in zip(requests, results):
+            self.assertIsNone(result['error'])
+            expected = reference_prediction(self.predictor, date.fromisoformat(date_str), ticker)
+            self.assertAlmostEqual(result['prediction'], float(expected), places=3)
+
+    def test_single_query_for_all_pairs(self):
+        with self.assertNumQueries(1):
+            self.predictor.predict_many([('2024-02-05', ticker) for ticker in TICKERS], use_cache=False)
+
+    def test_per_pair_errors(self):
+        results = self.predictor.predict_many([('2024-01-05', 'EUR=X'), ('bad', 'EUR=X'), ('2024-02-05', 'EUR=X')])
+
+        self.assertIsNone(results[0]['prediction'])
+        self.assertIsNotNone(results[0]['error'])
+        self.assertIsNotNone(results[1]['error'])
+        self.assertIsNotNone(results[2]['prediction'])
+
+    def test_gap_longer_than_lookback_falls_back_to_per_pair_query(self):
+        prediction, error = self.predictor.predict('2024-06-01', 'EUR=X')
+
+        self.assertIsNone(error)
+        self.assertAlmostEqual(prediction, float(reference_prediction(self.predictor, date(2024, 6, 1), 'EUR=X')),
+                               places=3)
+
+    def test_batch_endpoint(self):
+        response = self.client.post('/financial/api/predict/batch/', json.dumps({'date': '2024-02-05', 'tickers': TICKERS}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        predictions = response.json()['predictions']
+        self.assertEqual([item['ticker'] for item in predictions], TICKERS)
+        self.assertEqual(predictions[0]['prediction'], registry.get_predictor().predict('2024-02-05', 'EUR=X')[0])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PredictionCacheTests(TestCase):
+    requests = [('2024-02-05', ticker) for ticker in TICKERS]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_history()
+
+    def setUp(self):
+        cache.clear()
+        local_predictions.clear()
+        self.predictor = FinancialPredictor()
+
+    def forward_calls(self, requests):
+        with mock.patch.object(self.predictor.model, 'forward', wraps=self.predictor.model.forward) as forward:
+            results = self.predictor.predict_many(requests)
+        return results, forward.call_args[0][0].shape[0] if forward.called else 0
+
+    def test_repeated_requests_are_served_from_cache(self):
+        first, computed = self.forward_calls(self.requests)
+        self.assertEqual(computed, 3)
+        with self.assertNumQueries(0):
+            second, computed = self.forward_calls(self.requests)
+        self.assertEqual(computed, 0)
+        self.assertEqual(first, second)
+
+        # الطبقة المشتركة تكفي بعد إعادة تشغيل العملية
+        local_predictions.clear()
+        self.assertEqual(self.forward_calls(self.requests)[1], 0)
+
+    def test_change_inside_window_recomputes_only_that_pair(self):
+        self.forward_calls(self.requests)
+        FinancialData.objects.filter(ticker='JPY=X', date='2024-02-02').update(close_price=Decimal('9.9'))
+        # كتابة خارج النافذة لا تغيّر النتائج
+        FinancialData.objects.filter(ticker='EUR=X', date='2024-02-06').update(close_price=Decimal('9.9'))
+        bump_generation()
+
+        results, computed = self.forward_calls(self.requests)
+        self.assertEqual(computed, 1)
+        expected = reference_prediction(self.predictor, date(2024, 2, 5), 'JPY=X')
+        self.assertAlmostEqual(results[1]['prediction'], float(expected), places=3)
+
+    def test_new_model_files_invalidate_entries(self):
+        self.forward_calls(self.requests)
+        self.predictor.model_version = 'replaced'
+        self.assertEqual(self.forward_calls(self.requests)[1], 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DailyForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_history()
+        refresh_latest_quotes()
+
+    def test_one_forward_pass_per_rollout_step(self):
+        predictor = registry.get_predictor()
+        with mock.patch.object(predictor.model, 'forward', wraps=predictor.model.forward) as forward:
+            predictions = run_daily_forecast()
+
+        self.assertEqual(forward.call_count, 21)
+        self.assertTrue(all(call[0][0].shape == (3, 11, 7) for call in forward.call_args_list))
+        self.assertEqual(PredictionModel.objects.count(), 9)
+        one_day = {p.ticker: p for p in predictions if p.prediction_period == '1D'}
+        # الخطوة الأولى تطابق التنبؤ العادي لليوم التالي
+        eur = one_day['EUR=X']
+        last_day = FinancialData.objects.filter(ticker='EUR=X').latest('date').date
+        self.assertEqual(eur.prediction_date, last_day + timedelta(days=3 if last_day.weekday() == 4 else 1))
+        expected = predictor.predict((last_day + timedelta(days=1)).isoformat(), 'EUR=X')[0]
+        self.assertAlmostEqual(float(eur.predicted_price), expected, places=3)
+        self.assertEqual(eur.reference_price, FinancialData.objects.get(ticker='EUR=X', date=last_day).close_price)
+
+    def test_rerun_replaces_pending_predictions(self):
+        run_daily_forecast()
+        run_daily_forecast()
+        self.assertEqual(PredictionModel.objects.count(), 9)
+
+
+class ReconciliationTests(TestCase):
+    today = date(2024, 2, 9)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_history()
+
+    def predict(self, ticker, day, predicted, reference=None, version='v1', period='1D'):
+        return PredictionModel.objects.create(
+            ticker=ticker, prediction_date=day, predicted_price=predicted, reference_price=reference,
+            prediction_period=period, confidence_score=Decimal('0.75'), model_version=version,
+            features_used={}, prediction_type='PRICE')
+
+    def test_scores_pending_predictions_in_bulk(self):
+        close = FinancialData.objects.get(ticker='EUR=X', date='2024-02-05').close_price
+        hit = self.predict('EUR=X', date(2024, 2, 5), close * Decimal('1.01'), reference=close - Decimal('0.001'))
+        self.predict('EUR=X', date(2024, 2, 5), close * Decimal('0.99'), reference=close - Decimal('0.001'))
+        weekend = self.predict('EUR=X', date(2024, 2, 3), close)
+        future = self.predict('EUR=X', date(2024, 2, 12), close)
+
+        with self.assertNumQueries(4):  # savepoint + 2 UPDATE + release
+            scored = reconcile_predictions(today=self.today)
+
+        self.assertEqual(scored, 2)
+        hit.refresh_from_db()
+        self.assertEqual(hit.actual_price, close)
+        self.assertAlmostEqual(float(hit.accuracy), 99.0, places=1)
+        weekend.refresh_from_db()
+        future.refresh_from_db()
+        self.assertIsNone(weekend.actual_price)
+        self.assertIsNone(future.actual_price)
+
+        stats = prediction_error_stats(today=self.today)
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['count'], 2)
+        self.assertAlmostEqual(stats[0]['mape'], 1.0, places=3)
+        self.assertAlmostEqual(stats[0]['mae'], float(close) * 0.01, places=5)
+        self.assertAlmostEqual(stats[0]['hit_rate'], 50.0)
+
+    def test_accuracy_is_clamped_to_column_range(self):
+        far_off = self.predict('EUR=X', date(2024, 2, 5), Decimal('9999'))
+        reconcile_predictions(today=self.today)
+        far_off.refresh_from_db()
+        self.assertEqual(far_off.accuracy, Decimal('-999.99'))
+
+    def test_stats_endpoint(self):
+        self.predict('JPY=X', date(2024, 2, 5), Decimal('1.3'))
+        reconcile_predictions(today=self.today)
+        with mock.patch('financial_prediction.evaluation.timezone.now') as now:
+            now.return_value.date.return_value = self.today
+            response = self.client.get('/financial/api/predict/stats/', {'days': 7})
+        self.assertEqual(response.json()['stats'][0]['count'], 1)
+        self.assertEqual(self.client.get('/financial/api/predict/stats/', {'days': 'x'}).status_code, 400)
+
+
+class FeatureTests(SimpleTestCase):
+    def test_numpy_features_match_pandas(self):
+        predictor = FinancialPredictor()
+        rng = np.random.default_rng(0)
+        for rows in (11, 12, 20):
+            prices = 1 + rng.random((rows, 4))
+            df = pd.DataFrame(prices, columns=['Open', 'High', 'Low', 'Close'])
+            for window in (5, 9, 17):
+                df[f'{window}d_sma'] = df['Close'].rolling(window).mean().fillna(df['Close'])
+            expected = df.iloc[-11:][["Open", "High", "Low", "5d_sma", "9d_sma", "17d_sma", "Close"]].values
+            features = predictor.window_features(prices)
+            np.testing.assert_allclose(features, expected, rtol=1e-12)
+
+            scaled = np.column_stack([predictor.scaler.transform(expected[:, [i]]).ravel() for i in range(7)])
+            np.testing.assert_allclose(predictor.scale_features(features), scaled, rtol=1e-12)
+
+
+class LazyLoadingTests(SimpleTestCase):
+    def test_manage_check_does_not_import_torch(self):
+        script = ('import sys, django; django.setup(); from django.urls import resolve; '
+                  'resolve("/financial/api/predict/"); print("torch" in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.stdout.strip(), 'False', result.stderr)
+
+    def test_registry_loads_once(self):
+        registry.reset()
+        self.assertFalse(registry.is_loaded())
+        with override_settings(PREDICTOR_WARMUP=False):
+            self.assertIsNone(registry.warm_up())
+        self.assertFalse(registry.is_loaded())
+        with override_settings(PREDICTOR_WARMUP=True):
+            predictor = registry.warm_up()
+        self.assertIs(registry.get_predictor(), predictor)
@@ -6,4 +6,6 @@ app_name = 'financial_prediction'
 urlpatterns = [
     # API للتنبؤ المالي
     path('api/predict/', views.predict_api, name='predict_api'),
+    path('api/predict/batch/', views.predict_batch_api, name='predict_batch_api'),
+    path('api/predict/stats/', views.prediction_stats_api, name='prediction_stats_api'),
 ]
\ No newline at end of file
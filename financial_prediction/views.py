@@ -2,12 +2,10 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from financial_prediction.predictor import FinancialPredictor
+from financial_prediction.evaluation import DEFAULT_STATS_DAYS, prediction_error_stats
+from financial_prediction.registry import get_predictor
 from datetime import datetime
 
-# إنشاء كائن من الفئة FinancialPredictor
-predictor = FinancialPredictor()
-
 @csrf_exempt
 def predict_api(request):
     """
@@ -31,7 +29,7 @@ def predict_api(request):
                 }, status=400)
             
             # الحصول على التنبؤ
-            prediction, error = predictor.predict(date_str, ticker)
+            prediction, error = get_predictor().predict(date_str, ticker)
             
             if error:
                 return JsonResponse({
@@ -62,4 +60,84 @@ def predict_api(request):
     return JsonResponse({
         'success': False,
         'error': 'يرجى استخدام طلب POST مع بيانات JSON.'
-    }, status=405)
\ No newline at end of file
+    }, status=405)
+
+# الحد الأقصى لعدد التنبؤات في طلب واحد
+MAX_BATCH_SIZE = 500
+
+
+@csrf_exempt
+def predict_batch_api(request):
+    """
+    API للتنبؤ بعدة أزواج دفعة واحدة.
+    تقبل {"items": [{"date": ..., "ticker": ...}, ...]} أو {"date": ..., "tickers": [...]}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'error': 'يرجى استخدام طلب POST مع بيانات JSON.'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError
+        if 'items' in data:
+            requests = [(item.get('date'), item.get('ticker')) for item in data['items']]
+        else:
+            requests = [(data.get('date'), ticker) for ticker in data.get('tickers') or []]
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'بيانات JSON غير صالحة.'
+        }, status=400)
+
+    if not requests or any(not date_str or not ticker for date_str, ticker in requests):
+        return JsonResponse({
+            'success': False,
+            'error': 'الرجاء توفير التاريخ ورمز الشركة لكل عنصر.'
+        }, status=400)
+    if len(requests) > MAX_BATCH_SIZE:
+        return JsonResponse({
+            'success': False,
+            'error': f'الحد الأقصى {MAX_BATCH_SIZE} عنصر في الطلب الواحد.'
+        }, status=400)
+
+    try:
+        predictions = get_predictor().predict_many(requests)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'predictions': predictions
+    })
+
+
+def prediction_stats_api(request):
+    """
+    إحصائيات الخطأ (MAE, MAPE, نسبة صحة الاتجاه) لكل إصدار نموذج وأفق توقع.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'error': 'يرجى استخدام طلب GET.'
+        }, status=405)
+    try:
+        days = int(request.GET.get('days', DEFAULT_STATS_DAYS))
+        if days < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'قيمة days غير صالحة.'
+        }, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'days': days,
+        'stats': prediction_error_stats(days=days)
+    })